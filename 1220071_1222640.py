@@ -1,14 +1,43 @@
 # Taima 1222640, Lara 1220071
 
-from flask import Flask, render_template, request, redirect, url_for, session, abort
+from flask import Flask, render_template, request, redirect, url_for, session, abort, jsonify, Response, stream_with_context
+import db
+import metrics
+import querycheck
 from db import get_db_connection
-from datetime import datetime
+from table_state import get_table_states
+from live import table_events
+from catalog import menu_catalog
+from costing import costing_engine, POLICIES as COSTING_POLICIES
+from pagination import keyset_page
+import dashboard_data
+from dashboard_data import load_dashboard, dashboard_cache
+from rollups import record_paid_order, rebuild_rollups
+from revenue_index import revenue_index
+from forecast import forecast, store_forecast
+from reorder import create_reorder_drafts
+from snapshots import snapshot_stock, stock_as_of
+import archive
+import movement_log
+import export
+import statements
+from movement_log import insert_movements
+from stock import InsufficientStock, deduct_stock, restore_stock, restore_order_stock
+from querycheck import query_budget
+from datetime import datetime, timedelta, timezone
+import hashlib
 import mysql.connector
+import click
 from functools import wraps
 
 
 app = Flask(__name__)
 app.secret_key = "dawlo-secret-key"   
+db.init_app(app)
+metrics.init_app(app)
+querycheck.init_app(app)
+dashboard_data.init_app(app)
+movement_log.init_app(app)
 
 
 # ---------------------------
@@ -33,32 +62,69 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated
 
+# hot statements of the order flow, prepared once per pooled connection (see statements.py)
+ACTIVE_SESSION = statements.register("active_session", """
+    select session_start
+    from Table_Session
+    where table_id = %s and is_closed = 0
+    order by session_start desc
+    limit 1
+""")
+
+ORDER_TOTAL = statements.register("recompute_order_total", """
+    update Orders
+    set total = (
+        select ifnull(sum(subtotal), 0)   -- returns order total = 0 if no active order items
+        from Order_Item
+        where order_id = %s
+            and item_status != 'cancelled'
+    )
+    where order_id = %s
+""")
+
+# locking read: run after lock_table, sees (and waits for) sessions other waiters just opened
+ACTIVE_SESSION_LOCKED = statements.register("active_session_for_update", """
+    select session_start
+    from Table_Session
+    where table_id = %s and is_closed = 0
+    order by session_start desc
+    limit 1
+    for update
+""")
+
+ORDER_STATUS = statements.register("order_status", """
+    select order_status from Orders where order_id = %s
+""")
+
+
 def get_active_session(cur, table_id):
     """
     Returns the active session_start for a table (is_closed=0), or None.
     """
-    cur.execute(
-        """
-        select session_start
-        from Table_Session
-        where table_id = %s and is_closed = 0
-        order by session_start desc
-        limit 1
-        """,
-        (table_id,)
-    )
-    row = cur.fetchone()
-    return row["session_start"] if row else None
+    rows = ACTIVE_SESSION.fetch(cur, (table_id,))
+    return rows[0]["session_start"] if rows else None
+
+
+def lock_table(cur, table_id):
+    """
+    Locks the table row until commit, so opening and closing sessions
+    of the same table happen one at a time. Returns the row (table_id, capacity).
+    Take it before reading anything else in the transaction.
+    """
+    cur.execute("select table_id, capacity from Table_Entity where table_id = %s for update", (table_id,))
+    return cur.fetchone()
 
 
 def ensure_active_session(cur, table_id):
     """
     Creates an active session for a table if none exists.
-    Returns the active session_start.
+    Returns the active session_start. Call it with the table locked (lock_table).
     """
-    active = get_active_session(cur, table_id)
-    if active:
-        return active
+    # two waiters seating the same table would otherwise both create a session;
+    # the locking read sees a session the other one committed while we waited for the lock
+    rows = ACTIVE_SESSION_LOCKED.fetch(cur, (table_id,))
+    if rows:
+        return rows[0]["session_start"]
 
     # create new session now
     cur.execute(
@@ -72,26 +138,446 @@ def ensure_active_session(cur, table_id):
     return get_active_session(cur, table_id)
 
 
-def recompute_order_total(cur, order_id):
+class TableFull(Exception):
+    """The party does not fit at the table; the caller rolls back."""
+
+
+def seat_dine_in_order(cur, table_id, customer_id, party_size):
+    """
+    Opens (or joins) the table's session, seats the party and creates the order.
+    Raises TableFull if the table can't take the party.
+    Meant to run inside db.run_in_transaction.
+    """
+    # the table lock comes first, so every read below happens after the other waiters committed
+    capacity = lock_table(cur, table_id)["capacity"]
+    session_start = ensure_active_session(cur, table_id)
+
+    cur.execute("""
+        select party_size
+        from Table_Session
+        where table_id = %s
+        and session_start = %s
+        """, (table_id, session_start))
+
+    row = cur.fetchone()
+    seated = row["party_size"] or 0
+
+    if seated + party_size > capacity:
+        raise TableFull(
+            f"Table capacity exceeded. "
+            f"Capacity: {capacity}, "
+            f"Currently seated: {seated}"
+        )
+
     cur.execute(
         """
-        update Orders
-        set total = (
-            select ifnull(sum(subtotal), 0)   -- returns order total = 0 if no active order items
-            from Order_Item
-            where order_id = %s
-                and item_status != 'cancelled'
-        )
-        where order_id = %s
+        insert into Orders
+        (customer_id, table_id, session_start, order_date,
+         total, order_status, order_type)
+        values (%s, %s, %s, now(), 0, 'pending', 'dine_in')
         """,
-        (order_id, order_id)
+        (customer_id, table_id, session_start)
     )
+    order_id = cur.lastrowid
 
+    cur.execute("""
+        update Table_Session
+        set party_size = %s
+        where table_id = %s
+        and session_start = %s
+    """, (seated + party_size, table_id, session_start))
 
-def order_is_paid(cur, order_id):
-    cur.execute("select order_status from Orders where order_id = %s", (order_id,))
+    return order_id
+
+
+def recompute_order_total(cur, order_id):
+    ORDER_TOTAL.execute(cur, (order_id, order_id))
+
+
+def add_order_items(cur, order_id, lines, emp_id):
+    """
+    Adds a basket of (menu_item_id, quantity) lines to the order in one go:
+    the ingredients of all lines are checked and taken from the warehouse together,
+    the order items are written with one statement and the total is recomputed once.
+    Raises InsufficientStock if the warehouse can't cover the basket.
+    Meant to run inside db.run_in_transaction.
+    """
+    # take the ingredients out of the warehouse (all of them or none)
+    deduct_stock(cur, lines, emp_id)
+
+    # prices come from the menu catalog (see catalog.py)
+    prices = menu_catalog.get(cur).prices
+    parts = []
+    params = []
+    for menu_item_id, quantity in lines:
+        if menu_item_id in prices:
+            parts.append("select %s as item_id, %s as add_qty, %s as add_subtotal")
+            params += [menu_item_id, quantity, prices[menu_item_id] * quantity]
+    if not parts:
+        return
+
+    # new item -> insert, cancelled item reordered -> start again from this quantity,
+    # item already in the order -> increment quantity and subtotal
+    cur.execute(f"""
+        insert into Order_Item (order_id, menu_item_id, quantity, subtotal)
+        select %s, n.item_id, n.add_qty, n.add_subtotal
+        from ({" union all ".join(parts)}) n
+        on duplicate key update
+            subtotal = if(item_status = 'cancelled', values(subtotal), subtotal + values(subtotal)),
+            quantity = if(item_status = 'cancelled', values(quantity), quantity + values(quantity)),
+            item_status = if(item_status = 'cancelled', 'ordered', item_status)
+    """, [order_id] + params)
+
+    cur.execute(
+        """ update Orders
+            set order_status = 'ordered'
+            where order_id = %s and order_status in ('pending', 'served')""",
+            (order_id,)
+        )
+
+    recompute_order_total(cur, order_id)
+
+
+def parse_order_lines():
+    """
+    Reads a basket from the request, either a form (menu_item_id / quantity lists)
+    or JSON {"items": [{"menu_item_id": .., "quantity": ..}]}.
+    Lines of the same item are merged, zero quantities are skipped.
+    Raises ValueError for bad input.
+    """
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        raw = [(line.get("menu_item_id"), line.get("quantity")) for line in data.get("items", [])]
+    else:
+        raw = zip(request.form.getlist("menu_item_id"), request.form.getlist("quantity"))
+
+    basket = {}
+    for menu_item_id, quantity in raw:
+        try:
+            menu_item_id = int(menu_item_id)
+            quantity = int(quantity or 0)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid menu item or quantity.")
+
+        if quantity < 0:
+            raise ValueError("Quantity can't be negative.")
+        if quantity:
+            basket[menu_item_id] = basket.get(menu_item_id, 0) + quantity
+
+    return list(basket.items())
+
+
+def uncancel_order_item(cur, order_id, menu_item_id, emp_id):
+    """
+    Brings a cancelled item back with quantity 1 (can later be incremented).
+    Raises InsufficientStock if the warehouse can't cover it.
+    Meant to run inside db.run_in_transaction.
+    """
+    # the row lock makes a second uncancel wait, then find the item ordered again
+    cur.execute("""
+        select quantity from Order_Item
+        where order_id = %s and menu_item_id = %s and item_status = 'cancelled'
+        for update
+    """, (order_id, menu_item_id))
+    if cur.fetchone() is None:
+        return
+
+    # getting price
+    price = menu_catalog.price(cur, menu_item_id)
+
+    # deduct stock for 1 quantity bc we're reordering 1
+    deduct_stock(cur, [(menu_item_id, 1)], emp_id)
+
+    # restore the item with quantity 1 can later be incremented
+    cur.execute("""
+        update Order_Item
+        set item_status = 'ordered',
+            quantity = 1,
+            subtotal = %s
+        where order_id = %s
+        and menu_item_id = %s
+        and item_status = 'cancelled'
+    """, (price, order_id, menu_item_id))
+
+    # order state goes back to ordered
+    cur.execute("""
+        update Orders
+        set order_status = 'ordered'
+        where order_id = %s
+    """, (order_id,))
+
+    recompute_order_total(cur, order_id)
+
+
+def cancel_order_item(cur, order_id, menu_item_id, emp_id):
+    """
+    Cancels the whole quantity of an ordered item and puts its stock back.
+    Returns False if there was nothing to cancel.
+    Meant to run inside db.run_in_transaction.
+    """
+    # the row lock makes a second cancel of the same item wait, then find it cancelled
+    cur.execute("""
+        select quantity
+        from Order_Item
+        where order_id = %s
+        and menu_item_id = %s
+        and item_status = 'ordered'
+        for update
+    """, (order_id, menu_item_id))
     row = cur.fetchone()
-    return (row and row["order_status"] == "paid")
+
+    if not row or row["quantity"] <= 0:
+        return False
+
+    # restore stock of every ingredient for the whole item quantity
+    restore_stock(cur, [(menu_item_id, row["quantity"])], emp_id, "cancel_item")
+
+    # marking item as cancelled
+    cur.execute("""
+        update Order_Item
+        set quantity = 0,
+            subtotal = 0,
+            item_status = 'cancelled'
+        where order_id = %s
+        and menu_item_id = %s
+    """, (order_id, menu_item_id))
+
+    recompute_order_total(cur, order_id)
+    return True
+
+
+def decrement_order_item(cur, order_id, menu_item_id, emp_id):
+    """
+    Takes one unit off an order item (cancelling it at the last unit) and puts its stock back.
+    Returns False if the item has no units left.
+    Meant to run inside db.run_in_transaction.
+    """
+    cur.execute("""
+        select quantity from Order_Item
+        where order_id = %s and menu_item_id = %s
+        for update
+    """, (order_id, menu_item_id))
+    row = cur.fetchone()
+
+    if not row or row["quantity"] <= 0:
+        return False
+
+    # restoring stock for 1 unit
+    restore_stock(cur, [(menu_item_id, 1)], emp_id, "cancel_item")
+
+    if row["quantity"] > 1:  # decrement 1
+        cur.execute("""
+            update Order_Item
+            set quantity = quantity - 1,
+                subtotal = subtotal - (select price from Menu_Item where item_id = %s)
+            where order_id = %s and menu_item_id = %s
+        """, (menu_item_id, order_id, menu_item_id))
+
+    else:  # cancel completely
+        cur.execute("""
+            update Order_Item
+            set quantity = 0,
+                subtotal = 0,
+                item_status = 'cancelled'
+            where order_id = %s and menu_item_id = %s
+        """, (order_id, menu_item_id))
+
+    recompute_order_total(cur, order_id)
+    return True
+
+
+def cancel_whole_order(cur, order_id, emp_id):
+    """
+    Cancels the order and all its items, putting back the stock of the items not cancelled yet.
+    Returns False if the order is already cancelled or paid.
+    Meant to run inside db.run_in_transaction.
+    """
+    # locking the order first: a second cancel waits and then sees it cancelled
+    cur.execute("select order_status from Orders where order_id = %s for update", (order_id,))
+    row = cur.fetchone()
+    if not row or row["order_status"] in ("cancelled", "paid"):
+        return False
+
+    # return the stock of all items in the order except canceled ones
+    restore_order_stock(cur, order_id, emp_id)
+
+    # cancel all items
+    cur.execute("""
+        update Order_Item
+        set item_status = 'cancelled',
+            quantity = 0,
+            subtotal = 0
+        where order_id = %s
+    """, (order_id,))
+
+    # cancel the order itself
+    cur.execute("""
+        update Orders
+        set order_status = 'cancelled',
+            total = 0
+        where order_id = %s
+    """, (order_id,))
+    return True
+
+
+def order_is_paid(cur, order_id):
+    rows = ORDER_STATUS.fetch(cur, (order_id,))
+    return bool(rows) and rows[0]["order_status"] == "paid"
+
+def search_date_range(search):
+    """
+    Turns a searched date ('2025-03-05' or '2025-03') into a half-open [start, end) range,
+    so date columns are compared directly and can use their index.
+    Returns None if the search text is not a date.
+    """
+    for fmt in ("%Y-%m-%d", "%Y-%m"):
+        try:
+            start = datetime.strptime(search.strip(), fmt)
+        except ValueError:
+            continue
+
+        if fmt == "%Y-%m-%d":
+            end = start + timedelta(days=1)
+        else:
+            end = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return start, end
+
+    return None
+
+
+# ?field=&search= filter of /orders (where, params), shared by the list and its export
+def orders_filter():
+    field = request.args.get("field")
+    search = request.args.get("search")
+
+    allowed_fields = {
+        "order_id": "order_id",
+        "order_date": "DATE(order_date)",
+        "order_status": "order_status",
+        "order_type": "order_type",
+        "table_id": "table_id",
+        "total": "total"
+    }
+
+    date_range = search_date_range(search) if search and field == "order_date" else None
+
+    where = ""
+    params = ()
+
+    if date_range:
+        where = "order_date >= %s and order_date < %s"
+        params = date_range
+
+    elif search:
+        column = allowed_fields[field]
+        where = f"{column} like %s"
+        params = (f"%{search}%",)
+
+    return where, params
+
+
+# ?field=&search= filter of /payments
+def payments_filter():
+    field = request.args.get("field")
+    search = request.args.get("search")
+
+    text_fields = {"payment_date": "DATE(payment_date)"}
+
+    numeric_fields = {"order_id": "order_id",
+                        "amount": "amount",
+                        "payment_id": "payment_id"}
+
+    date_range = search_date_range(search) if search and field == "payment_date" else None
+
+    where = ""
+    params = ()
+
+    if date_range:
+        where = "payment_date >= %s and payment_date < %s"
+        params = date_range
+
+    elif search and field in text_fields:
+        column = text_fields[field]
+        where = f"{column} = %s"
+        params = (search,)
+
+    elif search and field in numeric_fields:
+        column = numeric_fields[field]
+        where = f"{column} = %s"
+        params = (search,)
+
+    return where, params
+
+
+# ?field=&search= filter of /stock_movements
+def stock_movement_filter():
+    field = request.args.get("field")
+    search = request.args.get("search")
+
+    text_fields = {
+        "movement_type": "sm.movement_type",
+        "employee_name": "e.emp_name",
+        "item_name": "w.item_name",
+        "movement_date": "DATE(sm.movement_date)"
+    }
+
+    numeric_fields = {
+        "movement_id": "sm.movement_id",
+        "emp_id": "sm.emp_id",
+        "warehouse_item_id": "sm.warehouse_item_id"
+    }
+
+    date_range = search_date_range(search) if search and field == "movement_date" else None
+
+    where = ""
+    params = ()
+
+    if date_range:
+        where = "sm.movement_date >= %s and sm.movement_date < %s"
+        params = date_range
+
+    elif search and field in text_fields:
+        column = text_fields[field]
+        where = f"{column} like %s"
+        params = (f"%{search}%",)
+
+    elif search and field in numeric_fields:
+        column = numeric_fields[field]
+        where = f"{column} = %s"
+        params = (search,)
+
+    return where, params
+
+
+def export_response(name, select_sql, where, params, date_column, key):
+    """
+    Streams select_sql filtered by where and ?from=&to= as ?format= (csv / parquet / arrow).
+    """
+    fmt = request.args.get("format", "csv")
+    if fmt not in export.FORMATS:
+        abort(400)
+    if fmt in export.COLUMNAR_FORMATS and not export.columnar_available():
+        return f"{fmt} export needs pyarrow, which is not installed", 501
+
+    try:
+        range_where, range_params = export.date_range_args(request.args, date_column)
+    except ValueError:
+        abort(400)
+
+    conditions = [f"({c})" for c in (where, range_where) if c]
+    sql = select_sql
+    if conditions:
+        sql += " where " + " and ".join(conditions)
+    sql += f" order by {key}"
+
+    mimetype, extension = export.FORMATS[fmt]
+    return Response(
+        stream_with_context(export.stream(fmt, sql, list(params) + range_params)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{extension}"',
+                 "X-Accel-Buffering": "no"}
+    )
+
 
 TABLE_POSITIONS = {
     1:  (53, 12.84),
@@ -169,317 +655,125 @@ def logout():
 def home():
     return redirect(url_for("login"))
 
-@app.route("/dashboard")
-@login_required
-@admin_required
-def dashboard():
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-
+def dashboard_month():
+    """the month picked on the dashboard (this month by default) -> ("YYYY-MM", first day)"""
     # the manager selects a month to check sales in that month
     selected_month = request.args.get("month")
     # if month not chosen get this month this year
     if not selected_month:
         selected_month = datetime.now().strftime("%Y-%m")
 
-    year, month = selected_month.split("-")
+    try:
+        month_start = datetime.strptime(selected_month, "%Y-%m").date().isoformat()
+    except ValueError:
+        abort(400)
+    return selected_month, month_start
 
-    # -------- total orders ---------
-    cur.execute("""
-        select count(*) as total_orders
-        from Orders
-        where order_status = 'paid'
-    """)
-    total_orders = cur.fetchone()["total_orders"]
-
-    # ------- total customers ------
-    cur.execute("""
-        select count(distinct customer_id) as total_customers
-        from Orders
-        where order_status = 'paid'
-    """)
-    total_customers = cur.fetchone()["total_customers"]
-
-    # ------ total revenue ------
-    cur.execute("""
-        select sum(total) as total_revenue
-        from orders
-        where order_status = 'paid'
-    """)
-    row = cur.fetchone()
-    total_revenue = float(row["total_revenue"]) if row["total_revenue"] is not None else 0  
-
-    # total cost
-    cur.execute("""
-        select sum(pi.quantity * pi.unit_price) as total_cost
-        from Purchase_Item pi
-        join Purchase p on p.purchase_id = pi.purchase_id
-        where p.purchase_status in ('confirmed', 'delivered');
-    """)
-    total_cost = cur.fetchone()["total_cost"] or 0
-
-    profit = round(total_revenue - total_cost, 2)
 
+@app.route("/dashboard")
+@login_required
+@admin_required
+def dashboard():
+    # only the page shell, every chart loads its own data from /dashboard/panel/<name>
+    selected_month, _ = dashboard_month()
 
-    # ----- monthly sales -----
-    cur.execute("""
-        SELECT
-            DATE_FORMAT(order_date, '%Y-%m') AS month,
-            SUM(total) AS revenue
-        FROM Orders
-        WHERE order_status = 'paid'
-        GROUP BY DATE_FORMAT(order_date, '%Y-%m')
-        ORDER BY month
-    """)
-    monthly = cur.fetchall()
+    return render_template("dashboard.html", selected_month=selected_month)
 
-    months = [r["month"] for r in monthly]
-    revenues = [float(r["revenue"]) for r in monthly]
 
-    # --------  total daily sales for a selected month sorted by date -----
-    cur.execute("""
-        select DATE(order_date) as sale_date, sum(total) as daily_sales
-        from Orders
-        where order_status = 'paid'
-        and YEAR(order_date) = %s
-        and MONTH(order_date) = %s
-        group by DATE(order_date)
-        order by sale_date
-    """, (year, month))
+# one dashboard panel (or group of panels) as JSON
+# sales numbers come from the daily rollups (see rollups.py), not from the order history;
+# panels run in parallel on their own connections and are cached (see dashboard_data.py)
+@app.route("/dashboard/panel/<name>")
+@login_required
+@admin_required
+def dashboard_panel(name):
+    names = dashboard_data.PANEL_GROUPS.get(name, [name])
+    if any(n not in dashboard_data.PANELS for n in names):
+        abort(404)
 
-    daily_sales = cur.fetchall()
+    _, month_start = dashboard_month()
 
-    daily_dates = []
-    daily_totals = []
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
 
-    for d in daily_sales:
-        # date format
-        sale_date_str = d["sale_date"].strftime("%Y-%m-%d")
-        daily_dates.append(sale_date_str)
+    data, failed_panels = load_dashboard(cur, month_start, names=names, logger=app.logger)
 
-        # convert total to float
-        daily_totals.append(float(d["daily_sales"]))
+    cur.close()
+    conn.close()
 
+    if failed_panels:
+        return jsonify({"error": "panel could not be loaded", "failed_panels": failed_panels}), 503
 
-    # -------- Top Ordered items ---------
-    cur.execute("""
-        SELECT
-            mi.item_name,
-            SUM(oi.quantity) AS qty
-        FROM Order_Item oi
-        JOIN Menu_Item mi ON mi.item_id = oi.menu_item_id
-        JOIN Orders o ON o.order_id = oi.order_id
-        WHERE o.order_status = 'paid'
-          AND oi.item_status != 'cancelled'
-        GROUP BY mi.item_name
-        ORDER BY qty DESC
-        LIMIT 5
-    """)
-    items = cur.fetchall()
+    if name == "kpis":
+        data = dict(data)
+        data["profit"] = round(data["total_revenue"] - data.pop("total_cost"), 2)
 
-    item_names = [i["item_name"] for i in items]
-    item_qtys = [int(i["qty"]) for i in items]
+    # unchanged data -> 304 without a body
+    response = jsonify(data)
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    modified = dashboard_data.last_modified(names, month_start)
+    if modified is not None:
+        response.last_modified = datetime.fromtimestamp(modified, timezone.utc)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
-    #  Sales Distribution
-    cur.execute("""
-        SELECT
-            mi.item_name,
-            SUM(oi.subtotal) AS sales
-        FROM Order_Item oi
-        JOIN Menu_Item mi ON mi.item_id = oi.menu_item_id
-        JOIN Orders o ON o.order_id = oi.order_id
-        WHERE o.order_status = 'paid'
-          AND oi.item_status != 'cancelled'
-        GROUP BY mi.item_name
-        ORDER BY sales DESC
-        LIMIT 6
-    """)
-    dist = cur.fetchall()
 
-    dist_labels = [d["item_name"] for d in dist]
-    dist_sales = [float(d["sales"]) for d in dist]
+# revenue, paid orders and average ticket of any date range [from, to)
+# answered from the cumulative daily index (see revenue_index.py), no scan of the orders
+@app.route("/reports/revenue")
+@login_required
+@admin_required
+def revenue_report():
+    today = datetime.now().date()
+    try:
+        start = datetime.strptime(request.args["from"], "%Y-%m-%d").date() \
+            if request.args.get("from") else today.replace(day=1)
+        end = datetime.strptime(request.args["to"], "%Y-%m-%d").date() \
+            if request.args.get("to") else today + timedelta(days=1)
+    except ValueError:
+        abort(400)
 
-    # Orders by Type
-    cur.execute("""
-        SELECT
-            order_type,
-            COUNT(*) AS count
-        FROM Orders
-        WHERE order_status = 'paid'
-        GROUP BY order_type
-    """)
-    types = cur.fetchall()
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
 
-    order_types = [t["order_type"].replace("_", " ").title() for t in types]
-    order_counts = [t["count"] for t in types]
+    totals = revenue_index.range_totals(cur, start, end)
 
-    #  --------- Top Customers (table) ---------
-    cur.execute("""
-        SELECT
-            c.customer_name,
-            COUNT(o.order_id) AS orders
-        FROM Orders o
-        JOIN Customer c ON c.customer_id = o.customer_id
-        WHERE o.order_status = 'paid'
-        GROUP BY c.customer_id
-        ORDER BY orders DESC
-        LIMIT 5
-    """)
-    top_customers = cur.fetchall()
+    cur.close()
+    conn.close()
 
-    # ----- money earned from selling this item is less than the money spent to produce it -----
-    cur.execute("""
-        select m.item_name, m.price as selling_price, min(s.unit_price) as purchase_price,
-                (min(s.unit_price) - m.price) as loss_amount
-                
-        from menu_item m join recipe r on r.menu_item_id = m.item_id 
-                and r.is_active = 1
-        join supplier_item s on s.warehouse_item_id = r.warehouse_item_id 
-                and s.is_supplying = 1
-        group by m.item_id, m.item_name, m.price
-        having min(s.unit_price) > m.price       -- where the cheapest purchase cost is higher than the selling price
-        order by loss_amount desc;
-    """)
+    return render_template("revenue_report.html", start=start, end=end, totals=totals)
 
-    loss_items = cur.fetchall()
 
-    # top most 5 purchased items in last 6 months
-    cur.execute("""
-        select w.item_name,
-            sum(pi.quantity) as total_quantity,
-            avg(pi.unit_price) as avg_purchase_price,
-            sum(pi.quantity * pi.unit_price) as total_purchase_cost
-                
-        from purchase p, purchase_item pi, warehouse_item w
-        where p.purchase_id = pi.purchase_id
-        and pi.warehouse_item_id = w.item_id
-        and p.purchase_status in ('confirmed', 'delivered')
-        and year(p.purchase_date) = year(curdate())
-        and month(p.purchase_date) >= month(curdate()) - 6
-                
-        group by w.item_id, w.item_name
-        order by total_purchase_cost desc
-        limit 5;  
-        """)
+# ingredient cost and margin of every menu item (see costing.py)
+@app.route("/reports/margins")
+@login_required
+@admin_required
+def margins_report():
+    policy = request.args.get("policy", "cheapest")
+    if policy not in COSTING_POLICIES:
+        abort(400)
 
-    top_purchased_items = cur.fetchall()
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
 
+    items = costing_engine.margins(cur, policy)
 
     cur.close()
     conn.close()
 
-    return render_template(
-        "dashboard.html",
-        total_orders=total_orders,
-        total_customers = total_customers,
-        total_revenue = total_revenue,
-        profit = profit,
-        months=months,
-        revenues=revenues,
-        item_names=item_names,
-        item_qtys=item_qtys,
-        dist_labels=dist_labels,
-        dist_sales=dist_sales,
-        order_types=order_types,
-        order_counts=order_counts,
-        top_customers=top_customers,
-        daily_dates=daily_dates,
-        daily_totals=daily_totals,
-        selected_month=selected_month,
-        loss_items=loss_items,
-        top_purchased_items = top_purchased_items,
-    )
+    return render_template("margins_report.html", items=items,
+                           policy=policy, policies=COSTING_POLICIES)
 
 
-from datetime import datetime
-
 @app.route("/tables")
 @login_required
+@query_budget(3)
 def tables_dashboard():
     conn = get_db_connection()
     cur = conn.cursor(dictionary=True)
 
-    cur.execute("select table_id, capacity from Table_Entity order by table_id")
-    tables = cur.fetchall()
-
-    result = []
-
-    for t in tables:
-        table_id = int(t["table_id"])
-
-
-        # active session
-        cur.execute(
-            """
-            select session_start
-            from Table_Session
-            where table_id = %s and is_closed = 0
-            order by session_start desc
-            limit 1
-            """,
-            (table_id,)
-        )
-        row = cur.fetchone()
-        active_start = row["session_start"] if row else None
-
-        table_state = "free"
-        latest_order = None
-        can_close = False
-        duration = None
-
-        if active_start:
-            # session duration
-            diff = datetime.now() - active_start
-            minutes = int(diff.total_seconds() // 60)
-            duration = f"{minutes} min"
-
-            # latest order
-            cur.execute(
-                """
-                select order_id, order_status, total
-                from Orders
-                where table_id = %s and session_start = %s
-                order by order_date desc
-                limit 1
-                """,
-                (table_id, active_start)
-            )
-            latest_order = cur.fetchone()
-
-            if not latest_order:
-                table_state = "occupied_no_order_yet"
-            else:
-                st = latest_order["order_status"]
-                if st == "ordered":
-                    table_state = "ordered_waiting"
-                elif st == "served":
-                    table_state = "served_waiting_payment"
-                elif st == "paid":
-                    table_state = "paid_but_seated"
-
-            # can close session only if all orders paid
-            cur.execute(
-                """
-                select count(*) as cnt
-                from Orders
-                where table_id = %s
-                  and session_start = %s
-                  and order_status IN ('pending', 'ordered', 'served')
-                """,
-                (table_id, active_start)
-            )
-            if cur.fetchone()["cnt"] == 0:
-                can_close = True
-
-        result.append({
-            "table_id": table_id,
-            "capacity": t["capacity"],
-            "active_session_start": active_start,
-            "session_duration": duration,
-            "state": table_state,
-            "latest_order": latest_order,
-            "can_close": can_close
-        })
+    result = get_table_states(cur)
 
     cur.close()
     conn.close()
@@ -488,66 +782,15 @@ def tables_dashboard():
 
 @app.route("/floorplan")
 @login_required
+@query_budget(3)
 def floorplan_dashboard():
     conn = get_db_connection()
     cur = conn.cursor(dictionary=True)
 
-    cur.execute("SELECT DATABASE() AS db")
-    print("FLASK CONNECTED TO:", cur.fetchone()["db"])
-
-    cur.execute("SELECT COUNT(*) AS cnt FROM Table_Entity")
-    print("FLASK TABLE COUNT:", cur.fetchone()["cnt"])
+    result = get_table_states(cur)
 
-
-    cur.execute("select table_id, capacity from Table_Entity order by table_id")
-    tables = cur.fetchall()
-    print("FLOORPLAN table_ids:", [int(t["table_id"]) for t in tables])
-
-
-    result = []
-
-    for t in tables:
-        table_id = int(t["table_id"])
-        active_start = get_active_session(cur, table_id)
-
-        table_state = "free"
-        latest_order = None
-
-        if active_start:
-            cur.execute(
-                """
-                select order_id, order_status, total
-                from Orders
-                where table_id = %s and session_start = %s
-                order by order_date desc
-                limit 1
-                """,
-                (table_id, active_start)
-            )
-            latest_order = cur.fetchone()
-
-            if not latest_order:
-                table_state = "occupied_no_order_yet"
-            else:
-                st = latest_order["order_status"]
-                if st == "ordered":
-                    table_state = "ordered_waiting"
-                elif st == "served":
-                    table_state = "served_waiting_payment"
-                elif st == "paid":
-                    table_state = "paid_but_seated"
-
-        top, left = TABLE_POSITIONS.get(table_id, (50, 50))
-
-        result.append({
-            "table_id": table_id,
-            "capacity": t["capacity"],
-            "active_session_start": active_start,
-            "state": table_state,
-            "latest_order": latest_order,
-            "pos_top": top,
-            "pos_left": left
-        })
+    for t in result:
+        t["pos_top"], t["pos_left"] = TABLE_POSITIONS.get(t["table_id"], (50, 50))
 
     cur.close()
     conn.close()
@@ -555,49 +798,59 @@ def floorplan_dashboard():
     return render_template("floorplan.html", tables=result, full_width=True)
 
 
+# live updates for /tables and /floorplan (server-sent events)
+@app.route("/tables/stream")
+@login_required
+def tables_stream():
+    return Response(
+        table_events.stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.route("/orders")
 @login_required
 def orders_list():
     conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
+    cur = conn.cursor(records=True)
 
-    field = request.args.get("field")
-    search = request.args.get("search")
-
-    allowed_fields = {
-        "order_id": "order_id",
-        "order_date": "DATE(order_date)",
-        "order_status": "order_status",
-        "order_type": "order_type",
-        "table_id": "table_id",
-        "total": "total"
-    }
+    where, params = orders_filter()
 
-    if search:
-        column = allowed_fields[field]
-
-        cur.execute(
-            f"""
-            select order_id, order_date, total, order_status, order_type, table_id
-            from Orders
-            where {column} like %s
-            order by order_id DESC
-            """,
-            (f"%{search}%",))
-    else:
-        cur.execute(
-            """
-            select order_id, order_date, total, order_status, order_type, table_id
-            from Orders
-            order by order_id DESC
-            """
-        )
+    # ?archive=1 -> closed months moved to the archive too (see archive.py)
+    include_archive = archive.wants_archive(request.args)
+    page = keyset_page(
+        cur,
+        f"""
+        select order_id, order_date, total, order_status, order_type, table_id
+        from {archive.source("Orders", include_archive)} o
+        """,
+        keys=[("order_id", "order_id")],
+        table=archive.tables("Orders", include_archive),
+        where=where,
+        params=params,
+        descending=True
+    )
 
-    orders = cur.fetchall()
+    orders = page.rows
     cur.close()
     conn.close()
 
-    return render_template("orders.html", orders=orders)
+    return render_template("orders.html", orders=orders, page=page)
+
+
+@app.route("/orders/export")
+@login_required
+def orders_export():
+    where, params = orders_filter()
+    return export_response(
+        "orders",
+        f"""
+        select order_id, order_date, total, order_status, order_type, table_id
+        from {archive.source("Orders", archive.wants_archive(request.args))} o
+        """,
+        where, params, date_column="order_date", key="order_id"
+    )
 
 
 @app.route("/close_session", methods=["POST"])
@@ -609,6 +862,9 @@ def close_session():
     conn = get_db_connection()
     cur = conn.cursor(dictionary=True)
 
+    # no new order can be opened on the table while we check and close
+    lock_table(cur, table_id)
+
     # safety: only close if all orders are paid
     cur.execute(
         """
@@ -632,6 +888,7 @@ def close_session():
             (table_id, session_start)
         )
         conn.commit()
+        table_events.publish(cur, table_ids=[table_id])
 
     cur.close()
     conn.close()
@@ -660,51 +917,13 @@ def start_order():
             table_id = int(request.form["table_id"])
             party_size = int(request.form["party_size"])
 
-            cur.execute(
-                "select capacity from Table_Entity where table_id = %s",
-                (table_id,)
-            )
-            capacity = cur.fetchone()["capacity"]
-
-            session_start = ensure_active_session(cur, table_id)
-
-            cur.execute("""
-                select party_size
-                from Table_Session
-                where table_id = %s
-                and session_start = %s
-                """, (table_id, session_start))
-
-            row = cur.fetchone()
-            seated = row["party_size"] or 0
-
-            if seated + party_size > capacity:
-                error = (
-                    f"Table capacity exceeded. "
-                    f"Capacity: {capacity}, "
-                    f"Currently seated: {seated}"
-                )
+            try:
+                order_id = db.run_in_transaction(conn, seat_dine_in_order, table_id,
+                                                 customer_id, party_size)
+            except TableFull as e:
+                error = str(e)
             else:
-                cur.execute(
-                    """
-                    insert into Orders
-                    (customer_id, table_id, session_start, order_date,
-                     total, order_status, order_type)
-                    values (%s, %s, %s, now(), 0, 'pending', 'dine_in')
-                    """,
-                    (customer_id, table_id, session_start)
-                )
-
-                order_id = cur.lastrowid
-
-                cur.execute("""
-                    update Table_Session
-                    set party_size = %s
-                    where table_id = %s
-                    and session_start = %s
-                """, (seated + party_size, table_id, session_start))
-
-                conn.commit()
+                table_events.publish(cur, table_ids=[table_id])
                 cur.close()
                 conn.close()
                 return redirect(url_for("order_page", order_id=order_id))
@@ -745,6 +964,7 @@ def start_order():
 
 @app.route("/order/<int:order_id>", methods=["GET", "POST"])
 @login_required
+@query_budget(15)
 def order_page(order_id):
     conn = get_db_connection()
     cur = conn.cursor(dictionary=True)
@@ -760,143 +980,24 @@ def order_page(order_id):
             menu_item_id = int(request.form["menu_item_id"])
             quantity = int(request.form["quantity"])
 
-            cur.execute("select price from Menu_Item where item_id = %s", (menu_item_id,))
-            price = cur.fetchone()["price"]
-            add_subtotal = price * quantity
-
-            cur.execute("""
-                select quantity, subtotal, item_status
-                from Order_Item
-                where order_id = %s and menu_item_id = %s
-            """, (order_id, menu_item_id))
-            existing = cur.fetchone()
-
-            if existing:
-                if existing["item_status"] == "cancelled":  # if the item was ordered then cancelled then reordered again
-                    cur.execute("""
-                        update Order_Item
-                        set quantity = %s,
-                        subtotal = %s,
-                        item_status = 'ordered'
-                        where order_id = %s and menu_item_id = %s
-                    """, (quantity, add_subtotal, order_id, menu_item_id))
-
-                else: # if the item already exists in order increment quantity and subtotal
-                    cur.execute("""
-                        update Order_Item
-                        set quantity = quantity + %s,
-                            subtotal = subtotal + %s
-                        where order_id = %s and menu_item_id = %s
-                    """, (quantity, add_subtotal, order_id, menu_item_id))
-
-            else: # if the item is ordered for the first time
-                cur.execute("""
-                    insert into Order_Item
-                    (order_id, menu_item_id, quantity, subtotal)
-                    values (%s, %s, %s, %s)
-                """, (order_id, menu_item_id, quantity, add_subtotal))
-
-            cur.execute("""
-                select warehouse_item_id, quantity_required
-                from Recipe
-                where menu_item_id = %s
-            """, (menu_item_id,))
-
-            for ing in cur.fetchall():
-                used = ing["quantity_required"] * quantity
-
-                cur.execute(
-                    "select stock_quantity from Warehouse_Item where item_id = %s",
-                    (ing["warehouse_item_id"],)
-                )
-                if cur.fetchone()["stock_quantity"] < used:
-                    conn.rollback()
-                    cur.close()
-                    conn.close()
-                    return "Insufficient stock."
-
-                cur.execute(
-                    "update Warehouse_Item set stock_quantity = stock_quantity - %s where item_id = %s",
-                    (used, ing["warehouse_item_id"])
-                )
-
-                emp_id = session["emp_id"]
-
-                cur.execute("""
-                    insert into Stock_Movement
-                    (movement_type, quantity_change, movement_date, warehouse_item_id, emp_id)
-                    values ('order', %s, now(), %s, %s)
-                """, (-used, ing["warehouse_item_id"], emp_id))
+            try:
+                db.run_in_transaction(conn, add_order_items, order_id,
+                                      [(menu_item_id, quantity)], session["emp_id"])
+            except InsufficientStock:
+                cur.close()
+                conn.close()
+                return "Insufficient stock."
 
-            cur.execute(
-                """ update Orders
-                    set order_status = 'ordered'
-                    where order_id = %s and order_status in ('pending', 'served')""",
-                    (order_id,)
-                )
-            
-            recompute_order_total(cur, order_id)
-            conn.commit()
+            table_events.publish(cur, order_id=order_id)
             return redirect(url_for("order_page", order_id=order_id))
         
         # -------- cancel item --------
         elif action == "cancel_item" and not paid:
             menu_item_id = int(request.form["menu_item_id"])
 
-            # getting current item quantity 
-            cur.execute("""
-                select quantity
-                from Order_Item
-                where order_id = %s
-                and menu_item_id = %s
-                and item_status = 'ordered'
-            """, (order_id, menu_item_id))
-
-            row = cur.fetchone()
-
-            if row and row["quantity"] > 0:
-                qty = row["quantity"]  # current item quantity
-
-                # restore stock for each ingredient
-                cur.execute("""
-                    select warehouse_item_id, quantity_required
-                    from Recipe
-                    where menu_item_id = %s
-                """, (menu_item_id,))
-
-                for ing in cur.fetchall():
-                    restored = ing["quantity_required"] * qty  # we restore quantity required of ingredient * item quantity
-
-                    # update warehouse stock
-                    cur.execute("""
-                        update Warehouse_Item
-                        set stock_quantity = stock_quantity + %s
-                        where item_id = %s
-                    """, (restored, ing["warehouse_item_id"]))
-
-                    emp_id = session["emp_id"]  # getting emp if of current logged in emp who currently makes stock changes
-
-                    # insert change to stock movement
-                    cur.execute("""
-                        insert into Stock_Movement
-                        (movement_type, quantity_change, movement_date, warehouse_item_id, emp_id)
-                        values ('cancel_item', %s, now(), %s, %s)
-                    """, (+restored, ing["warehouse_item_id"], emp_id))
-
-                # marking item as cancelled 
-                cur.execute("""
-                    update Order_Item
-                    set quantity = 0,
-                        subtotal = 0,
-                        item_status = 'cancelled'
-                    where order_id = %s
-                    and menu_item_id = %s
-                """, (order_id, menu_item_id))
-
-                # recompute order total
-                recompute_order_total(cur, order_id)
-
-                conn.commit()
+            if db.run_in_transaction(conn, cancel_order_item, order_id, menu_item_id,
+                                     session["emp_id"]):
+                table_events.publish(cur, order_id=order_id)
 
             return redirect(url_for("order_page", order_id=order_id))
 
@@ -905,197 +1006,32 @@ def order_page(order_id):
         elif action == "decrement_item" and not paid:
             menu_item_id = int(request.form["menu_item_id"])
 
-            # retieving quantity od current itwm
-            cur.execute("""
-                select quantity from Order_Item
-                where order_id = %s and menu_item_id = %s
-            """, (order_id, menu_item_id))
-            row = cur.fetchone()
-
-            if row:
-                qty = row["quantity"]
-
-                # restoring stock for 1 unit
-                cur.execute("""
-                    select warehouse_item_id, quantity_required
-                    from Recipe
-                    where menu_item_id = %s
-                """, (menu_item_id,))
-
-                for ing in cur.fetchall():
-                    restored = ing["quantity_required"]
-                    
-                    # updating warehouse stock
-                    cur.execute("""
-                        update Warehouse_Item
-                        set stock_quantity = stock_quantity + %s
-                        where item_id = %s
-                    """, (restored, ing["warehouse_item_id"]))
-
-                    emp_id = session["emp_id"]  # emp id of current logged in emp
-
-                    # adding stock movement
-                    cur.execute("""
-                        insert into Stock_Movement
-                        (movement_type, quantity_change, movement_date, warehouse_item_id, emp_id)
-                        values ('cancel_item', %s, now(), %s, %s)
-                    """, (restored, ing["warehouse_item_id"], emp_id))
-
-                if qty > 1: # decrement 1
-                    cur.execute("""
-                        update Order_Item
-                        set quantity = quantity - 1,
-                            subtotal = subtotal - (select price from Menu_Item where item_id = %s)
-                        where order_id = %s and menu_item_id = %s
-                    """, (menu_item_id, order_id, menu_item_id))
-
-                else: # cancel completely
-                    cur.execute("""
-                        update Order_Item
-                        set quantity = 0,
-                            subtotal = 0,
-                            item_status = 'cancelled'
-                        where order_id = %s and menu_item_id = %s
-                    """, (order_id, menu_item_id))
-    
-
-                recompute_order_total(cur, order_id)
-                conn.commit()
+            if db.run_in_transaction(conn, decrement_order_item, order_id, menu_item_id,
+                                     session["emp_id"]):
+                table_events.publish(cur, order_id=order_id)
 
             return redirect(url_for("order_page", order_id=order_id))
 
         # ------- uncancel item --------
         elif action == "uncancel_item" and not paid:
-            menu_item_id = int(request.form["menu_item_id"])
-
-            # getting price
-            cur.execute(
-                "select price from Menu_Item where item_id = %s",
-                (menu_item_id,))
-            
-            price = cur.fetchone()["price"]
-
-            # deduct stock for 1 quantity bc we're reordering 1
-            cur.execute("""
-                select warehouse_item_id, quantity_required
-                from Recipe
-                where menu_item_id = %s
-            """, (menu_item_id,))
-
-            for ing in cur.fetchall():
-                used = ing["quantity_required"]
-
-                # check if stock is available
-                cur.execute(
-                    "select stock_quantity from Warehouse_Item where item_id = %s",
-                    (ing["warehouse_item_id"],))
-                
-                if cur.fetchone()["stock_quantity"] < used:  # if the warehouse doesnt have enough stock cant order
-                    conn.rollback()
-                    return "Insufficient stock."
-
-                # else update warehouse stock deducting
-                cur.execute("""
-                    update Warehouse_Item
-                    set stock_quantity = stock_quantity - %s
-                    where item_id = %s
-                """, (used, ing["warehouse_item_id"]))
-
-                emp_id = session["emp_id"]
-
-                # inserting stock movement
-                cur.execute("""
-                    insert into Stock_Movement
-                    (movement_type, quantity_change, movement_date, warehouse_item_id, emp_id)
-                    values ('order', %s, now(), %s, %s)
-                """, (-used, ing["warehouse_item_id"], emp_id))
-
-            # restore the item with quantity 1 can later be incremented
-            cur.execute("""
-                update Order_Item
-                set item_status = 'ordered',
-                    quantity = 1,
-                    subtotal = %s
-                where order_id = %s
-                and menu_item_id = %s
-                and item_status = 'cancelled'
-            """, (price, order_id, menu_item_id))
-
-            # order state goes back to ordered
-            cur.execute("""
-                update Orders
-                set order_status = 'ordered'
-                where order_id = %s
-            """, (order_id,))
-
-            recompute_order_total(cur, order_id)
-            conn.commit()
-
-            return redirect(url_for("order_page", order_id=order_id))
-
-
-        # -------- cancel whole order --------
-        elif action == "cancel_order" and not paid:
-
-            # get all items in the order except canceled ones
-            cur.execute("""
-                select menu_item_id, quantity
-                from Order_Item
-                where order_id = %s
-                and item_status != 'cancelled'
-                and quantity > 0
-            """, (order_id,))
-
-            items = cur.fetchall()
-
-            for item in items:
-                menu_item_id = item["menu_item_id"]
-                qty = item["quantity"]
-
-                # get recipe
-                cur.execute("""
-                    select warehouse_item_id, quantity_required
-                    from Recipe
-                    where menu_item_id = %s
-                """, (menu_item_id,))
-
-                for ing in cur.fetchall():
-                    returned = ing["quantity_required"] * qty
+            menu_item_id = int(request.form["menu_item_id"])
 
-                    # return stock to warehouse
-                    cur.execute("""
-                        update Warehouse_Item
-                        set stock_quantity = stock_quantity + %s
-                        where item_id = %s
-                    """, (returned, ing["warehouse_item_id"]))
+            try:
+                db.run_in_transaction(conn, uncancel_order_item, order_id, menu_item_id,
+                                      session["emp_id"])
+            except InsufficientStock:  # if the warehouse doesnt have enough stock cant order
+                return "Insufficient stock."
 
-                    emp_id = session["emp_id"]
+            table_events.publish(cur, order_id=order_id)
 
-                    # insert stock movement
-                    cur.execute("""
-                        insert into Stock_Movement
-                        (movement_type, quantity_change, movement_date, warehouse_item_id, emp_id)
-                        values ('cancel_order', %s, now(), %s, %s)
-                    """, (returned, ing["warehouse_item_id"], emp_id))
+            return redirect(url_for("order_page", order_id=order_id))
 
-            # cancel all items
-            cur.execute("""
-                update Order_Item
-                set item_status = 'cancelled',
-                    quantity = 0,
-                    subtotal = 0
-                where order_id = %s
-            """, (order_id,))
 
-            # cancel the order itself
-            cur.execute("""
-                update Orders
-                set order_status = 'cancelled',
-                    total = 0
-                where order_id = %s
-            """, (order_id,))
+        # -------- cancel whole order --------
+        elif action == "cancel_order" and not paid:
 
-            conn.commit()
+            if db.run_in_transaction(conn, cancel_whole_order, order_id, session["emp_id"]):
+                table_events.publish(cur, order_id=order_id)
             return redirect(url_for("tables_dashboard"))
 
 
@@ -1113,6 +1049,7 @@ def order_page(order_id):
             """, (order_id,))
 
             conn.commit()
+            table_events.publish(cur, order_id=order_id)
 
         # -------- pay --------
         elif action == "pay":
@@ -1129,8 +1066,18 @@ def order_page(order_id):
                 values (now(), %s, %s, 'order', %s)
             """, (total, method, order_id))
 
-            cur.execute("update Orders set order_status = 'paid' where order_id = %s", (order_id,))
+            cur.execute("""
+                update Orders
+                set order_status = 'paid'
+                where order_id = %s and order_status != 'paid'
+            """, (order_id,))
+
+            # only count the order in the dashboard rollups the first time it is paid
+            if cur.rowcount == 1:
+                record_paid_order(cur, order_id)
+
             conn.commit()
+            table_events.publish(cur, order_id=order_id)
             message = "paid"
 
             return redirect(url_for("order_page", order_id=order_id))
@@ -1170,8 +1117,8 @@ def order_page(order_id):
     cur.execute("select * from Orders where order_id = %s", (order_id,))
     order = cur.fetchone()
 
-    cur.execute("select item_id, item_name, price from Menu_Item where is_available = 1")
-    menu_items = cur.fetchall()
+    # menu comes from the in-memory catalog (see catalog.py)
+    menu_items = menu_catalog.get(cur).menu_items
 
     cur.execute("""
         select oi.menu_item_id, m.item_name, oi.quantity, oi.subtotal, oi.item_status
@@ -1213,6 +1160,72 @@ def order_page(order_id):
         assigned_employees=assigned_employees
     )
 
+# adding a whole basket of items to an order in one request (form or JSON)
+@app.route("/order/<int:order_id>/batch", methods=["POST"])
+@login_required
+def order_batch(order_id):
+    wants_json = request.is_json
+
+    def fail(message, status):
+        if wants_json:
+            return jsonify({"error": message}), status
+        return message, status
+
+    try:
+        lines = parse_order_lines()
+    except ValueError as e:
+        return fail(str(e), 400)
+
+    if not lines:
+        return fail("No items to add.", 400)
+
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+
+    cur.execute("select order_status from Orders where order_id = %s", (order_id,))
+    order = cur.fetchone()
+
+    if not order:
+        cur.close()
+        conn.close()
+        return fail("Order not found", 404)
+
+    if order["order_status"] in ("paid", "cancelled"):
+        cur.close()
+        conn.close()
+        return fail(f"Order is {order['order_status']}. No changes allowed.", 409)
+
+    # every item of the basket must exist and be on the menu
+    available = {m["item_id"] for m in menu_catalog.get(cur).menu_items}
+
+    if any(menu_item_id not in available for menu_item_id, _ in lines):
+        cur.close()
+        conn.close()
+        return fail("Some items are not available.", 400)
+
+    try:
+        db.run_in_transaction(conn, add_order_items, order_id, lines, session["emp_id"])
+    except InsufficientStock:
+        cur.close()
+        conn.close()
+        return fail("Insufficient stock.", 409)
+
+    table_events.publish(cur, order_id=order_id)
+
+    if not wants_json:
+        cur.close()
+        conn.close()
+        return redirect(url_for("order_page", order_id=order_id))
+
+    cur.execute("select total from Orders where order_id = %s", (order_id,))
+    total = cur.fetchone()["total"]
+
+    cur.close()
+    conn.close()
+
+    return jsonify({"order_id": order_id, "lines": len(lines), "total": total})
+
+
 @app.route("/recipes")
 @login_required
 def recipes():
@@ -1353,7 +1366,9 @@ def edit_recipe(menu_item_id):
                     values (%s, %s, %s)
                 """, (menu_item_id, warehouse_item_id, quantity_required))
 
+            menu_catalog.invalidate(cur)
             conn.commit()
+            costing_engine.recipe_changed(cur, [menu_item_id])
             return redirect(url_for("edit_recipe", menu_item_id=menu_item_id))
 
         # ---------- update quantity required of ingredient ----------
@@ -1370,7 +1385,9 @@ def edit_recipe(menu_item_id):
                 where menu_item_id = %s and warehouse_item_id = %s and is_active = 1
             """, (quantity_required, menu_item_id, warehouse_item_id))
 
+            menu_catalog.invalidate(cur)
             conn.commit()
+            costing_engine.recipe_changed(cur, [menu_item_id])
             return redirect(url_for("edit_recipe", menu_item_id=menu_item_id))
 
         # ---------- remove ingredient (deactivate) ----------
@@ -1383,7 +1400,9 @@ def edit_recipe(menu_item_id):
                 where menu_item_id = %s and warehouse_item_id = %s
             """, (menu_item_id, warehouse_item_id))
 
+            menu_catalog.invalidate(cur)
             conn.commit()
+            costing_engine.recipe_changed(cur, [menu_item_id])
             return redirect(url_for("edit_recipe", menu_item_id=menu_item_id))
         
         # ---- reactivate ingredient ----
@@ -1396,7 +1415,9 @@ def edit_recipe(menu_item_id):
                 where menu_item_id = %s and warehouse_item_id = %s
             """, (menu_item_id, warehouse_item_id))
 
+            menu_catalog.invalidate(cur)
             conn.commit()
+            costing_engine.recipe_changed(cur, [menu_item_id])
             return redirect(url_for("edit_recipe", menu_item_id=menu_item_id))
 
 
@@ -1904,32 +1925,38 @@ def customers_list():
         "customer_id": "customer_id"
     }
 
+    where = ""
+    params = ()
+
     if search and field in text_fields:
         column = text_fields[field]
-        cur.execute(f"""
-            SELECT *
-            FROM Customer
-            WHERE {column} LIKE %s
-            ORDER BY {sort_column} {order_sql}
-        """, (f"%{search}%",))
+        where = f"{column} LIKE %s"
+        params = (f"%{search}%",)
 
     elif search and field in numeric_fields:
         column = numeric_fields[field]
-        cur.execute(f"""
-            SELECT *
-            FROM Customer
-            WHERE {column} = %s
-            ORDER BY {sort_column} {order_sql}
-        """, (search,))
+        where = f"{column} = %s"
+        params = (search,)
 
-    else:
-        cur.execute(f"""
-            SELECT *
-            FROM Customer
-            ORDER BY {sort_column} {order_sql}
-        """)
+    # customer_id breaks ties so the page key is unique
+    keys = [(sort_column, sort_column)]
+    if sort_column != "customer_id":
+        keys.append(("customer_id", "customer_id"))
 
-    customers = cur.fetchall()
+    page = keyset_page(
+        cur,
+        """
+        SELECT *
+        FROM Customer
+        """,
+        keys=keys,
+        table="Customer",
+        where=where,
+        params=params,
+        descending=(order_sql == "DESC")
+    )
+
+    customers = page.rows
     cur.close()
     conn.close()
 
@@ -1937,7 +1964,8 @@ def customers_list():
         "customers.html",
         customers=customers,
         sort_by=sort,
-        order=order
+        order=order,
+        page=page
     )
 
 
@@ -1989,48 +2017,44 @@ def payments():
         abort(403)
 
     conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-
-    field = request.args.get("field")
-    search = request.args.get("search")
+    cur = conn.cursor(records=True)
 
-    text_fields = {"payment_date": "DATE(payment_date)"}
-
-    numeric_fields = {"order_id": "order_id",
-                        "amount": "amount",
-                        "payment_id": "payment_id"}
-
-    if search and field in text_fields:
-        column = text_fields[field]
-
-        cur.execute(f"""
-            select *
-            from Payment
-            where {column} = %s
-            order by payment_id DESC
-        """, (search,))
-
-    elif search and field in numeric_fields:
-        column = numeric_fields[field]
-        cur.execute(f"""
-            select *
-            from Payment
-            where {column} = %s
-            order by payment_id DESC
-        """, (search,))
+    where, params = payments_filter()
 
-    else:
-        cur.execute("""
-            select *
-            from Payment
-            order by payment_id DESC
-        """)
+    include_archive = archive.wants_archive(request.args)
+    page = keyset_page(
+        cur,
+        f"""
+        select *
+        from {archive.source("Payment", include_archive)} p
+        """,
+        keys=[("payment_id", "payment_id")],
+        table=archive.tables("Payment", include_archive),
+        where=where,
+        params=params,
+        descending=True
+    )
 
-    payments = cur.fetchall()
+    payments = page.rows
     cur.close()
     conn.close()
 
-    return render_template("payments.html", payments=payments)
+    return render_template("payments.html", payments=payments, page=page)
+
+
+@app.route("/payments/export")
+@login_required
+@admin_required
+def payments_export():
+    where, params = payments_filter()
+    return export_response(
+        "payments",
+        f"""
+        select *
+        from {archive.source("Payment", archive.wants_archive(request.args))} p
+        """,
+        where, params, date_column="payment_date", key="payment_id"
+    )
 
 
 @app.route("/menu")
@@ -2105,8 +2129,10 @@ def edit_menu_item(item_id):
                 price = %s
             where item_id = %s
         """, (item_name, category, price, item_id))
+        menu_catalog.invalidate(cur)
 
         conn.commit()
+        costing_engine.menu_changed(cur, [item_id])
         cur.close()
         conn.close()
 
@@ -2143,6 +2169,7 @@ def toggle_menu_item(item_id):
         set is_available = 1 - is_available
         where item_id = %s
     """, (item_id,))
+    menu_catalog.invalidate(cur)
 
     conn.commit()
     cur.close()
@@ -2171,6 +2198,7 @@ def add_menu_item():
             insert into Menu_Item (item_name, category, price, date_added)
             values (%s, %s, %s, CURDATE())
         """, (item_name, category, price))
+        menu_catalog.invalidate(cur)
 
         conn.commit()
         cur.close()
@@ -2205,29 +2233,35 @@ def warehouse_items():
     if search and field in text_fields:
         column = text_fields[field]
         cur.execute(f"""
-            SELECT *,
-                   (stock_quantity <= reorder_level) AS is_low_stock
-            FROM Warehouse_Item
-            WHERE {column} LIKE %s
-            ORDER BY item_id
+            SELECT w.*,
+                   (w.stock_quantity <= w.reorder_level) AS is_low_stock,
+                   f.days_until_stockout, f.reorder_point AS forecast_reorder_point
+            FROM Warehouse_Item w
+            LEFT JOIN Stock_Forecast f ON f.warehouse_item_id = w.item_id
+            WHERE w.{column} LIKE %s
+            ORDER BY w.item_id
         """, (f"%{search}%",))
 
     elif search and field in numeric_fields:
         column = numeric_fields[field]
         cur.execute(f"""
-            SELECT *,
-                   (stock_quantity <= reorder_level) AS is_low_stock
-            FROM Warehouse_Item
-            WHERE {column} = %s
-            ORDER BY item_id
+            SELECT w.*,
+                   (w.stock_quantity <= w.reorder_level) AS is_low_stock,
+                   f.days_until_stockout, f.reorder_point AS forecast_reorder_point
+            FROM Warehouse_Item w
+            LEFT JOIN Stock_Forecast f ON f.warehouse_item_id = w.item_id
+            WHERE w.{column} = %s
+            ORDER BY w.item_id
         """, (search,))
 
     else:
         cur.execute("""
-            SELECT *,
-                   (stock_quantity <= reorder_level) AS is_low_stock
-            FROM Warehouse_Item
-            ORDER BY item_id
+            SELECT w.*,
+                   (w.stock_quantity <= w.reorder_level) AS is_low_stock,
+                   f.days_until_stockout, f.reorder_point AS forecast_reorder_point
+            FROM Warehouse_Item w
+            LEFT JOIN Stock_Forecast f ON f.warehouse_item_id = w.item_id
+            ORDER BY w.item_id
         """)
 
     items = cur.fetchall()
@@ -2237,6 +2271,33 @@ def warehouse_items():
     return render_template("warehouse.html", items=items)
 
 
+# warehouse stock at a past moment (see snapshots.py), ?format=json for the API
+@app.route("/warehouse/as_of")
+@login_required
+@admin_required
+def warehouse_as_of():
+    at = request.args.get("at")
+    item_id = request.args.get("item_id", type=int)
+
+    try:
+        as_of = datetime.fromisoformat(at) if at else datetime.now()
+    except ValueError:
+        abort(400)
+
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+
+    items = stock_as_of(cur, as_of, item_id)
+
+    cur.close()
+    conn.close()
+
+    if request.args.get("format") == "json":
+        return jsonify({"as_of": as_of.isoformat(), "items": items})
+
+    return render_template("stock_as_of.html", items=items, as_of=as_of)
+
+
 # adding new warehouse items
 @app.route("/warehouse/new", methods=["GET", "POST"])
 @login_required
@@ -2288,6 +2349,16 @@ def edit_warehouse_item(item_id):
         reorder = request.form["reorder_level"]
         unit = request.form["unit_of_measure"]
 
+        # a manual stock correction is recorded as a movement too,
+        # so the stock history (snapshots + movements) stays right
+        cur.execute("""
+            select stock_quantity
+            from Warehouse_Item
+            where item_id = %s
+            for update
+        """, (item_id,))
+        row = cur.fetchone()
+
         cur.execute("""
             update Warehouse_Item
             set item_name = %s,
@@ -2297,6 +2368,12 @@ def edit_warehouse_item(item_id):
             where item_id = %s
         """, (name, stock, reorder, unit, item_id))
 
+        if row and float(stock) != row["stock_quantity"]:
+            insert_movements(cur, """
+                select 'adjustment' as movement_type, %s as quantity_change,
+                       %s as warehouse_item_id, %s as emp_id
+            """, (float(stock) - row["stock_quantity"], item_id, session["emp_id"]))
+
         conn.commit()
         cur.close()
         conn.close()
@@ -2324,60 +2401,49 @@ def edit_warehouse_item(item_id):
 @admin_required
 def stock_movement():
     conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-
-    field = request.args.get("field")
-    search = request.args.get("search")
-
-    text_fields = {
-        "movement_type": "sm.movement_type",
-        "employee_name": "e.emp_name",
-        "item_name": "w.item_name",
-        "movement_date": "DATE(sm.movement_date)"
-    }
-
-    numeric_fields = {
-        "movement_id": "sm.movement_id",
-        "emp_id": "sm.emp_id",
-        "warehouse_item_id": "sm.warehouse_item_id"
-    }
-
-    if search and field in text_fields:
-        column = text_fields[field]
-        cur.execute(f"""
-            select sm.*, e.emp_name, w.item_name
-            from Stock_Movement sm
-            join Employee e ON sm.emp_id = e.emp_id
-            join Warehouse_Item w ON sm.warehouse_item_id = w.item_id
-            where {column} like %s
-            order by sm.movement_id DESC
-        """, (f"%{search}%",))
-
-    elif search and field in numeric_fields:
-        column = numeric_fields[field]
-        cur.execute(f"""
-            select sm.*, e.emp_name, w.item_name
-            from Stock_Movement sm
-            join Employee e ON sm.emp_id = e.emp_id
-            join Warehouse_Item w ON sm.warehouse_item_id = w.item_id
-            where {column} = %s
-            order by sm.movement_id DESC
-        """, (search,))
-
-    else:
-        cur.execute("""
-            select sm.*, e.emp_name, w.item_name
-            from Stock_Movement sm
-            join Employee e ON sm.emp_id = e.emp_id
-            join Warehouse_Item w ON sm.warehouse_item_id = w.item_id
-            order by sm.movement_id DESC
-        """)
+    cur = conn.cursor(records=True)
+
+    where, params = stock_movement_filter()
+
+    include_archive = archive.wants_archive(request.args)
+    page = keyset_page(
+        cur,
+        f"""
+        select sm.*, e.emp_name, w.item_name
+        from {archive.source("Stock_Movement", include_archive)} sm
+        join Employee e ON sm.emp_id = e.emp_id
+        join Warehouse_Item w ON sm.warehouse_item_id = w.item_id
+        """,
+        keys=[("sm.movement_id", "movement_id")],
+        table=archive.tables("Stock_Movement", include_archive),
+        where=where,
+        params=params,
+        descending=True
+    )
 
-    movements = cur.fetchall()
+    movements = page.rows
     cur.close()
     conn.close()
 
-    return render_template("stock_movement.html", movements=movements)
+    return render_template("stock_movement.html", movements=movements, page=page)
+
+
+@app.route("/stock_movements/export")
+@login_required
+@admin_required
+def stock_movement_export():
+    where, params = stock_movement_filter()
+    return export_response(
+        "stock_movements",
+        f"""
+        select sm.movement_id, sm.movement_type, sm.quantity_change, sm.movement_date,
+               sm.warehouse_item_id, w.item_name, sm.emp_id, e.emp_name
+        from {archive.source("Stock_Movement", archive.wants_archive(request.args))} sm
+        join Employee e ON sm.emp_id = e.emp_id
+        join Warehouse_Item w ON sm.warehouse_item_id = w.item_id
+        """,
+        where, params, date_column="sm.movement_date", key="sm.movement_id"
+    )
 
 
 @app.route("/suppliers")
@@ -2576,45 +2642,39 @@ def supplier_items():
         "warehouse_item_id": "w.item_id",
         "avg_delivery_days": "avg_delivery_days"}
 
+    where = ""
+    params = ()
+
     if search and field in text_fields:
         column = text_fields[field]
-        cur.execute(f"""
-            select s.supplier_id, s.supplier_name, w.item_id, w.item_name, w.unit_of_measure, 
-                        si.unit_price, si.avg_delivery_days,  si.is_supplying
-            from Supplier_Item si
-            join Supplier s ON si.supplier_id = s.supplier_id
-            join Warehouse_Item w ON si.warehouse_item_id = w.item_id
-            where {column} like %s
-            order by s.supplier_id, w.item_id
-        """, (f"%{search}%",))
+        where = f"{column} like %s"
+        params = (f"%{search}%",)
 
     elif search and field in numeric_fields:
         column = numeric_fields[field]
-        cur.execute(f"""
-            select s.supplier_id, s.supplier_name, w.item_id, w.item_name, w.unit_of_measure, 
-                        si.unit_price, si.avg_delivery_days, si.is_supplying
-            from Supplier_Item si
-            join Supplier s ON si.supplier_id = s.supplier_id
-            join Warehouse_Item w ON si.warehouse_item_id = w.item_id
-            where {column} = %s
-            order by s.supplier_id, w.item_id
-        """, (search,))
+        where = f"{column} = %s"
+        params = (search,)
 
-    else:
-        cur.execute("""
-            select s.supplier_id, s.supplier_name, w.item_id, w.item_name, w.unit_of_measure, 
-                        si.unit_price, si.avg_delivery_days, si.is_supplying
-            from Supplier_Item si
-            join Supplier s ON si.supplier_id = s.supplier_id
-            join Warehouse_Item w ON si.warehouse_item_id = w.item_id
-            order by s.supplier_id, w.item_id
-        """)
+    page = keyset_page(
+        cur,
+        """
+        select s.supplier_id, s.supplier_name, w.item_id, w.item_name, w.unit_of_measure, 
+                    si.unit_price, si.avg_delivery_days, si.is_supplying
+        from Supplier_Item si
+        join Supplier s ON si.supplier_id = s.supplier_id
+        join Warehouse_Item w ON si.warehouse_item_id = w.item_id
+        """,
+        keys=[("si.supplier_id", "supplier_id"), ("si.warehouse_item_id", "item_id")],
+        table="Supplier_Item",
+        where=where,
+        params=params
+    )
 
-    suppliers = cur.fetchall()
+    suppliers = page.rows
     cur.close()
     conn.close()
 
-    return render_template("supplier_items.html", suppliers=suppliers)
+    return render_template("supplier_items.html", suppliers=suppliers, page=page)
 
 @app.route("/supplier_items/toggle_supplying", methods=["POST"])
 @login_required
@@ -2634,6 +2694,7 @@ def toggle_supplier_item_supplying():
     """, (supplier_id, warehouse_item_id))
 
     conn.commit()
+    costing_engine.prices_changed(cur, [warehouse_item_id])
     cur.close()
     conn.close()
 
@@ -2665,6 +2726,7 @@ def add_supplier_item():
             """, (supplier_id, item_id, unit_price, avg_days))
 
             conn.commit()
+            costing_engine.prices_changed(cur, [int(item_id)])
             cur.close()
             conn.close()
             return redirect(url_for("supplier_items"))
@@ -2719,6 +2781,7 @@ def edit_supplier_item(supplier_id, item_id):
         """, (unit_price, avg_days, supplier_id, item_id))
 
         conn.commit()
+        costing_engine.prices_changed(cur, [item_id])
         cur.close()
         conn.close()
         return redirect(url_for("supplier_items"))
@@ -2772,39 +2835,58 @@ def purchases_list():
         "total_cost": "total_cost"
     }
 
-    if search and field in text_fields:
+    date_range = search_date_range(search) if search and field == "purchase_date" else None
+
+    where = ""
+    params = ()
+
+    if date_range:
+        where = "p.purchase_date >= %s and p.purchase_date < %s"
+        params = date_range
+
+    elif search and field in text_fields:
         column = text_fields[field]
-        cur.execute(f"""
-            select p.purchase_id, p.purchase_date, p.total_cost, p.purchase_status, s.supplier_name
-            from Purchase p
-            join Supplier s on p.supplier_id = s.supplier_id
-            where {column} like %s
-            order by purchase_id desc
-        """, (f"%{search}%",))
+        where = f"{column} like %s"
+        params = (f"%{search}%",)
 
     elif search and field in numeric_fields:
         column = numeric_fields[field]
-        cur.execute(f"""
-            select p.purchase_id, p.purchase_date, p.total_cost, p.purchase_status, s.supplier_name
-            from Purchase p
-            join Supplier s on p.supplier_id = s.supplier_id
-            where {column} = %s
-            order by purchase_id desc
-        """, (search,))
+        where = f"{column} = %s"
+        params = (search,)
 
-    else:
-        cur.execute("""
-            select p.purchase_id, p.purchase_date, p.total_cost, p.purchase_status, s.supplier_name
-            from Purchase p
-            join Supplier s on p.supplier_id = s.supplier_id
-            order by purchase_id desc
-        """)
+    page = keyset_page(
+        cur,
+        """
+        select p.purchase_id, p.purchase_date, p.total_cost, p.purchase_status, s.supplier_name
+        from Purchase p
+        join Supplier s on p.supplier_id = s.supplier_id
+        """,
+        keys=[("p.purchase_id", "purchase_id")],
+        table="Purchase",
+        where=where,
+        params=params,
+        descending=True
+    )
 
-    purchases = cur.fetchall()
+    purchases = page.rows
     cur.close()
     conn.close()
 
-    return render_template("purchases.html", purchases=purchases)
+    return render_template("purchases.html", purchases=purchases, page=page)
+
+# draft purchases for every low-stock item at once, one per supplier (see reorder.py)
+@app.route("/purchases/auto_reorder", methods=["POST"])
+@login_required
+@admin_required
+def auto_reorder():
+    conn = get_db_connection()
+
+    db.run_in_transaction(conn, create_reorder_drafts, session["emp_id"])
+
+    conn.close()
+
+    # show the drafts
+    return redirect(url_for("purchases_list", field="purchase_status", search="draft"))
 
 @app.route("/start_purchase", methods=["GET", "POST"])
 @login_required
@@ -2886,6 +2968,7 @@ def start_purchase():
 @app.route("/purchase/<int:purchase_id>", methods=["GET", "POST"])
 @login_required
 @admin_required
+@query_budget(10)
 def purchase_page(purchase_id):
     conn = get_db_connection()
     cur = conn.cursor(dictionary=True)
@@ -3064,28 +3147,21 @@ def purchase_page(purchase_id):
             if purchase["purchase_status"] != "confirmed":
                 return redirect(url_for("purchase_page", purchase_id=purchase_id))
 
-            # get all items in this purchase
+            # update warehouse stock for all items of the purchase at once
             cur.execute("""
-                select warehouse_item_id, quantity
-                from Purchase_Item
-                where purchase_id = %s
+                update Warehouse_Item w
+                join Purchase_Item pi on pi.warehouse_item_id = w.item_id
+                set w.stock_quantity = w.stock_quantity + pi.quantity
+                where pi.purchase_id = %s
             """, (purchase_id,))
-            items = cur.fetchall()
-
-            for it in items:
-                # update warehouse stock
-                cur.execute("""
-                    update Warehouse_Item
-                    set stock_quantity = stock_quantity + %s
-                    where item_id = %s
-                """, (it["quantity"], it["warehouse_item_id"]))
 
-                # inser stock movement
-                cur.execute("""
-                    insert into Stock_Movement
-                    (movement_type, quantity_change, movement_date, warehouse_item_id, emp_id)
-                    values ('purchase', %s, now(), %s, %s)
-                """, (it["quantity"], it["warehouse_item_id"], session["emp_id"]))
+            # insert stock movements
+            insert_movements(cur, """
+                select 'purchase' as movement_type, quantity as quantity_change,
+                       warehouse_item_id, %s as emp_id
+                from Purchase_Item
+                where purchase_id = %s
+            """, (session["emp_id"], purchase_id))
 
             # mark as delivered
             cur.execute("""
@@ -3095,6 +3171,7 @@ def purchase_page(purchase_id):
             """, (purchase_id,))
 
             conn.commit()
+            costing_engine.purchase_delivered(cur, purchase_id)
             return redirect(url_for("purchase_page", purchase_id=purchase_id))
 
 
@@ -3190,6 +3267,103 @@ def purchase_page(purchase_id):
     )
 
 
+# monitoring numbers for the manager (connection pool, menu cache)
+@app.route("/stats")
+@login_required
+@admin_required
+def stats():
+    return jsonify({
+        "pool": db.pool_stats(),
+        "catalog": menu_catalog.stats(),
+        "dashboard_cache": dashboard_cache.stats(),
+        "movement_journal": movement_log.journal_stats(),
+        "statements": statements.stats(),
+    })
+
+
+# scraped by Prometheus, so no login: METRICS_TOKEN or METRICS_ALLOW instead (see metrics.init_app)
+@app.route("/metrics")
+def metrics_endpoint():
+    if not metrics.scrape_allowed():
+        abort(403)
+
+    gauges = {}
+    for name, value in db.pool_stats().items():
+        gauges[f"dawlo_db_pool_{name}"] = value
+    for name, value in menu_catalog.stats().items():
+        if isinstance(value, (int, float)):
+            gauges[f"dawlo_catalog_{name}"] = value
+    for name, value in (movement_log.journal_stats() or {}).items():
+        gauges[f"dawlo_movement_journal_{name}"] = value
+    for query, counters in statements.stats().items():
+        for name, value in counters.items():
+            gauges[f'dawlo_statement_{name}{{query="{query}"}}'] = value
+
+    return Response(metrics.render_metrics(gauges),
+                    mimetype="text/plain; version=0.0.4")
+
+
+# backfill: flask --app 1220071_1222640 rebuild-rollups
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Rebuilds the dashboard sales rollups from the order history."""
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+
+    rebuild_rollups(cur)
+    conn.commit()
+
+    cur.close()
+    conn.close()
+    print("Sales rollups rebuilt.")
+
+
+# nightly: flask --app 1220071_1222640 forecast-stock
+@app.cli.command("forecast-stock")
+def forecast_stock_command():
+    """Forecasts ingredient consumption and stores reorder points in Stock_Forecast."""
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+
+    results = forecast(cur)
+    store_forecast(cur, results)
+    conn.commit()
+
+    cur.close()
+    conn.close()
+    print(f"Forecast stored for {len(results)} warehouse items.")
+
+
+# daily: flask --app 1220071_1222640 snapshot-stock
+@app.cli.command("snapshot-stock")
+def snapshot_stock_command():
+    """Copies the current warehouse stock into Stock_Snapshot."""
+    conn = get_db_connection()
+    count = snapshot_stock(conn)
+    conn.close()
+    print(f"Stock snapshot taken for {count} warehouse items.")
+
+
+# monthly: flask --app 1220071_1222640 archive-history --keep-months 12
+@app.cli.command("archive-history")
+@click.option("--keep-months", default=archive.KEEP_MONTHS, show_default=True,
+              help="Recent months that stay in the live tables.")
+def archive_history_command(keep_months):
+    """Moves closed months of orders, payments and stock movements to the archive tables."""
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    months = archive.months_to_archive(cur, keep_months)
+    cur.close()
+
+    # one transaction per month keeps the locks short
+    for month_start, month_end in months:
+        moved = db.run_in_transaction(conn, archive.archive_month, month_start, month_end)
+        print(f"{month_start:%Y-%m}: " + ", ".join(f"{t} {n}" for t, n in moved.items()))
+
+    conn.close()
+    print(f"Archived {len(months)} months.")
+
+
 @app.errorhandler(404)
 def page_not_found(e):
     return render_template("404.html"), 404
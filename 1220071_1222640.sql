@@ -156,10 +156,17 @@ create table Stock_Movement ( -- 3NF
     movement_date timestamp not null,
     warehouse_item_id int not null,
     emp_id int not null,
+    journal_id char(32) unique, -- set for rows written behind from the movement journal (movement_log.py)
     foreign key (warehouse_item_id) references Warehouse_Item (item_id),
     foreign key (emp_id) references Employee (emp_id)
 );
 
+-- one row per committed transaction whose stock movements are still only in the movement journal;
+-- written in that transaction, deleted by the flush that inserts its movements (movement_log.py)
+create table Movement_Journal_Txn (
+    txn_id char(32) primary key
+);
+
 create table Payment ( -- 3NF
     payment_id int primary key auto_increment,
     payment_date timestamp not null,
@@ -172,6 +179,110 @@ create table Payment ( -- 3NF
     foreign key (purchase_id) references Purchase (purchase_id)
 );
 
+-- bumped on every menu/recipe change so cached menus in the app reload
+create table Catalog_Version (
+    id int primary key,
+    version int not null default 0
+);
+
+insert into Catalog_Version (id, version) values (1, 0);
+
+-- indexes for date range filters (dashboard, orders, payments, purchases, stock movements)
+create index idx_orders_status_date on Orders (order_status, order_date);
+create index idx_orders_date on Orders (order_date);
+create index idx_payment_date on Payment (payment_date);
+create index idx_purchase_status_date on Purchase (purchase_status, purchase_date);
+create index idx_purchase_date on Purchase (purchase_date);
+create index idx_stock_movement_date on Stock_Movement (movement_date);
+-- movements of one item after a snapshot (stock as of a date)
+create index idx_stock_movement_item_date on Stock_Movement (warehouse_item_id, movement_date);
+
+-- daily sales rollups for the manager dashboard
+-- filled when an order is paid, rebuilt with: flask --app 1220071_1222640 rebuild-rollups
+create table Daily_Sales (
+    sale_date date primary key,
+    revenue real not null default 0,
+    order_count int not null default 0
+);
+
+create table Daily_Item_Sales (
+    sale_date date,
+    menu_item_id int,
+    quantity int not null default 0,
+    sales real not null default 0,
+    primary key (sale_date, menu_item_id),
+    foreign key (menu_item_id) references Menu_Item (item_id)
+);
+
+create table Daily_Customer_Orders (
+    sale_date date,
+    customer_id int,
+    order_count int not null default 0,
+    primary key (sale_date, customer_id),
+    foreign key (customer_id) references Customer (customer_id)
+);
+
+create table Daily_Order_Type (
+    sale_date date,
+    order_type varchar(32),
+    order_count int not null default 0,
+    primary key (sale_date, order_type)
+);
+
+-- bumped whenever the rollups of a month (first day of it) change,
+-- so cached dashboard numbers for closed months know when to reload
+create table Sales_Period_Version (
+    period date primary key,
+    version int not null default 0
+);
+
+-- cumulative revenue / paid orders up to and including each day with sales
+-- (prefix sums, see revenue_index.py), filled when an order is paid
+create table Daily_Revenue_Index (
+    sale_date date primary key,
+    cum_revenue real not null default 0,
+    cum_orders int not null default 0
+);
+
+-- ingredient consumption forecast, written by: flask --app 1220071_1222640 forecast-stock
+create table Stock_Forecast (
+    warehouse_item_id int primary key,
+    daily_rate real not null default 0,
+    days_until_stockout real,            -- null = no stockout expected
+    lead_time_days int not null,
+    reorder_point real not null default 0,
+    computed_at timestamp not null,
+    foreign key (warehouse_item_id) references Warehouse_Item (item_id)
+);
+
+-- daily copy of the warehouse stock, written by: flask --app 1220071_1222640 snapshot-stock
+-- stock at any time = nearest earlier snapshot + the movements newer than its movement_id
+create table Stock_Snapshot (
+    warehouse_item_id int,
+    snapshot_at timestamp not null,
+    stock_quantity real not null,
+    movement_id int not null, -- newest Stock_Movement row already counted in stock_quantity
+    primary key (warehouse_item_id, snapshot_at),
+    foreign key (warehouse_item_id) references Warehouse_Item (item_id)
+);
+
+-- archive tier: closed months are moved here by: flask --app 1220071_1222640 archive-history
+-- "like" copies the columns and indexes but not the foreign keys, so old rows can leave the live tables
+create table Orders_Archive like Orders;
+alter table Orders_Archive row_format = compressed;
+
+create table Order_Item_Archive like Order_Item;
+alter table Order_Item_Archive row_format = compressed;
+
+create table Emp_Order_Archive like Emp_Order;
+alter table Emp_Order_Archive row_format = compressed;
+
+create table Payment_Archive like Payment;
+alter table Payment_Archive row_format = compressed;
+
+create table Stock_Movement_Archive like Stock_Movement;
+alter table Stock_Movement_Archive row_format = compressed;
+
 -- insertion of dummy data in required tables for module
 insert into Customer (customer_name, phone_number, email) values
 ('Ahmad Saleh', '0599123456', 'ahmad@gmail.com'),
@@ -338,6 +449,43 @@ VALUES
 -- May
 (3, NULL, NULL, '2025-05-25 19:20:00', 55.00, 'paid', 'takeaway');
 
+-- first stock snapshot of the items above
+insert into Stock_Snapshot (snapshot_at, warehouse_item_id, stock_quantity, movement_id)
+select now(), item_id, stock_quantity, (select ifnull(max(movement_id), 0) from Stock_Movement)
+from Warehouse_Item;
+
+-- fill the dashboard rollups from the orders above
+insert into Daily_Sales (sale_date, revenue, order_count)
+select date(order_date), sum(total), count(*)
+from Orders
+where order_status = 'paid'
+group by date(order_date);
+
+insert into Daily_Item_Sales (sale_date, menu_item_id, quantity, sales)
+select date(o.order_date), oi.menu_item_id, sum(oi.quantity), sum(oi.subtotal)
+from Order_Item oi
+join Orders o on o.order_id = oi.order_id
+where o.order_status = 'paid' and oi.item_status != 'cancelled'
+group by date(o.order_date), oi.menu_item_id;
+
+insert into Daily_Customer_Orders (sale_date, customer_id, order_count)
+select date(order_date), customer_id, count(*)
+from Orders
+where order_status = 'paid'
+group by date(order_date), customer_id;
+
+insert into Daily_Order_Type (sale_date, order_type, order_count)
+select date(order_date), order_type, count(*)
+from Orders
+where order_status = 'paid'
+group by date(order_date), order_type;
+
+insert into Daily_Revenue_Index (sale_date, cum_revenue, cum_orders)
+select sale_date,
+       sum(revenue) over (order by sale_date),
+       sum(order_count) over (order by sale_date)
+from Daily_Sales;
+
 
 SELECT * FROM Order_Item;
 select * from Orders;
@@ -0,0 +1,141 @@
+from datetime import date
+
+# archive tier for the history tables
+# closed months are moved from the live tables into <table>_Archive (compressed, no foreign keys)
+# by a rollover job: flask --app 1220071_1222640 archive-history --keep-months 12
+# so list views and lookups only touch recent rows. InnoDB does not allow partitioning
+# tables with foreign keys, which all of these have, hence archive tables instead of partitions.
+# the archive is only read when asked for (?archive=1 on the list views), and by rebuild-rollups,
+# which has to count the archived sales too. The rollups themselves keep archived days as they are.
+
+ARCHIVE_TABLES = {
+    "Orders": "Orders_Archive",
+    "Order_Item": "Order_Item_Archive",
+    "Emp_Order": "Emp_Order_Archive",
+    "Payment": "Payment_Archive",
+    "Stock_Movement": "Stock_Movement_Archive",
+}
+
+KEEP_MONTHS = 12
+
+# orders that are finished for good; open orders are never archived
+CLOSED_ORDERS = """
+    o.order_date >= %s and o.order_date < %s
+    and o.order_status in ('paid', 'cancelled')
+"""
+
+
+def source(table, include_archive=False):
+    """
+    FROM clause source for table: the live table, or live + archive when asked for.
+    Use it with an alias: f"from {source('Orders', archive)} o".
+    """
+    if not include_archive:
+        return table
+    return f"(select * from {table} union all select * from {ARCHIVE_TABLES[table]})"
+
+
+def tables(table, include_archive=False):
+    """The tables source() reads, for the row estimate of the list views."""
+    return [table, ARCHIVE_TABLES[table]] if include_archive else [table]
+
+
+def wants_archive(args):
+    return args.get("archive") == "1"
+
+
+def archive_month(cur, month_start, month_end):
+    """
+    Moves the closed rows of [month_start, month_end) into the archive tables.
+    Run it inside db.run_in_transaction. Returns {table: rows moved}.
+    """
+    moved = {}
+    span = (month_start, month_end)
+
+    # rows that hang off the closed orders go first (they reference Orders)
+    for table in ("Order_Item", "Emp_Order", "Payment"):
+        cur.execute(f"""
+            insert into {ARCHIVE_TABLES[table]}
+            select c.*
+            from {table} c
+            join Orders o on o.order_id = c.order_id
+            where {CLOSED_ORDERS}
+        """, span)
+        cur.execute(f"""
+            delete c
+            from {table} c
+            join Orders o on o.order_id = c.order_id
+            where {CLOSED_ORDERS}
+        """, span)
+        moved[table] = cur.rowcount
+
+    cur.execute(f"""
+        insert into Orders_Archive
+        select o.*
+        from Orders o
+        where {CLOSED_ORDERS}
+    """, span)
+    cur.execute(f"""
+        delete o
+        from Orders o
+        where {CLOSED_ORDERS}
+    """, span)
+    moved["Orders"] = cur.rowcount
+
+    # supplier payments of the month
+    cur.execute("""
+        insert into Payment_Archive
+        select *
+        from Payment
+        where payment_type = 'purchase'
+          and payment_date >= %s and payment_date < %s
+    """, span)
+    cur.execute("""
+        delete from Payment
+        where payment_type = 'purchase'
+          and payment_date >= %s and payment_date < %s
+    """, span)
+    moved["Payment"] += cur.rowcount
+
+    cur.execute("""
+        insert into Stock_Movement_Archive
+        select *
+        from Stock_Movement
+        where movement_date >= %s and movement_date < %s
+    """, span)
+    cur.execute("""
+        delete from Stock_Movement
+        where movement_date >= %s and movement_date < %s
+    """, span)
+    moved["Stock_Movement"] = cur.rowcount
+
+    return moved
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def months_to_archive(cur, keep_months=KEEP_MONTHS, today=None):
+    """
+    [(month_start, month_end)] of every month with live history older than the
+    keep_months most recent months, oldest first.
+    """
+    cutoff = _add_months((today or date.today()).replace(day=1), -keep_months)
+
+    cur.execute("""
+        select least(
+            ifnull((select min(order_date) from Orders), now()),
+            ifnull((select min(payment_date) from Payment), now()),
+            ifnull((select min(movement_date) from Stock_Movement), now())
+        ) as oldest
+    """)
+    oldest = cur.fetchone()["oldest"]
+
+    months = []
+    month = date(oldest.year, oldest.month, 1)
+    while month < cutoff:
+        months.append((month, _add_months(month, 1)))
+        month = _add_months(month, 1)
+    return months
@@ -0,0 +1,95 @@
+# throughput of recording stock movements, synchronous vs write-behind (movement_log.py)
+#   python benchmarks/bench_movement_journal.py [--transactions 2000] [--rows 4]
+# always: journal writes alone (fsync on / off), what write-behind adds to a transaction.
+# with DAWLO_TEST_DB set to a scratch database loaded from 1220071_1222640.sql: whole
+# transactions recording the movements both ways, and the time to flush the journal.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import movement_log
+
+ROWS_SQL = """
+    select 'bench' as movement_type, -1 as quantity_change, %s as warehouse_item_id, %s as emp_id
+    from Warehouse_Item
+    limit %s
+"""
+
+
+def report(label, transactions, seconds):
+    print(f"{label:<40} {transactions / seconds:>10.0f} tx/s  {seconds / transactions * 1e6:>8.1f} us/tx")
+
+
+def bench_journal(transactions, rows, fsync):
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = movement_log.MovementJournal(os.path.join(tmp, "movements.journal"), fsync=fsync)
+        journal.open()
+        record = [None, "bench", -1.0, "2026-01-01 00:00:00", 1, 1]
+        start = time.perf_counter()
+        for _ in range(transactions):
+            txn = uuid.uuid4().hex
+            journal.write(txn, [[uuid.uuid4().hex] + record[1:] for _ in range(rows)])
+            journal.committed(txn)
+        report(f"journal write, fsync={fsync}", transactions, time.perf_counter() - start)
+
+
+def bench_database(transactions, rows, tmp):
+    pool = db._pool = db.ConnectionPool(dict(db.DB_CONFIG, database=os.environ["DAWLO_TEST_DB"]))
+    conn = pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("select min(item_id) as item_id from Warehouse_Item")
+    item_id = cur.fetchone()["item_id"]
+    cur.execute("select min(emp_id) as emp_id from Employee")
+    emp_id = cur.fetchone()["emp_id"]
+    params = (item_id, emp_id, rows)
+
+    def record(c):
+        movement_log.insert_movements(c, ROWS_SQL, params, "bench.movements")
+
+    try:
+        for label, journal in (("synchronous insert", None),
+                               ("write-behind", movement_log.MovementJournal(os.path.join(tmp, "db.journal")))):
+            movement_log.journal = journal
+            if journal is not None:
+                journal.open()
+            start = time.perf_counter()
+            for _ in range(transactions):
+                db.run_in_transaction(conn, record)
+            report(f"transaction, {label}", transactions, time.perf_counter() - start)
+            if journal is not None:
+                start = time.perf_counter()
+                flushed = journal.flush()
+                print(f"{'flush':<40} {flushed / (time.perf_counter() - start):>10.0f} rows/s")
+    finally:
+        movement_log.journal = None
+        conn.rollback()
+        cur.execute("delete from Stock_Movement where movement_type = 'bench'")
+        conn.commit()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=4, help="movement rows per transaction")
+    args = parser.parse_args()
+
+    bench_journal(args.transactions, args.rows, fsync=True)
+    bench_journal(args.transactions, args.rows, fsync=False)
+
+    if os.environ.get("DAWLO_TEST_DB"):
+        with tempfile.TemporaryDirectory() as tmp:
+            bench_database(args.transactions, args.rows, tmp)
+    else:
+        print("set DAWLO_TEST_DB to also time whole transactions against a scratch database")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# memory and build time of result rows: dict rows vs records vs fetch_columns (rows.py)
+#   python benchmarks/bench_rows.py [--rows 100000]
+# the rows look like a page of /stock_movements (8 columns); no server needed, the tuples a
+# cursor would return are made up front and only the row objects built from them are measured.
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rows import columns_of, to_records
+
+COLUMNS = ("movement_id", "movement_type", "quantity_change", "movement_date",
+           "warehouse_item_id", "emp_id", "emp_name", "item_name")
+
+
+def make_tuples(count):
+    start = datetime(2026, 1, 1)
+    types = ("order", "cancel_item", "delivery", "adjustment")
+    names = ("Rana", "Omar", "Lina")
+    items = ("coffee beans", "milk", "sugar", "cups")
+    return [(i, types[i % 4], -1.5, start + timedelta(seconds=i), i % 40, i % 3 + 1,
+             names[i % 3], items[i % 4]) for i in range(count)]
+
+
+def measure(label, build, tuples):
+    # timed without tracemalloc, which slows every allocation down
+    gc.collect()
+    start = time.perf_counter()
+    result = build(tuples)
+    seconds = time.perf_counter() - start
+    del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = build(tuples)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    print(f"{label:<16} {size / 2**20:>7.1f} MB held  {peak / 2**20:>7.1f} MB peak  {seconds * 1000:>7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    tuples = make_tuples(args.rows)
+    print(f"{args.rows} rows x {len(COLUMNS)} columns")
+    measure("dict rows", lambda rows: [dict(zip(COLUMNS, row)) for row in rows], tuples)
+    measure("records", lambda rows: to_records(COLUMNS, rows), tuples)
+    measure("fetch_columns", lambda rows: columns_of(COLUMNS, rows), tuples)
+
+
+if __name__ == "__main__":
+    main()
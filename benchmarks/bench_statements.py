@@ -0,0 +1,80 @@
+# named prepared statements (statements.py) vs the same SQL sent as text every time
+#   DAWLO_TEST_DB=dawlo_test python benchmarks/bench_statements.py [--runs 5000]
+# needs a scratch database loaded from 1220071_1222640.sql. Times the hot order-flow queries
+# both ways on one pooled connection and reads the server's parse counters (Com_select /
+# Com_update count statements parsed from text, Com_stmt_execute prepared executions).
+# the recompute runs in a transaction that is rolled back at the end.
+
+import argparse
+import importlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+app_module = importlib.import_module("1220071_1222640")
+
+COUNTERS = ("Com_select", "Com_update", "Com_stmt_prepare", "Com_stmt_execute")
+
+
+def counters(cur):
+    cur.execute("show session status where variable_name in (%s, %s, %s, %s)", COUNTERS)
+    return {row["Variable_name"]: int(row["Value"]) for row in cur.fetchall()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5000)
+    args = parser.parse_args()
+
+    if not os.environ.get("DAWLO_TEST_DB"):
+        sys.exit("set DAWLO_TEST_DB to a scratch database loaded from 1220071_1222640.sql")
+
+    pool = db.ConnectionPool(dict(db.DB_CONFIG, database=os.environ["DAWLO_TEST_DB"]))
+    conn = pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("select min(table_id) as table_id from Table_Entity")
+    table_id = cur.fetchone()["table_id"]
+    cur.execute("select min(order_id) as order_id from Orders")
+    order_id = cur.fetchone()["order_id"]
+
+    queries = [
+        (app_module.ACTIVE_SESSION, (table_id,)),
+        (app_module.ORDER_STATUS, (order_id,)),
+        (app_module.ORDER_TOTAL, (order_id, order_id)),
+    ]
+
+    def as_text():
+        cur.execute(query.sql, params)
+        if cur.with_rows:
+            cur.fetchall()
+
+    def prepared():
+        prepared_cur = query.run(cur, params)
+        if prepared_cur.with_rows:
+            prepared_cur.fetchall()
+
+    try:
+        for query, params in queries:
+            for label, run in (("text", as_text), ("prepared", prepared)):
+                run()   # warm up (prepares on the first run)
+                before = counters(cur)
+                start = time.perf_counter()
+                for _ in range(args.runs):
+                    run()
+                seconds = time.perf_counter() - start
+                after = counters(cur)
+                delta = {name: after[name] - before[name] for name in COUNTERS}
+                print(f"{query.name:<28} {label:<9} {seconds / args.runs * 1e6:>8.1f} us/run  "
+                      + "  ".join(f"{name}={delta[name]}" for name in COUNTERS))
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# floor state for /tables and /floorplan: the per-table loop it replaced vs get_table_states
+#   DAWLO_TEST_DB=dawlo_test python benchmarks/bench_table_state.py [--tables 40] [--repeat 200]
+# needs a scratch database loaded from 1220071_1222640.sql. --tables extra tables, each with an
+# open session and a few orders, are added inside a transaction that is rolled back at the end.
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from table_state import get_table_states
+
+
+def per_table_states(cur):
+    """The loop /tables ran before get_table_states: 1 + up to 3 queries per table."""
+    cur.execute("select table_id, capacity from Table_Entity order by table_id")
+    result = []
+    for t in cur.fetchall():
+        cur.execute("""
+            select session_start
+            from Table_Session
+            where table_id = %s and is_closed = 0
+            order by session_start desc
+            limit 1
+        """, (t["table_id"],))
+        row = cur.fetchone()
+        active_start = row["session_start"] if row else None
+        latest_order = None
+        open_orders = 0
+        if active_start:
+            cur.execute("""
+                select order_id, order_status, total
+                from Orders
+                where table_id = %s and session_start = %s
+                order by order_date desc
+                limit 1
+            """, (t["table_id"], active_start))
+            latest_order = cur.fetchone()
+            cur.execute("""
+                select count(*) as cnt
+                from Orders
+                where table_id = %s and session_start = %s
+                  and order_status in ('pending', 'ordered', 'served')
+            """, (t["table_id"], active_start))
+            open_orders = cur.fetchone()["cnt"]
+        result.append((t["table_id"], active_start, latest_order, open_orders))
+    return result
+
+
+def add_floor(cur, tables, orders_per_table=3):
+    cur.execute("select min(customer_id) as customer_id from Customer")
+    customer_id = cur.fetchone()["customer_id"]
+    for _ in range(tables):
+        cur.execute("insert into Table_Entity (capacity) values (4)")
+        table_id = cur.lastrowid
+        cur.execute("""
+            insert into Table_Session (table_id, session_start, is_closed, party_size)
+            values (%s, now(), 0, 2)
+        """, (table_id,))
+        for status in ("paid", "served", "ordered")[:orders_per_table]:
+            cur.execute("""
+                insert into Orders (customer_id, table_id, session_start, order_date, total,
+                                    order_status, order_type)
+                select %s, table_id, session_start, now(), 10, %s, 'dine_in'
+                from Table_Session
+                where table_id = %s
+            """, (customer_id, status, table_id))
+
+
+def timed(label, work, cur, repeat, statements):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        work(cur)
+    seconds = time.perf_counter() - start
+    print(f"{label:<28} {seconds / repeat * 1000:>8.2f} ms/page  {len(statements) // repeat:>5} queries/page")
+    statements.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", type=int, default=40, help="extra tables with an open session")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    if not os.environ.get("DAWLO_TEST_DB"):
+        sys.exit("set DAWLO_TEST_DB to a scratch database loaded from 1220071_1222640.sql")
+
+    statements = []
+    db.add_query_hook(lambda statement, seconds: statement and statements.append(statement))
+
+    pool = db.ConnectionPool(dict(db.DB_CONFIG, database=os.environ["DAWLO_TEST_DB"]))
+    conn = pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    try:
+        add_floor(cur, args.tables)
+        cur.execute("select count(*) as n from Table_Entity")
+        print(f"{cur.fetchone()['n']} tables on the floor")
+        statements.clear()
+
+        timed("per-table queries (before)", per_table_states, cur, args.repeat, statements)
+        timed("get_table_states", get_table_states, cur, args.repeat, statements)
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
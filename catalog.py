@@ -0,0 +1,108 @@
+import threading
+import time
+
+# in-memory copy of the menu (available items, prices, active recipes)
+# the menu changes a few times a week, so order pages, the order prices and the stock changes
+# (stock.py) read it from here instead of the database.
+# Catalog_Version holds a counter that every menu/recipe write increments; each process checks it
+# at most every check_interval seconds and reloads when it changed, so all workers catch up.
+
+
+class MenuCatalog:
+    def __init__(self, check_interval=2.0):
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+
+        self.menu_items = []   # available items: item_id, item_name, price
+        self.prices = {}       # item_id -> price (all items, available or not)
+        self.recipes = {}      # item_id -> [(warehouse_item_id, quantity_required)] active rows
+
+        self.hits = 0
+        self.misses = 0
+
+    def _db_version(self, cur):
+        cur.execute("select version from Catalog_Version where id = 1")
+        row = cur.fetchone()
+        return row["version"] if row else 0
+
+    def _load(self, cur):
+        cur.execute("select item_id, item_name, price, is_available from Menu_Item order by item_id")
+        items = cur.fetchall()
+
+        cur.execute("""
+            select menu_item_id, warehouse_item_id, quantity_required
+            from Recipe
+            where is_active = 1
+            order by menu_item_id, warehouse_item_id
+        """)
+        recipes = {}
+        for r in cur.fetchall():
+            recipes.setdefault(r["menu_item_id"], []).append(
+                (r["warehouse_item_id"], r["quantity_required"]))
+
+        # swap in whole new objects so readers never see a half loaded catalog
+        self.menu_items = [
+            {"item_id": i["item_id"], "item_name": i["item_name"], "price": i["price"]}
+            for i in items if i["is_available"] == 1
+        ]
+        self.prices = {i["item_id"]: i["price"] for i in items}
+        self.recipes = recipes
+
+    def get(self, cur):
+        """
+        Returns the catalog, reloading it first if another write changed the menu.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._version is not None and now - self._checked_at < self.check_interval:
+                self.hits += 1
+                return self
+
+            version = self._db_version(cur)
+            self._checked_at = now
+
+            if version == self._version:
+                self.hits += 1
+                return self
+
+            self.misses += 1
+            self._load(cur)
+            self._version = version
+            return self
+
+    def price(self, cur, item_id):
+        return self.get(cur).prices.get(item_id)
+
+    def invalidate(self, cur):
+        """
+        Call from routes that change Menu_Item or Recipe, in the same transaction.
+        The local copy is dropped once it commits: dropped earlier, a reload could
+        pick up the old rows again and keep them.
+        """
+        cur.execute("update Catalog_Version set version = version + 1 where id = 1")
+        connection = getattr(cur, "connection", None)
+        if connection is not None:
+            connection.after_commit(self._expire)
+        else:
+            self._expire()
+
+    def _expire(self):
+        with self._lock:
+            self._version = None
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0,
+                "menu_items": len(self.menu_items),
+            }
+
+
+menu_catalog = MenuCatalog()
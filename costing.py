@@ -0,0 +1,203 @@
+import threading
+import time
+
+# ingredient cost and margin of every menu item
+# the active recipes form a (menu item x warehouse item) matrix of quantities, kept sparse as
+# one {warehouse_item_id: quantity} row per menu item; the unit prices form one vector per policy.
+# cost = recipe row . price vector, computed for all items in one pass.
+# when an input changes only the affected rows are recomputed:
+#   recipe edited          -> that menu item
+#   supplier price / delivery -> every menu item using that ingredient (column index used_in)
+#
+# policies:
+#   cheapest          -> lowest unit price of the suppliers currently supplying the ingredient
+#   weighted_average  -> average unit price paid over delivered purchases, weighted by quantity
+#                        (the cheapest supplier price for ingredients never delivered)
+
+POLICIES = ("cheapest", "weighted_average")
+
+
+def _in_clause(column, ids):
+    if ids is None:
+        return "", []
+    ids = list(ids)
+    return f" and {column} in ({', '.join(['%s'] * len(ids))})", ids
+
+
+class CostingEngine:
+    def __init__(self, max_age=300.0):
+        # other workers do not see this process's incremental updates,
+        # so everything is reloaded after max_age seconds
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._loaded_at = None
+
+        self.menu = {}      # menu item id -> (item_name, selling price)
+        self.recipes = {}   # menu item id -> {warehouse item id: quantity_required}
+        self.used_in = {}   # warehouse item id -> {menu item ids}
+        self.prices = {policy: {} for policy in POLICIES}   # warehouse item id -> unit price
+        self.costs = {policy: {} for policy in POLICIES}    # menu item id -> cost (None = unknown)
+
+    # ---------- loading ----------
+
+    def _read_menu(self, cur, item_ids=None):
+        where, params = _in_clause("item_id", item_ids)
+        cur.execute("select item_id, item_name, price from Menu_Item where 1 = 1" + where, params)
+        return {r["item_id"]: (r["item_name"], float(r["price"])) for r in cur.fetchall()}
+
+    def _read_recipes(self, cur, menu_item_ids=None):
+        where, params = _in_clause("menu_item_id", menu_item_ids)
+        cur.execute("""
+            select menu_item_id, warehouse_item_id, quantity_required
+            from Recipe
+            where is_active = 1
+        """ + where, params)
+        rows = {item_id: {} for item_id in (menu_item_ids or ())}
+        for r in cur.fetchall():
+            rows.setdefault(r["menu_item_id"], {})[r["warehouse_item_id"]] = float(r["quantity_required"])
+        return rows
+
+    def _read_prices(self, cur, warehouse_item_ids=None):
+        where, params = _in_clause("warehouse_item_id", warehouse_item_ids)
+        cur.execute("""
+            select warehouse_item_id, min(unit_price) as price
+            from Supplier_Item
+            where is_supplying = 1
+        """ + where + " group by warehouse_item_id", params)
+        cheapest = {r["warehouse_item_id"]: float(r["price"]) for r in cur.fetchall()}
+
+        where, params = _in_clause("pi.warehouse_item_id", warehouse_item_ids)
+        cur.execute("""
+            select pi.warehouse_item_id,
+                   sum(pi.quantity * pi.unit_price) / sum(pi.quantity) as price
+            from Purchase_Item pi
+            join Purchase p on p.purchase_id = pi.purchase_id
+            where p.purchase_status = 'delivered'
+              and pi.quantity > 0
+        """ + where + " group by pi.warehouse_item_id", params)
+        average = dict(cheapest)
+        average.update({r["warehouse_item_id"]: float(r["price"]) for r in cur.fetchall()})
+
+        return {"cheapest": cheapest, "weighted_average": average}
+
+    def _cost(self, row, prices):
+        cost = 0.0
+        for warehouse_item_id, quantity in row.items():
+            price = prices.get(warehouse_item_id)
+            if price is None:
+                return None
+            cost += quantity * price
+        return round(cost, 4)
+
+    def _recompute(self, menu_item_ids):
+        for policy in POLICIES:
+            prices = self.prices[policy]
+            costs = self.costs[policy]
+            for item_id in menu_item_ids:
+                costs[item_id] = self._cost(self.recipes.get(item_id, {}), prices)
+
+    def _index_recipe(self, item_id, row):
+        for warehouse_item_id in self.recipes.get(item_id, {}):
+            self.used_in.get(warehouse_item_id, set()).discard(item_id)
+        self.recipes[item_id] = row
+        for warehouse_item_id in row:
+            self.used_in.setdefault(warehouse_item_id, set()).add(item_id)
+
+    def _load(self, cur):
+        self.menu = self._read_menu(cur)
+        self.recipes = {}
+        self.used_in = {}
+        for item_id, row in self._read_recipes(cur).items():
+            self._index_recipe(item_id, row)
+        self.prices = self._read_prices(cur)
+        self.costs = {policy: {} for policy in POLICIES}
+        self._recompute(self.menu)
+        self._loaded_at = time.monotonic()
+
+    def get(self, cur):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+                self._load(cur)
+            return self
+
+    # ---------- incremental updates (call after the change is committed) ----------
+
+    def recipe_changed(self, cur, menu_item_ids):
+        with self._lock:
+            if self._loaded_at is None or not menu_item_ids:
+                return
+            # an item added since the load is not in the menu yet
+            missing = [item_id for item_id in menu_item_ids if item_id not in self.menu]
+            if missing:
+                self.menu.update(self._read_menu(cur, missing))
+            for item_id, row in self._read_recipes(cur, menu_item_ids).items():
+                self._index_recipe(item_id, row)
+            self._recompute(menu_item_ids)
+
+    def menu_changed(self, cur, menu_item_ids):
+        with self._lock:
+            if self._loaded_at is None or not menu_item_ids:
+                return
+            self.menu.update(self._read_menu(cur, menu_item_ids))
+            self._recompute(menu_item_ids)
+
+    def prices_changed(self, cur, warehouse_item_ids):
+        with self._lock:
+            if self._loaded_at is None or not warehouse_item_ids:
+                return
+            fresh = self._read_prices(cur, warehouse_item_ids)
+            for policy in POLICIES:
+                for warehouse_item_id in warehouse_item_ids:
+                    price = fresh[policy].get(warehouse_item_id)
+                    if price is None:
+                        self.prices[policy].pop(warehouse_item_id, None)
+                    else:
+                        self.prices[policy][warehouse_item_id] = price
+
+            affected = set()
+            for warehouse_item_id in warehouse_item_ids:
+                affected |= self.used_in.get(warehouse_item_id, set())
+            self._recompute(affected)
+
+    def purchase_delivered(self, cur, purchase_id):
+        cur.execute("select warehouse_item_id from Purchase_Item where purchase_id = %s", (purchase_id,))
+        self.prices_changed(cur, [r["warehouse_item_id"] for r in cur.fetchall()])
+
+    # ---------- results ----------
+
+    def margins(self, cur, policy="cheapest"):
+        """
+        Cost, margin and margin % of every menu item whose ingredients all have a price,
+        lowest margin first.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"unknown costing policy: {policy}")
+
+        self.get(cur)
+        with self._lock:
+            result = []
+            for item_id, cost in self.costs[policy].items():
+                if cost is None or item_id not in self.menu:
+                    continue
+                item_name, price = self.menu[item_id]
+                margin = round(price - cost, 2)
+                result.append({
+                    "item_id": item_id,
+                    "item_name": item_name,
+                    "selling_price": price,
+                    "ingredient_cost": round(cost, 2),
+                    "margin": margin,
+                    "margin_pct": round(margin / price * 100, 1) if price else None,
+                })
+
+        result.sort(key=lambda r: r["margin"])
+        return result
+
+    def loss_items(self, cur, policy="cheapest"):
+        """Items whose ingredients cost more than their selling price, biggest loss first."""
+        return [dict(r, loss_amount=-r["margin"])
+                for r in self.margins(cur, policy) if r["margin"] < 0]
+
+
+costing_engine = CostingEngine()
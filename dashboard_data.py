@@ -0,0 +1,428 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, timedelta
+
+import db
+from costing import costing_engine
+
+# data for the manager dashboard
+# every panel is an independent query, so they run at the same time, each on its own pooled
+# connection; the page takes about as long as the slowest panel instead of the sum of all of them.
+# a panel that fails or runs over the timeout is left out and the rest of the page still renders.
+# finished panels are cached (see DashboardCache below).
+
+PANEL_TIMEOUT = 5.0      # seconds, per panel (also set as max_execution_time on its query)
+MAX_WORKERS = 4          # panels running at once (each holds a pool connection)
+CACHE_TTL = 30           # seconds, for the current month and the all-time panels
+WARM_UP_MONTHS = 24      # closed months precomputed in the background at startup
+
+# name -> (function(cur, month_start), values used when the panel is missing,
+#          whether the result depends on the selected month)
+PANELS = {}
+
+# panels the dashboard page fetches together (/dashboard/panel/<group>)
+PANEL_GROUPS = {
+    "kpis": ["totals", "customers", "cost"],
+}
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="dashboard")
+
+
+def panel(name, per_month=False, **empty):
+    def decorator(f):
+        PANELS[name] = (f, empty, per_month)
+        return f
+    return decorator
+
+
+# -------- total orders & revenue ---------
+@panel("totals", total_orders=0, total_revenue=0)
+def totals(cur, month_start):
+    cur.execute("""
+        select sum(order_count) as total_orders, sum(revenue) as total_revenue
+        from Daily_Sales
+    """)
+    row = cur.fetchone()
+    return {
+        "total_orders": int(row["total_orders"] or 0),
+        "total_revenue": float(row["total_revenue"]) if row["total_revenue"] is not None else 0,
+    }
+
+
+# ------- total customers ------
+@panel("customers", total_customers=0)
+def customers(cur, month_start):
+    cur.execute("""
+        select count(distinct customer_id) as total_customers
+        from Daily_Customer_Orders
+    """)
+    return {"total_customers": cur.fetchone()["total_customers"]}
+
+
+# total cost
+@panel("cost", total_cost=0)
+def cost(cur, month_start):
+    cur.execute("""
+        select sum(pi.quantity * pi.unit_price) as total_cost
+        from Purchase_Item pi
+        join Purchase p on p.purchase_id = pi.purchase_id
+        where p.purchase_status in ('confirmed', 'delivered');
+    """)
+    return {"total_cost": cur.fetchone()["total_cost"] or 0}
+
+
+# ----- monthly sales -----
+@panel("monthly", months=[], revenues=[])
+def monthly(cur, month_start):
+    cur.execute("""
+        SELECT
+            DATE_FORMAT(sale_date, '%Y-%m') AS month,
+            SUM(revenue) AS revenue
+        FROM Daily_Sales
+        GROUP BY DATE_FORMAT(sale_date, '%Y-%m')
+        ORDER BY month
+    """)
+    columns = cur.fetch_columns()
+    return {
+        "months": columns["month"],
+        "revenues": [float(r) for r in columns["revenue"]],
+    }
+
+
+# --------  total daily sales for the selected month sorted by date -----
+@panel("daily", per_month=True, daily_dates=[], daily_totals=[])
+def daily(cur, month_start):
+    cur.execute("""
+        select sale_date, revenue as daily_sales
+        from Daily_Sales
+        where sale_date >= %s
+        and sale_date < %s + interval 1 month
+        order by sale_date
+    """, (month_start, month_start))
+    columns = cur.fetch_columns()
+    return {
+        "daily_dates": [d.strftime("%Y-%m-%d") for d in columns["sale_date"]],
+        "daily_totals": [float(t) for t in columns["daily_sales"]],
+    }
+
+
+# -------- Top Ordered items ---------
+@panel("top_items", item_names=[], item_qtys=[])
+def top_items(cur, month_start):
+    cur.execute("""
+        SELECT
+            mi.item_name,
+            SUM(d.quantity) AS qty
+        FROM Daily_Item_Sales d
+        JOIN Menu_Item mi ON mi.item_id = d.menu_item_id
+        GROUP BY mi.item_name
+        ORDER BY qty DESC
+        LIMIT 5
+    """)
+    columns = cur.fetch_columns()
+    return {
+        "item_names": columns["item_name"],
+        "item_qtys": [int(q) for q in columns["qty"]],
+    }
+
+
+#  Sales Distribution
+@panel("distribution", dist_labels=[], dist_sales=[])
+def distribution(cur, month_start):
+    cur.execute("""
+        SELECT
+            mi.item_name,
+            SUM(d.sales) AS sales
+        FROM Daily_Item_Sales d
+        JOIN Menu_Item mi ON mi.item_id = d.menu_item_id
+        GROUP BY mi.item_name
+        ORDER BY sales DESC
+        LIMIT 6
+    """)
+    columns = cur.fetch_columns()
+    return {
+        "dist_labels": columns["item_name"],
+        "dist_sales": [float(s) for s in columns["sales"]],
+    }
+
+
+# Orders by Type
+@panel("order_types", order_types=[], order_counts=[])
+def order_types(cur, month_start):
+    cur.execute("""
+        SELECT
+            order_type,
+            SUM(order_count) AS count
+        FROM Daily_Order_Type
+        GROUP BY order_type
+    """)
+    columns = cur.fetch_columns()
+    return {
+        "order_types": [t.replace("_", " ").title() for t in columns["order_type"]],
+        "order_counts": [int(c) for c in columns["count"]],
+    }
+
+
+#  --------- Top Customers (table) ---------
+@panel("top_customers", top_customers=[])
+def top_customers(cur, month_start):
+    cur.execute("""
+        SELECT
+            c.customer_name,
+            SUM(d.order_count) AS orders
+        FROM Daily_Customer_Orders d
+        JOIN Customer c ON c.customer_id = d.customer_id
+        GROUP BY c.customer_id
+        ORDER BY orders DESC
+        LIMIT 5
+    """)
+    return {"top_customers": [r._asdict() for r in cur.fetchall()]}
+
+
+# ----- money earned from selling this item is less than its ingredients cost -----
+# true recipe cost (quantity x cheapest supplier price of every ingredient), see costing.py
+@panel("loss_items", loss_items=[])
+def loss_items(cur, month_start):
+    return {"loss_items": costing_engine.loss_items(cur)}
+
+
+# top most 5 purchased items in last 6 months
+@panel("top_purchased", top_purchased_items=[])
+def top_purchased(cur, month_start):
+    cur.execute("""
+        select w.item_name,
+            sum(pi.quantity) as total_quantity,
+            avg(pi.unit_price) as avg_purchase_price,
+            sum(pi.quantity * pi.unit_price) as total_purchase_cost
+
+        from purchase p, purchase_item pi, warehouse_item w
+        where p.purchase_id = pi.purchase_id
+        and pi.warehouse_item_id = w.item_id
+        and p.purchase_status in ('confirmed', 'delivered')
+        and p.purchase_date >= curdate() - interval 6 month
+
+        group by w.item_id, w.item_name
+        order by total_purchase_cost desc
+        limit 5;
+        """)
+    return {"top_purchased_items": [r._asdict() for r in cur.fetchall()]}
+
+
+def run_panel(name, month_start, timeout=PANEL_TIMEOUT):
+    """
+    Runs one panel on its own pooled connection.
+    The server stops its select after timeout seconds (max_execution_time).
+    """
+    f = PANELS[name][0]
+    conn = db.get_pool().acquire()
+    try:
+        # records / fetch_columns() instead of a dict per row (see rows.py)
+        cur = conn.cursor(records=True)
+        cur.execute("set session max_execution_time = %s", (int(timeout * 1000),))
+        try:
+            return f(cur, month_start)
+        finally:
+            cur.execute("set session max_execution_time = default")
+            cur.close()
+    finally:
+        conn.close()
+
+
+class DashboardCache:
+    """
+    Finished panel results keyed by (panel, month).
+      closed month         -> kept until the month's Sales_Period_Version changes (a payment
+                              or rollup rebuild touching that month), checked on every view
+      current month,
+      all-time panels      -> kept ttl seconds
+    """
+
+    def __init__(self, ttl=CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}   # (panel, month) -> (expires_at or None, version, data, computed_at)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, entry_version, data, _ = entry
+                if expires_at is None and entry_version == version:
+                    self.hits += 1
+                    return data
+                if expires_at is not None and time.monotonic() < expires_at:
+                    self.hits += 1
+                    return data
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, data, version=None):
+        """version given -> closed month, kept until the version changes"""
+        expires_at = None if version is not None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, version, data, time.time())
+
+    def computed_at(self, key):
+        """unix time the cached result was computed, None if not cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[3] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0,
+            }
+
+
+dashboard_cache = DashboardCache()
+
+
+def current_month_start():
+    return date.today().replace(day=1).isoformat()
+
+
+def period_versions(cur, months):
+    """month start -> Sales_Period_Version (0 for a month with no payments yet)"""
+    if not months:
+        return {}
+    placeholders = ", ".join(["%s"] * len(months))
+    cur.execute(f"""
+        select period, version
+        from Sales_Period_Version
+        where period in ({placeholders})
+    """, list(months))
+    versions = {str(r["period"]): r["version"] for r in cur.fetchall()}
+    return {m: versions.get(m, 0) for m in months}
+
+
+def _cache_key(name, month_start):
+    per_month = PANELS[name][2]
+    return (name, month_start if per_month else None)
+
+
+def last_modified(names, month_start):
+    """newest computed_at of the cached panels (for the Last-Modified header)"""
+    times = [dashboard_cache.computed_at(_cache_key(n, month_start)) for n in names]
+    times = [t for t in times if t is not None]
+    return max(times) if times else None
+
+
+def load_dashboard(cur, month_start, names=None, timeout=PANEL_TIMEOUT, logger=None):
+    """
+    Takes the panels from the cache and runs the missing ones in parallel.
+    Returns (values for the template, names of the panels that failed or timed out);
+    a missing panel gets its empty values so the page still renders.
+    """
+    names = list(names or PANELS)
+
+    # a closed month is cached for good, as long as its version did not change
+    version = None
+    if month_start < current_month_start() and any(PANELS[n][2] for n in names):
+        version = period_versions(cur, [month_start])[month_start]
+
+    data = {}
+    missing = []
+    for name in names:
+        cached = dashboard_cache.get(_cache_key(name, month_start),
+                                     version if PANELS[name][2] else None)
+        if cached is None:
+            missing.append(name)
+        else:
+            data.update(cached)
+
+    futures = {_executor.submit(run_panel, name, month_start, timeout): name for name in missing}
+
+    # small margin over the server side timeout for waiting on a connection
+    done, _ = wait(futures, timeout=timeout + 1)
+
+    failed = []
+    for future, name in futures.items():
+        if future in done and future.exception() is None:
+            result = future.result()
+            dashboard_cache.put(_cache_key(name, month_start), result,
+                                version if PANELS[name][2] else None)
+            data.update(result)
+            continue
+
+        failed.append(name)
+        data.update(PANELS[name][1])
+        if logger is not None:
+            error = future.exception() if future in done else "timed out"
+            logger.warning("dashboard panel %s failed: %s", name, error)
+
+    return data, sorted(failed)
+
+
+def previous_months(count):
+    """first days of the count months before the current one, newest first"""
+    first = date.today().replace(day=1)
+    months = []
+    for _ in range(count):
+        first = (first - timedelta(days=1)).replace(day=1)
+        months.append(first.isoformat())
+    return months
+
+
+def warm_up(months=WARM_UP_MONTHS, logger=None):
+    """
+    Precomputes the per-month panels of the last closed months into the cache.
+    """
+    month_list = previous_months(months)
+    names = [name for name, (_, _, per_month) in PANELS.items() if per_month]
+
+    try:
+        conn = db.get_pool().acquire()
+        try:
+            cur = conn.cursor(dictionary=True)
+            versions = period_versions(cur, month_list)
+            cur.close()
+        finally:
+            conn.close()
+    except Exception as e:
+        if logger is not None:
+            logger.warning("dashboard warm-up skipped: %s", e)
+        return
+
+    for month_start in month_list:
+        for name in names:
+            key = _cache_key(name, month_start)
+            if dashboard_cache.get(key, versions[month_start]) is not None:
+                continue
+            try:
+                dashboard_cache.put(key, run_panel(name, month_start), versions[month_start])
+            except Exception as e:
+                if logger is not None:
+                    logger.warning("dashboard warm-up of %s %s failed: %s", name, month_start, e)
+
+
+def init_app(app):
+    """
+    Config:
+      DASHBOARD_WARM_UP_MONTHS -> closed months to precompute after the app starts (0 = off)
+    """
+    app.config.setdefault("DASHBOARD_WARM_UP_MONTHS", WARM_UP_MONTHS)
+    started = threading.Event()
+
+    @app.before_request
+    def start_dashboard_warm_up():
+        # first request = the app is up and serving; warm in the background
+        if started.is_set():
+            return
+        started.set()
+        months = app.config["DASHBOARD_WARM_UP_MONTHS"]
+        if months:
+            threading.Thread(target=warm_up, args=(months, app.logger),
+                             name="dashboard-warm-up", daemon=True).start()
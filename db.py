@@ -1,4 +1,14 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+
 import mysql.connector
+from mysql.connector import errorcode
+from flask import g, has_app_context
+
+from rows import columns_of, to_record, to_records
 
 DB_CONFIG = {
     "host": "localhost",
@@ -7,5 +17,411 @@ DB_CONFIG = {
     "database": "dawlo_phase3",
 }
 
+# connection pool settings
+#   pool_size    -> connections kept open and reused between requests
+#   max_overflow -> extra connections allowed under load, closed when returned
+#   timeout      -> seconds a request waits for a free connection before failing
+#   pre_ping     -> check the connection is still alive before handing it out
+#   recycle      -> seconds after which a connection is closed and reopened
+DB_POOL_CONFIG = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "timeout": 30,
+    "pre_ping": True,
+    "recycle": 3600,
+}
+
+
+logger = logging.getLogger(__name__)
+
+# functions called as hook(statement, seconds) after every query run through a pooled
+# connection (statement is None for time spent fetching rows), used for monitoring
+_query_hooks = []
+
+
+def add_query_hook(hook):
+    _query_hooks.append(hook)
+
+
+def _report(statement, seconds):
+    for hook in _query_hooks:
+        hook(statement, seconds)
+
+
+# statements that never change data; anything else marks the transaction as having writes
+READ_STATEMENTS = ("select", "show", "explain", "describe", "set", "with", "(")
+
+
+def is_write(statement):
+    words = statement.lstrip().split(None, 1)
+    return bool(words) and not words[0].lower().startswith(READ_STATEMENTS)
+
+
+class InstrumentedCursor:
+    """
+    Wraps a cursor so the time of every statement and fetch is reported to the query hooks.
+    connection is the PooledConnection the cursor belongs to,
+    records=True turns the fetched tuples into records (see rows.py).
+    """
+
+    def __init__(self, cur, connection=None, records=False):
+        self._cur = cur
+        self.connection = connection
+        self.records = records
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        if self.connection is not None:
+            self.connection.note_statement(operation)
+        start = time.perf_counter()
+        try:
+            return self._cur.execute(operation, params, *args, **kwargs)
+        finally:
+            _report(operation, time.perf_counter() - start)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        if self.connection is not None:
+            self.connection.note_statement(operation)
+        start = time.perf_counter()
+        try:
+            return self._cur.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            _report(operation, time.perf_counter() - start)
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            _report(None, time.perf_counter() - start)
+
+    def fetchone(self):
+        row = self._timed_fetch(self._cur.fetchone)
+        return to_record(self._cur.column_names, row) if self.records else row
+
+    def fetchmany(self, size=1):
+        rows = self._timed_fetch(self._cur.fetchmany, size)
+        return to_records(self._cur.column_names, rows) if self.records else rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(self._cur.fetchall)
+        return to_records(self._cur.column_names, rows) if self.records else rows
+
+    def fetch_columns(self):
+        """The remaining rows as {column: [values]}, without building row objects."""
+        return columns_of(self._cur.column_names, self._timed_fetch(self._cur.fetchall))
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+def _run_callbacks(callbacks):
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception:
+            logger.exception("transaction callback failed")
+
+
+class PooledConnection:
+    """
+    Wraps a mysql connection checked out from the pool.
+    close() gives the connection back to the pool instead of closing the socket,
+    everything else is passed to the real connection.
+    after_commit(callback) runs callback once the current transaction commits
+    (dropped on rollback), e.g. to write what must only exist for committed changes.
+    after_rollback(callback) runs callback if it is rolled back instead, or the connection is
+    given back with it still open. The commit already happened or failed by then, so a callback
+    that raises is logged, not raised.
+    has_writes tells whether the open transaction changed anything.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._after_commit = []
+        self._after_rollback = []
+        self.has_writes = False
+
+    def note_statement(self, statement):
+        if not self.has_writes and is_write(statement):
+            self.has_writes = True
+
+    def close(self):
+        if self._raw is None:
+            return
+        raw, self._raw = self._raw, None
+        callbacks = self._end_transaction(committed=False)
+        self._pool.release(raw, self._created_at)   # rolls back what is still open
+        _run_callbacks(callbacks)
+
+    def after_commit(self, callback):
+        self._after_commit.append(callback)
+
+    def after_rollback(self, callback):
+        self._after_rollback.append(callback)
+
+    def _end_transaction(self, committed):
+        callbacks = self._after_commit if committed else self._after_rollback
+        self._after_commit = []
+        self._after_rollback = []
+        self.has_writes = False
+        return callbacks
+
+    def commit(self):
+        self.__getattr__("commit")()
+        _run_callbacks(self._end_transaction(committed=True))
+
+    def rollback(self):
+        callbacks = self._end_transaction(committed=False)
+        try:
+            self.__getattr__("rollback")()
+        finally:
+            _run_callbacks(callbacks)
+
+    @property
+    def closed(self):
+        return self._raw is None
+
+    def prepared_cursor(self, name):
+        """
+        The prepared-statement cursor kept on this connection for the named query
+        (see statements.py). Returns (cursor, True if it was just created).
+        """
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError("Connection already returned to the pool.")
+        cursors = self._pool.prepared_cursors(self._raw)
+        cur = cursors.get(name)
+        if cur is not None:
+            return cur, False
+        cur = cursors[name] = InstrumentedCursor(self._raw.cursor(prepared=True), records=True)
+        return cur, True
+
+    def cursor(self, *args, records=False, **kwargs):
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError("Connection already returned to the pool.")
+        return InstrumentedCursor(self._raw.cursor(*args, **kwargs), self, records)
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError("Connection already returned to the pool.")
+        return getattr(self._raw, name)
+
+
+class ConnectionPool:
+    def __init__(self, db_config, pool_size=5, max_overflow=10, timeout=30,
+                 pre_ping=True, recycle=3600):
+        self.db_config = db_config
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.recycle = recycle
+
+        self._idle = deque()   # (raw connection, created_at)
+        self._prepared = {}    # id(raw connection) -> {query name: prepared cursor}
+        self._open = 0         # connections currently open (idle + in use)
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        # stats
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._reconnects = 0
+
+    def _expired(self, created_at):
+        return self.recycle and time.monotonic() - created_at > self.recycle
+
+    def prepared_cursors(self, raw):
+        with self._cond:
+            return self._prepared.setdefault(id(raw), {})
+
+    def _discard(self, raw):
+        with self._cond:
+            self._prepared.pop(id(raw), None)
+        try:
+            raw.close()
+        except mysql.connector.Error:
+            pass
+
+    def acquire(self):
+        start = time.monotonic()
+        waited = False
+        raw = None
+        created_at = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    break
+
+                if self._open < self.pool_size + self.max_overflow:
+                    # reserve a slot, the socket is opened outside the lock
+                    self._open += 1
+                    break
+
+                waited = True
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._waits += 1
+                    self._wait_time += time.monotonic() - start
+                    raise mysql.connector.errors.PoolError(
+                        f"No free database connection after {self.timeout}s "
+                        f"(pool_size={self.pool_size}, max_overflow={self.max_overflow})."
+                    )
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_time += time.monotonic() - start
+
+        try:
+            if raw is not None and (self._expired(created_at)
+                                    or (self.pre_ping and not raw.is_connected())):
+                # stale connection -> replace it with a fresh one
+                self._discard(raw)
+                raw = None
+                with self._cond:
+                    self._reconnects += 1
+
+            if raw is None:
+                raw = mysql.connector.connect(**self.db_config)
+                created_at = time.monotonic()
+
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        return PooledConnection(self, raw, created_at)
+
+    def release(self, raw, created_at):
+        # anything not committed is thrown away, same as closing the connection did
+        healthy = True
+        try:
+            raw.rollback()
+        except mysql.connector.Error:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and len(self._idle) < self.pool_size and not self._expired(created_at):
+                self._idle.append((raw, created_at))
+                raw = None
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+        if raw is not None:
+            self._discard(raw)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total": round(self._wait_time, 4),
+                "wait_time_avg": round(self._wait_time / self._waits, 4) if self._waits else 0,
+                "timeouts": self._timeouts,
+                "reconnects": self._reconnects,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG, **DB_POOL_CONFIG)
+    return _pool
+
+
 def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+    """
+    Checks out a connection from the pool.
+    Inside a request the same connection is reused until it is closed,
+    and it is given back to the pool automatically when the request ends.
+    """
+    if not has_app_context():
+        return get_pool().acquire()
+
+    conn = g.get("_db_conn")
+    if conn is None or conn.closed:
+        conn = get_pool().acquire()
+        g._db_conn = conn
+    return conn
+
+
+def release_request_connection(exc=None):
+    conn = g.pop("_db_conn", None)
+    if conn is not None:
+        conn.close()
+
+
+# errors worth running the transaction again for
+RETRYABLE_ERRORS = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+
+def run_in_transaction(conn, work, *args, retries=3, backoff=0.05, **kwargs):
+    """
+    Runs work(cur, *args, **kwargs) in its own transaction and commits it.
+    A deadlock or lock wait timeout rolls back and runs work again (with backoff),
+    any other exception rolls back and is raised to the caller.
+    Reads done earlier on the connection are ended first (rolled back) so work sees
+    fresh data; uncommitted writes are an error, they would end up in work's transaction.
+    """
+    if conn.in_transaction:
+        if getattr(conn, "has_writes", True):
+            raise RuntimeError("run_in_transaction called with uncommitted writes on the connection")
+        conn.rollback()
+
+    attempt = 0
+    while True:
+        cur = conn.cursor(dictionary=True)
+        try:
+            conn.start_transaction()
+            result = work(cur, *args, **kwargs)
+            conn.commit()
+            return result
+
+        except mysql.connector.Error as e:
+            conn.rollback()
+            if e.errno not in RETRYABLE_ERRORS or attempt >= retries:
+                raise
+            attempt += 1
+            time.sleep(backoff * (2 ** (attempt - 1)) * (1 + random.random()))
+
+        except Exception:
+            conn.rollback()
+            raise
+
+        finally:
+            cur.close()
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+def init_app(app):
+    app.teardown_appcontext(release_request_connection)
@@ -0,0 +1,176 @@
+import csv
+import io
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from mysql.connector import FieldType
+
+import db
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:   # optional: only the parquet / arrow exports need it
+    pa = None
+    pq = None
+
+# streaming exports of the history tables
+# rows are read with an unbuffered cursor on a connection of their own, BATCH_ROWS at a time,
+# and every batch is written out and yielded before the next is fetched, so memory use does not
+# grow with the number of rows exported.
+#   csv      -> text/csv
+#   parquet  -> one row group per batch (needs pyarrow)
+#   arrow    -> Arrow IPC stream, one record batch per batch (needs pyarrow)
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+BATCH_ROWS = 5000
+
+
+def columnar_available():
+    return pa is not None
+
+
+def date_range_args(args, column):
+    """
+    Condition for ?from=YYYY-MM-DD&to=YYYY-MM-DD (both days included, either may be left out).
+    Returns (where, params); raises ValueError for a bad date.
+    """
+    conditions = []
+    params = []
+    if args.get("from"):
+        conditions.append(f"{column} >= %s")
+        params.append(datetime.strptime(args["from"], "%Y-%m-%d"))
+    if args.get("to"):
+        conditions.append(f"{column} < %s")
+        params.append(datetime.strptime(args["to"], "%Y-%m-%d") + timedelta(days=1))
+    return " and ".join(conditions), params
+
+
+def _batches(sql, params):
+    # yields (column names, field types) first, then lists of row tuples
+    conn = db.get_pool().acquire()
+    try:
+        cur = conn.cursor(buffered=False)
+        cur.execute(sql, params)
+        yield cur.column_names, [d[1] for d in cur.description]
+        while True:
+            rows = cur.fetchmany(BATCH_ROWS)
+            if not rows:
+                break
+            yield rows
+        cur.close()
+    finally:
+        # an export stopped half-way (client gone) leaves unread rows; closing discards them
+        conn.close()
+
+
+def stream_csv(sql, params=()):
+    batches = _batches(sql, params)
+    columns, _ = next(batches)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# ---------- columnar ----------
+
+_INT_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG, FieldType.LONGLONG,
+              FieldType.YEAR}
+_FLOAT_TYPES = {FieldType.FLOAT, FieldType.DOUBLE, FieldType.DECIMAL, FieldType.NEWDECIMAL}
+_TIME_TYPES = {FieldType.DATETIME, FieldType.TIMESTAMP}
+
+
+def _arrow_type(field_type):
+    if field_type in _INT_TYPES:
+        return pa.int64()
+    if field_type in _FLOAT_TYPES:
+        return pa.float64()
+    if field_type in _TIME_TYPES:
+        return pa.timestamp("us")
+    if field_type == FieldType.DATE:
+        return pa.date32()
+    return pa.string()
+
+
+def _value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode()
+    return value
+
+
+class _Sink:
+    """Write-only file for pyarrow that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self.closed = False
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_columnar(fmt, sql, params=()):
+    batches = _batches(sql, params)
+    columns, field_types = next(batches)
+    schema = pa.schema([(name, _arrow_type(t)) for name, t in zip(columns, field_types)])
+
+    sink = _Sink()
+    out = pa.PythonFile(sink, mode="w")
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(out, schema)
+        write = writer.write_batch
+    else:
+        writer = pa.ipc.new_stream(out, schema)
+        write = writer.write_batch
+
+    for rows in batches:
+        arrays = [pa.array([_value(row[i]) for row in rows], type=field.type)
+                  for i, field in enumerate(schema)]
+        write(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+
+def stream(fmt, sql, params=()):
+    """Generator of the export body in fmt (a FORMATS key)."""
+    if fmt in COLUMNAR_FORMATS:
+        return stream_columnar(fmt, sql, params)
+    return stream_csv(sql, params)
@@ -0,0 +1,123 @@
+import math
+from datetime import date, timedelta
+
+# ingredient consumption forecast, run as a batch job: flask --app 1220071_1222640 forecast-stock
+# consumption = stock taken by orders minus stock put back by cancellations (Stock_Movement),
+# averaged per day of the week over the last WINDOW_DAYS, so a busy Saturday counts as a Saturday.
+# with the fastest supplier's delivery time this gives, per ingredient:
+#   days_until_stockout -> days the current stock lasts at the forecast rates
+#   reorder_point       -> stock needed to cover the delivery time plus a safety margin
+# results go to Stock_Forecast, which /warehouse just joins.
+
+CONSUMPTION_TYPES = ("order", "cancel_item", "cancel_order")
+WINDOW_DAYS = 56          # 8 weeks -> 8 samples of every weekday
+HORIZON_DAYS = 365        # stockouts further away than this are reported as none
+DEFAULT_LEAD_DAYS = 7     # ingredients nobody supplies at the moment
+SAFETY_Z = 1.65           # ~95% service level
+
+
+def _daily_consumption(cur, start, end):
+    """(warehouse item id, day) -> net quantity consumed, all items in one query"""
+    placeholders = ", ".join(["%s"] * len(CONSUMPTION_TYPES))
+    cur.execute(f"""
+        select warehouse_item_id, date(movement_date) as day, -sum(quantity_change) as used
+        from Stock_Movement
+        where movement_type in ({placeholders})
+          and movement_date >= %s
+          and movement_date < %s
+        group by warehouse_item_id, date(movement_date)
+    """, list(CONSUMPTION_TYPES) + [start, end])
+    return {(r["warehouse_item_id"], r["day"]): float(r["used"] or 0) for r in cur.fetchall()}
+
+
+def _items(cur):
+    cur.execute("""
+        select w.item_id, w.stock_quantity, min(si.avg_delivery_days) as lead_days
+        from Warehouse_Item w
+        left join Supplier_Item si
+               on si.warehouse_item_id = w.item_id
+              and si.is_supplying = 1
+        group by w.item_id, w.stock_quantity
+    """)
+    return cur.fetchall()
+
+
+def forecast(cur, today=None, window_days=WINDOW_DAYS):
+    """
+    Returns one forecast dict per warehouse item.
+    """
+    today = today or date.today()
+    start = today - timedelta(days=window_days)
+    days = [start + timedelta(days=i) for i in range(window_days)]
+
+    used = _daily_consumption(cur, start, today)
+
+    # how many times every weekday occurs in the window
+    weekday_count = [0] * 7
+    for d in days:
+        weekday_count[d.weekday()] += 1
+
+    results = []
+    for item in _items(cur):
+        item_id = item["item_id"]
+        series = [used.get((item_id, d), 0.0) for d in days]
+
+        weekday_total = [0.0] * 7
+        for d, amount in zip(days, series):
+            weekday_total[d.weekday()] += amount
+        weekday_rate = [max(weekday_total[i] / weekday_count[i], 0.0) if weekday_count[i] else 0.0
+                        for i in range(7)]
+
+        mean = sum(series) / len(series)
+        std = math.sqrt(sum((x - mean) ** 2 for x in series) / len(series))
+
+        lead_days = int(item["lead_days"]) if item["lead_days"] is not None else DEFAULT_LEAD_DAYS
+        stock = float(item["stock_quantity"])
+
+        # walk forward day by day at that weekday's rate
+        days_until_stockout = None
+        remaining = stock
+        for i in range(HORIZON_DAYS):
+            rate = weekday_rate[(today + timedelta(days=i)).weekday()]
+            if rate <= 0:
+                continue
+            if remaining < rate:
+                days_until_stockout = round(i + remaining / rate, 1)
+                break
+            remaining -= rate
+
+        lead_demand = sum(weekday_rate[(today + timedelta(days=i)).weekday()] for i in range(lead_days))
+        safety_stock = SAFETY_Z * std * math.sqrt(lead_days)
+
+        results.append({
+            "warehouse_item_id": item_id,
+            "daily_rate": round(mean, 4),
+            "weekday_rates": weekday_rate,
+            "lead_time_days": lead_days,
+            "days_until_stockout": days_until_stockout,
+            "reorder_point": round(lead_demand + safety_stock, 2),
+        })
+
+    return results
+
+
+def store_forecast(cur, results):
+    """Writes the forecast to Stock_Forecast (one multi-row upsert)."""
+    if not results:
+        return
+    rows = ", ".join(["(%s, %s, %s, %s, %s, now())"] * len(results))
+    params = []
+    for r in results:
+        params += [r["warehouse_item_id"], r["daily_rate"], r["days_until_stockout"],
+                   r["lead_time_days"], r["reorder_point"]]
+    cur.execute(f"""
+        insert into Stock_Forecast
+        (warehouse_item_id, daily_rate, days_until_stockout, lead_time_days, reorder_point, computed_at)
+        values {rows}
+        on duplicate key update
+            daily_rate = values(daily_rate),
+            days_until_stockout = values(days_until_stockout),
+            lead_time_days = values(lead_time_days),
+            reorder_point = values(reorder_point),
+            computed_at = values(computed_at)
+    """, params)
@@ -0,0 +1,95 @@
+import json
+import queue
+import threading
+
+from table_state import get_table_states
+
+
+class TableEventBroker:
+    """
+    Keeps one queue per open /tables or /floorplan page (server-sent events).
+    When a table changes its new state is read once and copied to every queue,
+    so the database cost of a change does not depend on how many tablets are open.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subscribers)
+
+    def broadcast(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # client is too far behind -> tell it to reload instead of patching
+                self.unsubscribe(q)
+                self._resync(q)
+
+    @staticmethod
+    def _resync(q):
+        # make room for the reload marker; a broadcast running at the same time
+        # may fill the freed slot first, so keep dropping until the marker fits
+        while True:
+            try:
+                q.put_nowait(None)
+                return
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def publish(self, cur, table_ids=None, order_id=None):
+        """
+        Reads the new state of the changed tables (one query) and sends it to all pages.
+        Call after commit so the read sees the change. Does nothing if no page is listening.
+        """
+        if not self.has_subscribers():
+            return
+
+        states = get_table_states(cur, table_ids=table_ids, order_id=order_id)
+        if states:
+            self.broadcast(json.dumps(states, default=str))
+
+    def stream(self, keepalive=15):
+        """
+        Generator of server-sent events for one client.
+        """
+        q = self.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = q.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                if message is None:
+                    yield "event: resync\ndata: {}\n\n"
+                    return
+
+                yield f"event: tables\ndata: {message}\n\n"
+        finally:
+            self.unsubscribe(q)
+
+
+table_events = TableEventBroker()
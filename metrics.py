@@ -0,0 +1,205 @@
+import hmac
+import ipaddress
+import re
+import threading
+import time
+
+from flask import current_app, g, request, has_request_context, before_render_template, template_rendered
+
+import db
+
+# request metrics in the Prometheus text format, served at /metrics
+# every request is labelled with its endpoint and, for order_page / purchase_page,
+# the posted action, so "add" and "pay" on the same route are measured separately.
+
+# endpoints whose POST "action" field is part of the label
+ACTION_ENDPOINTS = ("order_page", "purchase_page")
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}   # labels -> [bucket counts..., count, sum]
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self, label_names):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+            for labels, values in series:
+                base = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(label_names, labels))
+                for bound, count in zip(self.buckets, values):
+                    lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {values[-2]}')
+                lines.append(f"{self.name}_count{{{base}}} {values[-2]}")
+                lines.append(f"{self.name}_sum{{{base}}} {round(values[-1], 6)}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+LABELS = ("endpoint", "action")
+
+REQUEST_LATENCY = Histogram("dawlo_request_seconds", "Total request latency.", TIME_BUCKETS)
+REQUEST_DB_TIME = Histogram("dawlo_request_db_seconds", "Time spent in the database per request.", TIME_BUCKETS)
+REQUEST_QUERIES = Histogram("dawlo_request_queries", "Queries run per request.", COUNT_BUCKETS)
+REQUEST_RENDER_TIME = Histogram("dawlo_request_render_seconds", "Template render time per request.", TIME_BUCKETS)
+
+HISTOGRAMS = (REQUEST_LATENCY, REQUEST_DB_TIME, REQUEST_QUERIES, REQUEST_RENDER_TIME)
+
+
+# ---------- slow query log ----------
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|%\(\w+\)s")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement):
+    """
+    Normalized shape of a statement: literals and placeholders become ?,
+    value lists collapse to (...), so the same query with other values matches.
+    """
+    if isinstance(statement, (bytes, bytearray)):
+        statement = statement.decode(errors="replace")
+    sql = _STRING.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip().lower()
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self._render_started = None
+
+
+def _request_stats():
+    if not has_request_context():
+        return None
+    return g.get("_metrics")
+
+
+def _labels():
+    action = ""
+    if request.endpoint in ACTION_ENDPOINTS and request.method == "POST":
+        action = request.form.get("action", "")
+    return (request.endpoint or "unknown", action)
+
+
+def init_app(app):
+    """
+    Config:
+      SLOW_QUERY_LOG -> log statements slower than SLOW_QUERY_MS (off by default)
+      SLOW_QUERY_MS  -> threshold in milliseconds
+      METRICS_TOKEN  -> scrapers sending "Authorization: Bearer <token>" may read /metrics
+      METRICS_ALLOW  -> addresses / networks that may read /metrics without the token
+                        (only this host by default)
+    """
+    app.config.setdefault("SLOW_QUERY_LOG", False)
+    app.config.setdefault("SLOW_QUERY_MS", 200)
+    app.config.setdefault("METRICS_TOKEN", None)
+    app.config.setdefault("METRICS_ALLOW", ("127.0.0.1/32", "::1/128"))
+
+    def on_query(statement, seconds):
+        stats = _request_stats()
+        if stats is not None:
+            stats.db_time += seconds
+            if statement is not None:
+                stats.queries += 1
+
+        if (statement is not None and app.config["SLOW_QUERY_LOG"]
+                and seconds * 1000 >= app.config["SLOW_QUERY_MS"]):
+            endpoint = request.endpoint if has_request_context() else "-"
+            app.logger.warning("slow query %.1fms [%s] %s",
+                               seconds * 1000, endpoint, fingerprint(statement))
+
+    db.add_query_hook(on_query)
+
+    @app.before_request
+    def start_request_metrics():
+        g._metrics = RequestStats()
+
+    @app.teardown_request
+    def record_request_metrics(exc=None):
+        stats = g.pop("_metrics", None)
+        if stats is None:
+            return
+        labels = _labels()
+        REQUEST_LATENCY.observe(labels, time.perf_counter() - stats.started)
+        REQUEST_DB_TIME.observe(labels, stats.db_time)
+        REQUEST_QUERIES.observe(labels, stats.queries)
+        REQUEST_RENDER_TIME.observe(labels, stats.render_time)
+
+    def render_started(sender, template, context, **extra):
+        stats = _request_stats()
+        if stats is not None:
+            stats._render_started = time.perf_counter()
+
+    def render_finished(sender, template, context, **extra):
+        stats = _request_stats()
+        if stats is not None and stats._render_started is not None:
+            stats.render_time += time.perf_counter() - stats._render_started
+            stats._render_started = None
+
+    before_render_template.connect(render_started, app)
+    template_rendered.connect(render_finished, app)
+
+
+def scrape_allowed():
+    """True when the current request may read /metrics (token or allowed address)."""
+    token = current_app.config["METRICS_TOKEN"]
+    if token:
+        sent = request.headers.get("Authorization", "")
+        if sent.startswith("Bearer ") and hmac.compare_digest(sent[7:].encode(), token.encode()):
+            return True
+
+    try:
+        address = ipaddress.ip_address(request.remote_addr or "")
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in current_app.config["METRICS_ALLOW"])
+
+
+def render_metrics(gauges=None):
+    """
+    All histograms in the Prometheus text format.
+    gauges -> {"name": value} extra values to expose (pool, cache stats), name may include labels
+    """
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render(LABELS)
+    typed = set()
+    for name, value in (gauges or {}).items():
+        # name may carry labels: dawlo_x{query="..."}
+        base = name.split("{", 1)[0]
+        if base not in typed:
+            typed.add(base)
+            lines.append(f"# TYPE {base} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
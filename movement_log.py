@@ -0,0 +1,379 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+
+import db
+import statements
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:   # windows
+    fcntl = None
+    import msvcrt
+
+# stock movement records, written synchronously or write-behind
+# synchronous (default): the rows are inserted into Stock_Movement inside the caller's transaction.
+# write-behind (MOVEMENT_JOURNAL = path): the rows are written (and fsynced) to a local journal file
+# while the caller's transaction is still open, as one entry with a transaction id, and that id is
+# inserted into Movement_Journal_Txn by the transaction itself. A background thread bulk-inserts
+# committed entries every MOVEMENT_FLUSH_MS or as soon as MOVEMENT_FLUSH_ROWS rows are waiting,
+# deleting their Movement_Journal_Txn rows in the same commit, and then shrinks the journal.
+# Entries of rolled back transactions are dropped. After a crash the journal is replayed on the
+# next start, and Movement_Journal_Txn tells which of its entries committed; every row also
+# carries a journal_id so a replay never inserts it twice. Stock_Movement lags the stock by up
+# to one flush. If the journal cannot be written, the rows are inserted synchronously instead.
+# A journal file is locked by the process using it: each process takes the first free slot
+# (path, path.1, path.2, ...) and takes over the journals of slots nobody holds any more.
+
+FLUSH_MS = 200
+FLUSH_ROWS = 500
+MAX_SLOTS = 32
+
+COLUMNS = "(journal_id, movement_type, quantity_change, movement_date, warehouse_item_id, emp_id)"
+
+logger = logging.getLogger(__name__)
+
+
+class JournalInUse(Exception):
+    pass
+
+
+def _lock(path):
+    """Opens path + ".lock" and locks it for as long as the file stays open."""
+    f = open(path + ".lock", "a")
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        raise JournalInUse(path) from None
+    return f
+
+
+def _slot_path(path, slot):
+    return path if slot == 0 else f"{path}.{slot}"
+
+
+def _read_entries(path):
+    entries = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line is cut off if the process died while writing it,
+                    # its transaction never got to commit
+                    logger.warning("skipped a damaged movement journal line")
+                    continue
+                entries.append((entry["txn"], entry["rows"]))
+    return entries
+
+
+def _line(txn, rows):
+    return json.dumps({"txn": txn, "rows": rows}) + "\n"
+
+
+class MovementJournal:
+    def __init__(self, path, flush_ms=FLUSH_MS, flush_rows=FLUSH_ROWS, fsync=True):
+        self.base_path = path
+        self.path = None   # the slot this process holds, set by open()
+        self.flush_ms = flush_ms
+        self.flush_rows = flush_rows
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()   # one flush at a time
+        self._in_flight = {}                  # txn -> rows, written but not committed yet
+        self._pending = []                    # (txn, rows, known to be committed), oldest first
+        self._pending_rows = 0
+        self._file = None
+        self._lock_file = None
+        self._stopped = False
+
+        # stats
+        self.appended = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+
+    def open(self):
+        """
+        Takes a free journal slot, loads what a previous run left in it and in any other
+        slot no process holds; returns how many rows were loaded.
+        """
+        held = None
+        orphans = []
+        for slot in range(MAX_SLOTS):
+            path = _slot_path(self.base_path, slot)
+            if held is None or os.path.exists(path):
+                try:
+                    lock_file = _lock(path)
+                except JournalInUse:
+                    continue
+                if held is None:
+                    held = (path, lock_file)
+                else:
+                    orphans.append((path, lock_file))
+        if held is None:
+            raise JournalInUse(f"all {MAX_SLOTS} movement journal slots of {self.base_path} are in use")
+        self.path, self._lock_file = held
+
+        entries = _read_entries(self.path)
+        with self._lock:
+            self._file = open(self.path, "a", encoding="utf-8")
+            for path, lock_file in orphans:
+                # copy into our own journal before removing theirs, so a crash keeps them somewhere
+                adopted = _read_entries(path)
+                self._write("".join(_line(txn, rows) for txn, rows in adopted))
+                os.remove(path)
+                lock_file.close()
+                entries += adopted
+            # whether these committed is only known to the database, flush() asks it
+            self._pending = [(txn, rows, False) for txn, rows in entries] + self._pending
+            self._pending_rows += sum(len(rows) for _, rows in entries)
+        return sum(len(rows) for _, rows in entries)
+
+    def _write(self, text):
+        if not text:
+            return
+        self._file.write(text)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def write(self, txn, rows):
+        """Makes the rows of an open transaction durable in the journal."""
+        with self._lock:
+            self._write(_line(txn, rows))
+            self._in_flight[txn] = rows
+
+    def committed(self, txn):
+        """The transaction committed: its rows go out with the next flush."""
+        with self._lock:
+            rows = self._in_flight.pop(txn)
+            self._pending.append((txn, rows, True))
+            self._pending_rows += len(rows)
+            self.appended += len(rows)
+            if self._pending_rows >= self.flush_rows:
+                self._wake.notify()
+
+    def aborted(self, txn):
+        """The transaction rolled back: its entry is left out of the journal from the next rewrite."""
+        with self._lock:
+            self._in_flight.pop(txn, None)
+
+    def _committed_txns(self, cur, txns):
+        found = set()
+        for start in range(0, len(txns), self.flush_rows):
+            chunk = txns[start:start + self.flush_rows]
+            cur.execute(f"""
+                select txn_id
+                from Movement_Journal_Txn
+                where txn_id in ({", ".join(["%s"] * len(chunk))})
+            """, chunk)
+            found.update(row["txn_id"] for row in cur.fetchall())
+        return found
+
+    def flush(self):
+        """Inserts every committed entry into Stock_Movement, then shrinks the journal."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+            if not batch:
+                return 0
+
+            conn = db.get_pool().acquire()
+            try:
+                cur = conn.cursor(dictionary=True)
+                unknown = [txn for txn, _, known in batch if not known]
+                committed = self._committed_txns(cur, unknown) if unknown else set()
+                records = [record for txn, rows, known in batch if known or txn in committed
+                           for record in rows]
+
+                for start in range(0, len(records), self.flush_rows):
+                    chunk = records[start:start + self.flush_rows]
+                    rows = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(chunk))
+                    params = [value for record in chunk for value in record]
+                    # rows a crashed run already inserted are skipped by the journal_id key
+                    cur.execute(f"""
+                        insert into Stock_Movement {COLUMNS}
+                        values {rows}
+                        on duplicate key update journal_id = journal_id
+                    """, params)
+
+                txns = [txn for txn, _, _ in batch]
+                for start in range(0, len(txns), self.flush_rows):
+                    chunk = txns[start:start + self.flush_rows]
+                    cur.execute(f"""
+                        delete from Movement_Journal_Txn
+                        where txn_id in ({", ".join(["%s"] * len(chunk))})
+                    """, chunk)
+                conn.commit()
+                cur.close()
+            finally:
+                conn.close()
+
+            with self._lock:
+                # entries committed while the batch was being inserted stay in the journal
+                self._pending = self._pending[len(batch):]
+                self._pending_rows -= sum(len(rows) for _, rows, _ in batch)
+                self._rewrite()
+                self.flushed += len(records)
+                self.flushes += 1
+            return len(records)
+
+    def _rewrite(self):
+        entries = [(txn, rows) for txn, rows, _ in self._pending] + list(self._in_flight.items())
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(_line(txn, rows) for txn, rows in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def run(self):
+        failed = False
+        while True:
+            with self._lock:
+                if not self._stopped and (failed or self._pending_rows < self.flush_rows):
+                    self._wake.wait(self.flush_ms / 1000)
+                stopped = self._stopped
+            try:
+                self.flush()
+                failed = False
+            except Exception as e:
+                # the database is down: the rows stay in the journal for the next try
+                failed = True
+                self.failures += 1
+                logger.warning("movement journal flush failed: %s", e)
+            if stopped:
+                return
+
+    def start(self):
+        threading.Thread(target=self.run, name="movement-journal", daemon=True).start()
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            self._wake.notify()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning("movement journal not flushed at shutdown, replayed on next start: %s", e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self._pending_rows,
+                "in_flight": sum(len(rows) for rows in self._in_flight.values()),
+                "appended": self.appended,
+                "flushed": self.flushed,
+                "flushes": self.flushes,
+                "failures": self.failures,
+            }
+
+
+journal = None
+_start_lock = threading.Lock()
+
+
+def insert_movements(cur, rows_sql, params=(), query_name=None):
+    """
+    Records stock movements. rows_sql selects movement_type, quantity_change,
+    warehouse_item_id and emp_id; movement_date is the current time.
+    query_name runs the statements as named prepared statements (see statements.py).
+    """
+    connection = getattr(cur, "connection", None)
+    if journal is None or connection is None:
+        _insert_now(cur, rows_sql, params, query_name)
+        return
+
+    rows = statements.run(cur, query_name and query_name + ".rows", rows_sql, params).fetchall()
+    now = datetime.now().isoformat(sep=" ", timespec="seconds")
+    records = []
+    for row in rows:
+        if not isinstance(row, (tuple, list)):
+            row = (row["movement_type"], row["quantity_change"], row["warehouse_item_id"], row["emp_id"])
+        movement_type, quantity_change, warehouse_item_id, emp_id = row
+        records.append([uuid.uuid4().hex, movement_type, float(quantity_change), now,
+                        warehouse_item_id, emp_id])
+    if not records:
+        return
+
+    txn = uuid.uuid4().hex
+    try:
+        journal.write(txn, records)
+    except OSError as e:
+        # disk full, journal gone, ...: the movements still have to be recorded
+        logger.warning("movement journal write failed, inserting the movements directly: %s", e)
+        _insert_now(cur, rows_sql, params, query_name)
+        return
+
+    # the journal entry counts only if this row commits together with the stock change
+    statements.run(cur, query_name and query_name + ".txn", """
+        insert into Movement_Journal_Txn (txn_id)
+        values (%s)
+    """, (txn,))
+    connection.after_commit(lambda: journal.committed(txn))
+    connection.after_rollback(lambda: journal.aborted(txn))
+
+
+def _insert_now(cur, rows_sql, params, query_name):
+    statements.run(cur, query_name, f"""
+        insert into Stock_Movement
+        (movement_type, quantity_change, movement_date, warehouse_item_id, emp_id)
+        select m.movement_type, m.quantity_change, now(), m.warehouse_item_id, m.emp_id
+        from ({rows_sql}) m
+    """, params)
+
+
+def journal_stats():
+    return journal.stats() if journal is not None else None
+
+
+def init_app(app):
+    """
+    Config:
+      MOVEMENT_JOURNAL     -> journal file path, turns write-behind on (None = synchronous inserts);
+                              processes sharing it get path.1, path.2, ... (see MAX_SLOTS)
+      MOVEMENT_FLUSH_MS    -> longest time between two flushes
+      MOVEMENT_FLUSH_ROWS  -> queued rows that trigger a flush right away
+      MOVEMENT_FSYNC       -> fsync every journal write
+    """
+    app.config.setdefault("MOVEMENT_JOURNAL", None)
+    app.config.setdefault("MOVEMENT_FLUSH_MS", FLUSH_MS)
+    app.config.setdefault("MOVEMENT_FLUSH_ROWS", FLUSH_ROWS)
+    app.config.setdefault("MOVEMENT_FSYNC", True)
+
+    started = threading.Event()
+
+    @app.before_request
+    def start_movement_journal():
+        # first request: replay what a previous run left behind, then start flushing
+        global journal
+        if started.is_set():
+            return
+        with _start_lock:
+            if started.is_set():
+                return
+            path = app.config["MOVEMENT_JOURNAL"]
+            if path:
+                journal = MovementJournal(path, app.config["MOVEMENT_FLUSH_MS"],
+                                          app.config["MOVEMENT_FLUSH_ROWS"], app.config["MOVEMENT_FSYNC"])
+                replayed = journal.open()
+                if replayed:
+                    app.logger.info("replaying %s stock movements from %s", replayed, journal.path)
+                journal.start()
+                atexit.register(journal.stop)
+            started.set()
@@ -0,0 +1,145 @@
+import base64
+import json
+
+from flask import request, url_for
+
+# keyset (seek) pagination for the list pages:
+# instead of OFFSET the next page starts right after the key of the last row shown,
+# so page 1000 costs the same as page 1.
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_key(values):
+    raw = json.dumps(values, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_key(token, size):
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def requested_page_size():
+    size = request.args.get("page_size", PAGE_SIZE, type=int)
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def estimate_count(cur, table, count_sql=None, params=()):
+    """
+    Rough number of rows without a COUNT(*) over the table:
+    the table statistics when unfiltered, the optimizer estimate (EXPLAIN) when filtered.
+    table may be a list of tables read together (live + archive).
+    """
+    if count_sql is None:
+        tables = [table] if isinstance(table, str) else list(table)
+        marks = ", ".join(["lower(%s)"] * len(tables))
+        cur.execute(f"""
+            select sum(table_rows) as table_rows
+            from information_schema.tables
+            where table_schema = database() and lower(table_name) in ({marks})
+        """, tables)
+        row = cur.fetchone()
+        return int(row["table_rows"] or 0) if row else 0
+
+    cur.execute("explain " + count_sql, params)
+    plan = cur.fetchall()
+    if not plan:
+        return 0
+
+    # the rows of the outer query are its join, in join order: the estimate is the product of
+    # what each table lets through (the first table is not always the paginated one, and a
+    # filter on a joined table only shows up on that table's row). Rows with another id belong
+    # to subqueries or to the parts of a derived table (live + archive), which the outer query
+    # already reads as one <derived> row.
+    outer = plan[0].get("id")
+    estimate = 1.0
+    for step in plan:
+        if step.get("id") != outer:
+            continue
+        rows = step.get("rows")
+        filtered = step.get("filtered")
+        estimate *= (1 if rows is None else float(rows)) * (100 if filtered is None else float(filtered)) / 100
+    return int(estimate)
+
+
+class KeysetPage:
+    def __init__(self, rows, page_size, estimated_total, next_url, prev_url):
+        self.rows = rows
+        self.page_size = page_size
+        self.estimated_total = estimated_total
+        self.next_url = next_url
+        self.prev_url = prev_url
+
+
+def keyset_page(cur, select_sql, keys, table, where="", params=(), descending=False):
+    """
+    Runs select_sql one page at a time.
+      keys  -> [(sql expression, row field)] unique sort key, e.g. [("order_id", "order_id")]
+      where -> the page's filter without "where" (search), params are its values
+    ?after= / ?before= hold the key of the row the page continues from,
+    every other request argument (field, search, sort, ...) is kept in the links.
+    """
+    page_size = requested_page_size()
+    after = decode_key(request.args.get("after"), len(keys))
+    before = decode_key(request.args.get("before"), len(keys)) if after is None else None
+
+    # going back = same query in the opposite direction, reversed afterwards
+    backwards = before is not None
+    desc = descending != backwards
+
+    conditions = [f"({where})"] if where else []
+    query_params = list(params)
+
+    token = before if backwards else after
+    if token is not None:
+        columns = ", ".join(expr for expr, _ in keys)
+        marks = ", ".join(["%s"] * len(keys))
+        conditions.append(f"({columns}) {'<' if desc else '>'} ({marks})")
+        query_params += token
+
+    direction = "desc" if desc else "asc"
+    sql = select_sql
+    if conditions:
+        sql += " where " + " and ".join(conditions)
+    sql += " order by " + ", ".join(f"{expr} {direction}" for expr, _ in keys)
+    sql += " limit %s"
+    query_params.append(page_size + 1)
+
+    cur.execute(sql, query_params)
+    rows = cur.fetchall()
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    has_next = has_more if not backwards else True
+    has_prev = has_more if backwards else after is not None
+
+    if where:
+        estimated_total = estimate_count(cur, table, f"{select_sql} where {where}", params)
+    else:
+        estimated_total = estimate_count(cur, table)
+
+    args = request.args.to_dict()
+    args.pop("after", None)
+    args.pop("before", None)
+
+    next_url = prev_url = None
+    if rows and has_next:
+        next_url = url_for(request.endpoint, **request.view_args,
+                           **args, after=encode_key([rows[-1][field] for _, field in keys]))
+    if rows and has_prev:
+        prev_url = url_for(request.endpoint, **request.view_args,
+                           **args, before=encode_key([rows[0][field] for _, field in keys]))
+
+    return KeysetPage(rows, page_size, estimated_total, next_url, prev_url)
@@ -0,0 +1,100 @@
+from collections import Counter
+from functools import wraps
+
+from flask import current_app, g, request, has_request_context
+from flask.helpers import get_debug_flag
+
+import db
+from metrics import fingerprint
+
+# development / test checks on the queries a request runs:
+#   - the same statement shape run again and again in one request (N+1 loop)
+#   - more queries than the route declared with @query_budget(n)
+# QUERY_CHECK = "off" | "warn" (log it) | "raise" (fail the request, for tests)
+
+
+class QueryCheckError(Exception):
+    """A request ran an N+1 loop or went over its query budget (QUERY_CHECK = "raise")."""
+
+
+def query_budget(max_queries):
+    """
+    Declares the most queries a route may run, e.g.
+
+        @app.route("/tables")
+        @login_required
+        @query_budget(5)
+        def tables_dashboard(): ...
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            g._query_budget = max_queries
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+class _RequestQueries:
+    def __init__(self):
+        self.shapes = Counter()
+        self.total = 0
+        self.reported = set()
+
+
+def check_mode(app):
+    """
+    QUERY_CHECK of the app. Unset it follows debug mode, looked up per request:
+    `flask run --debug` turns debug on only after this module's init_app ran.
+    """
+    mode = app.config["QUERY_CHECK"]
+    if mode is None:
+        mode = "warn" if app.debug or get_debug_flag() else "off"
+    return mode
+
+
+def init_app(app):
+    """
+    Config:
+      QUERY_CHECK            -> "off", "warn" or "raise" (default "warn" in debug, else "off")
+      N_PLUS_ONE_THRESHOLD   -> same-shape statements allowed per request before it is flagged
+    """
+    app.config.setdefault("QUERY_CHECK", None)
+    app.config.setdefault("N_PLUS_ONE_THRESHOLD", 5)
+
+    def problem(key, message):
+        queries = g.get("_query_check")
+        if key in queries.reported:
+            return
+        queries.reported.add(key)
+        if check_mode(app) == "raise":
+            raise QueryCheckError(message)
+        app.logger.warning(message)
+
+    def on_query(statement, seconds):
+        # the hooks are global: only count the requests of this app
+        if statement is None or not has_request_context() or current_app._get_current_object() is not app:
+            return
+        queries = g.get("_query_check")
+        if queries is None:
+            return
+
+        shape = fingerprint(statement)
+        queries.shapes[shape] += 1
+        queries.total += 1
+
+        if queries.shapes[shape] > app.config["N_PLUS_ONE_THRESHOLD"]:
+            problem(("repeat", shape),
+                    f"N+1 query in {request.endpoint}: ran {queries.shapes[shape]}x: {shape}")
+
+        budget = g.get("_query_budget")
+        if budget is not None and queries.total > budget:
+            problem("budget",
+                    f"{request.endpoint} went over its query budget of {budget}: {shape}")
+
+    db.add_query_hook(on_query)
+
+    @app.before_request
+    def start_query_check():
+        if check_mode(app) != "off":
+            g._query_check = _RequestQueries()
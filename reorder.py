@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+# draft purchases for every ingredient at or below its reorder level, in one transaction:
+# one query picks the supplier of every item, then per supplier one Purchase insert and
+# one multi-row Purchase_Item insert.
+
+# stock is brought back up to RESTOCK_FACTOR x the reorder level
+RESTOCK_FACTOR = 2
+
+
+def _lock_low_stock(cur):
+    # a second run at the same time waits here until the first one commits. This is the
+    # transaction's first read, so the reads after it start once the wait is over and see
+    # the first run's drafts: the "already on an open purchase" check below cannot miss them
+    cur.execute("""
+        select item_id
+        from Warehouse_Item
+        where stock_quantity <= reorder_level
+        order by item_id
+        for update
+    """)
+    cur.fetchall()
+
+
+def _reorder_lines(cur):
+    # best supplier per item: cheapest, then fastest delivery (active suppliers only);
+    # items already on an open (draft / confirmed) purchase are skipped
+    cur.execute("""
+        select warehouse_item_id, supplier_id, unit_price, quantity
+        from (
+            select w.item_id as warehouse_item_id,
+                   si.supplier_id,
+                   si.unit_price,
+                   %s * w.reorder_level - w.stock_quantity as quantity,
+                   row_number() over (
+                       partition by w.item_id
+                       order by si.unit_price, si.avg_delivery_days is null,
+                                si.avg_delivery_days, si.supplier_id
+                   ) as choice
+            from Warehouse_Item w
+            join Supplier_Item si
+              on si.warehouse_item_id = w.item_id
+             and si.is_supplying = 1
+            join Supplier s
+              on s.supplier_id = si.supplier_id
+             and s.is_active = 1
+            where w.stock_quantity <= w.reorder_level
+              and not exists (
+                  select 1
+                  from Purchase_Item pi
+                  join Purchase p on p.purchase_id = pi.purchase_id
+                  where pi.warehouse_item_id = w.item_id
+                    and p.purchase_status in ('draft', 'confirmed')
+              )
+        ) ranked
+        where choice = 1 and quantity > 0
+        order by supplier_id, warehouse_item_id
+    """, (RESTOCK_FACTOR,))
+    return cur.fetchall()
+
+
+def create_reorder_drafts(cur, emp_id):
+    """
+    Creates the draft purchases, grouped by supplier.
+    Run it inside db.run_in_transaction, as the first thing the transaction does.
+    Returns the new purchase ids.
+    """
+    _lock_low_stock(cur)
+
+    by_supplier = defaultdict(list)
+    for line in _reorder_lines(cur):
+        by_supplier[line["supplier_id"]].append(line)
+
+    purchase_ids = []
+    for supplier_id, lines in by_supplier.items():
+        total_cost = sum(l["quantity"] * l["unit_price"] for l in lines)
+
+        cur.execute("""
+            insert into Purchase
+            (purchase_date, total_cost, purchase_status, emp_id, supplier_id)
+            values (curdate(), %s, 'draft', %s, %s)
+        """, (total_cost, emp_id, supplier_id))
+        purchase_id = cur.lastrowid
+
+        rows = ", ".join(["(%s, %s, %s, %s)"] * len(lines))
+        params = []
+        for l in lines:
+            params += [purchase_id, l["warehouse_item_id"], l["quantity"], l["unit_price"]]
+        cur.execute(f"""
+            insert into Purchase_Item
+            (purchase_id, warehouse_item_id, quantity, unit_price)
+            values {rows}
+        """, params)
+
+        purchase_ids.append(purchase_id)
+
+    return purchase_ids
@@ -0,0 +1,156 @@
+import threading
+import time
+from datetime import timedelta
+
+# cumulative (prefix sum) revenue and order count per day
+# Daily_Revenue_Index holds, for every day with sales, the totals from the first sale up to
+# and including that day. Revenue of any [from, to) range is then C(to - 1) - C(from - 1):
+# two lookups, whatever the range length. In memory the index is one array per value with a
+# slot for every day, so the lookup is an array index instead of a search.
+
+
+def add_paid_order(cur, order_id):
+    """
+    Adds a paid order to the index. Called from record_paid_order (same transaction).
+    """
+    # days after the order's day already include everything before them
+    cur.execute("""
+        update Daily_Revenue_Index i
+        join Orders o on o.order_id = %s
+        set i.cum_revenue = i.cum_revenue + o.total,
+            i.cum_orders = i.cum_orders + 1
+        where i.sale_date > date(o.order_date)
+    """, (order_id,))
+
+    # the order's own day: a new row starts from the previous day's totals
+    cur.execute("""
+        insert into Daily_Revenue_Index (sale_date, cum_revenue, cum_orders)
+        select date(o.order_date),
+               ifnull((select p.cum_revenue from Daily_Revenue_Index p
+                       where p.sale_date < date(o.order_date)
+                       order by p.sale_date desc limit 1), 0) + o.total,
+               ifnull((select p.cum_orders from Daily_Revenue_Index p
+                       where p.sale_date < date(o.order_date)
+                       order by p.sale_date desc limit 1), 0) + 1
+        from Orders o
+        where o.order_id = %s
+        on duplicate key update
+            cum_revenue = cum_revenue + o.total,
+            cum_orders = cum_orders + 1
+    """, (order_id,))
+
+
+def rebuild_index(cur):
+    """
+    Rebuilds the index from Daily_Sales (run after the rollups were rebuilt).
+    """
+    cur.execute("delete from Daily_Revenue_Index")
+    cur.execute("""
+        insert into Daily_Revenue_Index (sale_date, cum_revenue, cum_orders)
+        select sale_date,
+               sum(revenue) over (order by sale_date),
+               sum(order_count) over (order by sale_date)
+        from Daily_Sales
+    """)
+
+
+class RevenueIndex:
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+
+        # (date of slot 0, cumulative revenue per day, cumulative paid orders per day)
+        # replaced as a whole on reload, so a reader never mixes two versions
+        self.days = (None, [], [])
+
+    def _db_signature(self, cur):
+        # the newest row changes on every payment (new day or added to today)
+        cur.execute("""
+            select sale_date, cum_orders, cum_revenue
+            from Daily_Revenue_Index
+            order by sale_date desc
+            limit 1
+        """)
+        row = cur.fetchone()
+        return (row["sale_date"], row["cum_orders"], row["cum_revenue"]) if row else None
+
+    def _load(self, cur):
+        cur.execute("""
+            select sale_date, cum_revenue, cum_orders
+            from Daily_Revenue_Index
+            order by sale_date
+        """)
+        rows = cur.fetchall()
+
+        if not rows:
+            self.days = (None, [], [])
+            return
+
+        by_day = {row["sale_date"]: row for row in rows}
+        first_day = rows[0]["sale_date"]
+        days = (rows[-1]["sale_date"] - first_day).days + 1
+
+        # days without sales carry the previous day's totals
+        revenue = []
+        orders = []
+        cum_revenue, cum_orders = 0.0, 0
+        day = first_day
+        for _ in range(days):
+            row = by_day.get(day)
+            if row is not None:
+                cum_revenue, cum_orders = float(row["cum_revenue"]), int(row["cum_orders"])
+            revenue.append(cum_revenue)
+            orders.append(cum_orders)
+            day += timedelta(days=1)
+
+        self.days = (first_day, revenue, orders)
+
+    def get(self, cur):
+        """
+        Returns the index, reloading it first if a payment changed it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._signature is not None and now - self._checked_at < self.check_interval:
+                return self
+
+            signature = self._db_signature(cur)
+            self._checked_at = now
+            if signature != self._signature:
+                self._load(cur)
+                self._signature = signature
+            return self
+
+    @staticmethod
+    def _cumulative(days, day):
+        # totals up to and including day
+        first_day, revenue, orders = days
+        if first_day is None or day < first_day:
+            return 0.0, 0
+        slot = min((day - first_day).days, len(revenue) - 1)
+        return revenue[slot], orders[slot]
+
+    def range_totals(self, cur, start, end):
+        """
+        Revenue, paid orders and average ticket of the days in [start, end).
+        """
+        days = self.get(cur).days
+        if end <= start:
+            revenue, orders = 0.0, 0
+        else:
+            end_revenue, end_orders = self._cumulative(days, end - timedelta(days=1))
+            start_revenue, start_orders = self._cumulative(days, start - timedelta(days=1))
+            revenue = round(end_revenue - start_revenue, 2)
+            orders = end_orders - start_orders
+
+        return {
+            "revenue": revenue,
+            "orders": orders,
+            "average_ticket": round(revenue / orders, 2) if orders else 0,
+        }
+
+
+revenue_index = RevenueIndex()
@@ -0,0 +1,127 @@
+# daily sales rollups used by the manager dashboard
+# they are updated when an order is paid, so the dashboard never scans the order history
+
+from archive import source
+from revenue_index import add_paid_order, rebuild_index
+
+ROLLUP_TABLES = ("Daily_Sales", "Daily_Item_Sales", "Daily_Customer_Orders", "Daily_Order_Type")
+
+# first day of the month of order_date
+MONTH_OF_ORDER = "date(order_date) - interval (dayofmonth(order_date) - 1) day"
+MONTH_OF_SALE = "sale_date - interval (dayofmonth(sale_date) - 1) day"
+
+
+def record_paid_order(cur, order_id):
+    """
+    Adds a paid order to the daily rollups.
+    Call it in the same transaction that marks the order as paid.
+    """
+    cur.execute("""
+        insert into Daily_Sales (sale_date, revenue, order_count)
+        select date(order_date), total, 1
+        from Orders
+        where order_id = %s
+        on duplicate key update
+            revenue = revenue + values(revenue),
+            order_count = order_count + 1
+    """, (order_id,))
+
+    cur.execute("""
+        insert into Daily_Item_Sales (sale_date, menu_item_id, quantity, sales)
+        select date(o.order_date), oi.menu_item_id, oi.quantity, oi.subtotal
+        from Order_Item oi
+        join Orders o on o.order_id = oi.order_id
+        where o.order_id = %s
+          and oi.item_status != 'cancelled'
+        on duplicate key update
+            quantity = quantity + values(quantity),
+            sales = sales + values(sales)
+    """, (order_id,))
+
+    cur.execute("""
+        insert into Daily_Customer_Orders (sale_date, customer_id, order_count)
+        select date(order_date), customer_id, 1
+        from Orders
+        where order_id = %s
+        on duplicate key update order_count = order_count + 1
+    """, (order_id,))
+
+    cur.execute("""
+        insert into Daily_Order_Type (sale_date, order_type, order_count)
+        select date(order_date), order_type, 1
+        from Orders
+        where order_id = %s
+        on duplicate key update order_count = order_count + 1
+    """, (order_id,))
+
+    add_paid_order(cur, order_id)
+
+    # the month's numbers changed -> cached dashboard panels for it are stale
+    cur.execute(f"""
+        insert into Sales_Period_Version (period, version)
+        select {MONTH_OF_ORDER}, 1
+        from Orders
+        where order_id = %s
+        on duplicate key update version = version + 1
+    """, (order_id,))
+
+
+def rebuild_rollups(cur):
+    """
+    Rebuilds all rollups from the paid orders in the history, live and archived (backfill / repair).
+    """
+    orders = source("Orders", True)
+    order_items = source("Order_Item", True)
+
+    # months that had numbers before, so a month that ends up empty is reloaded too
+    cur.execute(f"select distinct {MONTH_OF_SALE} as period from Daily_Sales")
+    months = {row["period"] for row in cur.fetchall()}
+
+    for table in ROLLUP_TABLES:
+        cur.execute(f"delete from {table}")
+
+    cur.execute(f"""
+        insert into Daily_Sales (sale_date, revenue, order_count)
+        select date(o.order_date), sum(o.total), count(*)
+        from {orders} o
+        where o.order_status = 'paid'
+        group by date(o.order_date)
+    """)
+
+    cur.execute(f"""
+        insert into Daily_Item_Sales (sale_date, menu_item_id, quantity, sales)
+        select date(o.order_date), oi.menu_item_id, sum(oi.quantity), sum(oi.subtotal)
+        from {order_items} oi
+        join {orders} o on o.order_id = oi.order_id
+        where o.order_status = 'paid'
+          and oi.item_status != 'cancelled'
+        group by date(o.order_date), oi.menu_item_id
+    """)
+
+    cur.execute(f"""
+        insert into Daily_Customer_Orders (sale_date, customer_id, order_count)
+        select date(o.order_date), o.customer_id, count(*)
+        from {orders} o
+        where o.order_status = 'paid'
+        group by date(o.order_date), o.customer_id
+    """)
+
+    cur.execute(f"""
+        insert into Daily_Order_Type (sale_date, order_type, order_count)
+        select date(o.order_date), o.order_type, count(*)
+        from {orders} o
+        where o.order_status = 'paid'
+        group by date(o.order_date), o.order_type
+    """)
+
+    cur.execute(f"select distinct {MONTH_OF_SALE} as period from Daily_Sales")
+    months.update(row["period"] for row in cur.fetchall())
+
+    if months:
+        cur.executemany("""
+            insert into Sales_Period_Version (period, version)
+            values (%s, 1)
+            on duplicate key update version = version + 1
+        """, [(month,) for month in sorted(months)])
+
+    rebuild_index(cur)
@@ -0,0 +1,141 @@
+import time
+
+import db
+import movement_log
+
+# point-in-time warehouse stock
+# Warehouse_Item.stock_quantity only holds the current stock. A daily job copies it into
+# Stock_Snapshot (flask --app 1220071_1222640 snapshot-stock), so the stock at any moment is
+# the nearest earlier snapshot plus the movements after it, however long the history is.
+# "after it" goes by movement_id, not by time: the snapshot keeps the newest movement_id its
+# stock already counts, so movements in the same second as the snapshot are not counted twice
+# or lost. Archived movements (archive.py) are read as well.
+# before the first snapshot the current stock minus the later movements is used.
+
+# how long a snapshot waits for the movement journals (movement_log.py) to be flushed
+JOURNAL_WAIT = 10.0
+SNAPSHOT_ATTEMPTS = 3
+
+
+class JournalPending(Exception):
+    """Movements of committed stock changes are still waiting in a movement journal."""
+
+
+def wait_for_journal(conn, timeout=JOURNAL_WAIT):
+    """
+    Waits until no movement journal has committed rows waiting to be flushed.
+    Reads without locks and outside any transaction, so the flushes are never held up.
+    Raises JournalPending after timeout seconds.
+    """
+    if movement_log.journal is not None:
+        movement_log.journal.flush()
+
+    deadline = time.monotonic() + timeout
+    cur = conn.cursor(dictionary=True)
+    try:
+        while True:
+            conn.rollback()   # every read gets a fresh view
+            cur.execute("select count(*) as waiting from Movement_Journal_Txn")
+            waiting = cur.fetchone()["waiting"]
+            conn.rollback()
+            if not waiting:
+                return
+            if time.monotonic() > deadline:
+                raise JournalPending(f"{waiting} stock changes still waiting in the movement journal")
+            time.sleep(0.05)
+    finally:
+        cur.close()
+
+
+def take_snapshot(cur):
+    """
+    Copies the current stock of every warehouse item into Stock_Snapshot.
+    Meant to run inside db.run_in_transaction, after wait_for_journal (see snapshot_stock).
+    Raises JournalPending if a journaled change committed in between. Returns the number of items.
+    """
+    # stock changes update the item row before they insert their movements, so with every item
+    # locked no change is half done: the stock and the newest movement_id belong together
+    cur.execute("""
+        select item_id
+        from Warehouse_Item
+        order by item_id
+        for share
+    """)
+    cur.fetchall()
+
+    # movements of committed changes still in a movement journal have no movement_id yet.
+    # this is the transaction's first plain read, so it sees every change committed before the
+    # locks; it takes no locks itself, which would hold up the flush deleting these rows
+    cur.execute("select count(*) as waiting from Movement_Journal_Txn")
+    waiting = cur.fetchone()["waiting"]
+    if waiting:
+        raise JournalPending(f"{waiting} stock changes still waiting in the movement journal")
+
+    cur.execute("""
+        insert into Stock_Snapshot (snapshot_at, warehouse_item_id, stock_quantity, movement_id)
+        select now(), item_id, stock_quantity,
+               greatest((select ifnull(max(movement_id), 0) from Stock_Movement),
+                        (select ifnull(max(movement_id), 0) from Stock_Movement_Archive))
+        from Warehouse_Item
+    """)
+    return cur.rowcount
+
+
+def snapshot_stock(conn, attempts=SNAPSHOT_ATTEMPTS):
+    """
+    Takes a snapshot once the movement journals are flushed; a journaled change that commits
+    between the wait and the locks sends it back to waiting. Returns the number of items.
+    """
+    for attempt in range(attempts):
+        wait_for_journal(conn)
+        try:
+            return db.run_in_transaction(conn, take_snapshot)
+        except JournalPending:
+            if attempt == attempts - 1:
+                raise
+
+
+def _movements(table, condition):
+    return f"""
+        (select ifnull(sum(m.quantity_change), 0)
+         from {table} m
+         where m.warehouse_item_id = w.item_id
+           and {condition})
+    """
+
+
+def stock_as_of(cur, as_of, item_id=None):
+    """
+    Stock of every warehouse item (or one) at the timestamp as_of.
+    """
+    where = "where w.item_id = %s" if item_id is not None else ""
+    params = [as_of] * 5 + ([item_id] if item_id is not None else [])
+
+    since_snapshot = "m.movement_id > s.movement_id and m.movement_date <= %s"
+    after_as_of = "m.movement_date > %s"
+
+    cur.execute(f"""
+        select w.item_id, w.item_name, w.unit_of_measure, s.snapshot_at,
+               case
+                   when s.snapshot_at is not null then
+                       s.stock_quantity
+                       + {_movements("Stock_Movement", since_snapshot)}
+                       + {_movements("Stock_Movement_Archive", since_snapshot)}
+                   else
+                       w.stock_quantity
+                       - {_movements("Stock_Movement", after_as_of)}
+                       - {_movements("Stock_Movement_Archive", after_as_of)}
+               end as stock_quantity
+        from Warehouse_Item w
+        left join lateral (
+            select ss.snapshot_at, ss.stock_quantity, ss.movement_id
+            from Stock_Snapshot ss
+            where ss.warehouse_item_id = w.item_id
+              and ss.snapshot_at <= %s
+            order by ss.snapshot_at desc
+            limit 1
+        ) s on true
+        {where}
+        order by w.item_id
+    """, params)
+    return cur.fetchall()
@@ -0,0 +1,89 @@
+import threading
+import time
+
+# named queries run as server-side prepared statements
+# the hot statements of the order flow are registered once by name. The first time a pooled
+# connection runs one, it is prepared on that connection (cursor(prepared=True)) and kept, so
+# later runs only send the statement handle and the parameter values, never the SQL text.
+# the prepared cursors live as long as the connection (see ConnectionPool.prepared_cursors).
+# cursors not from the pool (no .connection) run the same SQL as plain text.
+
+_registry = {}
+_lock = threading.Lock()
+
+
+class NamedQuery:
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+
+        # stats
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.prepares = 0
+        self.seconds = 0.0
+
+    def run(self, cur, params=()):
+        """Runs the query; returns the cursor holding its result."""
+        connection = getattr(cur, "connection", None)
+        start = time.perf_counter()
+        if connection is None:
+            cur.execute(self.sql, params)
+            prepared = cur
+            new = False
+        else:
+            prepared, new = connection.prepared_cursor(self.name)
+            connection.note_statement(self.sql)
+            prepared.execute(self.sql, params)
+        with self._lock:
+            self.executions += 1
+            self.prepares += new
+            self.seconds += time.perf_counter() - start
+        return prepared
+
+    def fetch(self, cur, params=()):
+        """Runs the query; returns all its rows (records or dicts, read with row["column"])."""
+        return self.run(cur, params).fetchall()
+
+    def execute(self, cur, params=()):
+        """Runs the statement; returns the affected row count."""
+        return self.run(cur, params).rowcount
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "prepares": self.prepares,
+                "seconds_total": round(self.seconds, 4),
+            }
+
+
+def register(name, sql):
+    """
+    The NamedQuery for name, registered on first use.
+    The same name always has to come with the same SQL.
+    """
+    with _lock:
+        query = _registry.get(name)
+        if query is None:
+            query = _registry[name] = NamedQuery(name, sql)
+        elif query.sql != sql:
+            raise ValueError(f"query {name!r} is already registered with different SQL")
+        return query
+
+
+def run(cur, name, sql, params=()):
+    """
+    Runs sql as the named query, or as plain text when name is None
+    (statements whose text varies too much to keep prepared). Returns the cursor used.
+    """
+    if name is None:
+        cur.execute(sql, params)
+        return cur
+    return register(name, sql).run(cur, params)
+
+
+def stats():
+    with _lock:
+        queries = list(_registry.values())
+    return {query.name: query.stats() for query in queries}
@@ -0,0 +1,128 @@
+# warehouse stock changes caused by orders
+# the ingredients come from the active recipes in the menu catalog (catalog.py), so no Recipe read;
+# every change is done set-based: one update for all ingredients + one insert for all movements
+# (the movements go through movement_log, which may write them behind)
+
+import statements
+from catalog import menu_catalog
+from movement_log import insert_movements
+
+# the statements of changes touching up to this many warehouse items are prepared statements
+# (see statements.py); each item count is its own statement text
+PREPARED_ITEMS = 8
+
+
+class InsufficientStock(Exception):
+    """The warehouse does not have enough of an ingredient; the caller rolls back."""
+
+
+def ingredients_needed(cur, lines):
+    """
+    Total amount of every warehouse item the (menu_item_id, quantity) lines need
+    (active recipe rows only): {warehouse_item_id: needed}. Items needed in a zero amount
+    are left out: their update changes no row, which would read as a shortfall.
+    """
+    recipes = menu_catalog.get(cur).recipes
+    needs = {}
+    for menu_item_id, quantity in lines:
+        for warehouse_item_id, quantity_required in recipes.get(menu_item_id, ()):
+            needs[warehouse_item_id] = needs.get(warehouse_item_id, 0) + quantity_required * quantity
+    return {warehouse_item_id: needed for warehouse_item_id, needed in needs.items() if needed > 0}
+
+
+def _needs_sql(needs):
+    # derived table of (warehouse_item_id, needed), in item_id order; returns (sql, params)
+    parts = []
+    params = []
+    for warehouse_item_id in sorted(needs):
+        parts.append("select %s as warehouse_item_id, %s as needed")
+        params += [warehouse_item_id, needs[warehouse_item_id]]
+    return " union all ".join(parts), params
+
+
+def _lock_rows(cur, item_ids):
+    # lock the warehouse rows in item_id order, so two tills touching the same
+    # ingredients wait for each other instead of deadlocking
+    placeholders = ", ".join(["%s"] * len(item_ids))
+    cur.execute(f"""
+        select item_id
+        from Warehouse_Item
+        where item_id in ({placeholders})
+        order by item_id
+        for update
+    """, sorted(item_ids))
+    cur.fetchall()
+
+
+def _name(statement, count):
+    return f"stock.{statement}.items{count}" if count <= PREPARED_ITEMS else None
+
+
+def _apply(cur, needs, emp_id, movement_type, sign):
+    if not needs:
+        return
+
+    _lock_rows(cur, needs)
+
+    needs_sql, params = _needs_sql(needs)
+    count = len(needs)
+
+    # the statement texts differ by direction, so does their name
+    action = "take" if sign == "-" else "put_back"
+
+    if sign == "-":
+        # only rows that can cover the amount are updated, so a short ingredient
+        # shows up as a smaller affected-row count (no separate stock check needed)
+        updated = statements.run(cur, _name(action, count), f"""
+            update Warehouse_Item w
+            join ({needs_sql}) n on n.warehouse_item_id = w.item_id
+            set w.stock_quantity = w.stock_quantity - n.needed
+            where w.stock_quantity >= n.needed
+        """, params).rowcount
+
+        if updated < count:
+            raise InsufficientStock("Insufficient stock.")
+    else:
+        statements.run(cur, _name(action, count), f"""
+            update Warehouse_Item w
+            join ({needs_sql}) n on n.warehouse_item_id = w.item_id
+            set w.stock_quantity = w.stock_quantity + n.needed
+        """, params)
+
+    # one movement row per ingredient
+    insert_movements(cur, f"""
+        select %s as movement_type, {sign}n.needed as quantity_change,
+               n.warehouse_item_id, %s as emp_id
+        from ({needs_sql}) n
+    """, [movement_type, emp_id] + params,
+        query_name=_name(f"{action}_movements", count))
+
+
+def deduct_stock(cur, lines, emp_id, movement_type="order"):
+    """
+    Takes the ingredients of the (menu_item_id, quantity) lines out of the warehouse.
+    Raises InsufficientStock if any ingredient is short.
+    """
+    _apply(cur, ingredients_needed(cur, lines), emp_id, movement_type, "-")
+
+
+def restore_stock(cur, lines, emp_id, movement_type="cancel_item"):
+    """
+    Puts the ingredients of the (menu_item_id, quantity) lines back into the warehouse.
+    """
+    _apply(cur, ingredients_needed(cur, lines), emp_id, movement_type, "+")
+
+
+def restore_order_stock(cur, order_id, emp_id, movement_type="cancel_order"):
+    """
+    Puts back the ingredients of every item of an order that is not cancelled.
+    """
+    lines = statements.run(cur, "stock.order_lines", """
+        select menu_item_id, quantity
+        from Order_Item
+        where order_id = %s
+          and item_status != 'cancelled'
+          and quantity > 0
+    """, (order_id,)).fetchall()
+    restore_stock(cur, [(line["menu_item_id"], line["quantity"]) for line in lines],
+                  emp_id, movement_type)
@@ -0,0 +1,105 @@
+from datetime import datetime
+
+# order status of the latest order in the session -> table state shown to staff
+ORDER_STATE = {
+    "ordered": "ordered_waiting",
+    "served": "served_waiting_payment",
+    "paid": "paid_but_seated",
+}
+
+# one round trip for the whole floor:
+#   active   -> newest open session of every table
+#   session_orders -> orders of those sessions, ranked newest first,
+#                     plus how many of them are still unpaid
+TABLE_STATE_SQL = """
+    with active as (
+        select table_id, session_start
+        from (
+            select table_id, session_start,
+                   row_number() over (partition by table_id order by session_start desc) as rn
+            from Table_Session
+            where is_closed = 0
+        ) ranked
+        where rn = 1
+    ),
+    session_orders as (
+        select o.table_id, o.order_id, o.order_status, o.total,
+               row_number() over (partition by o.table_id order by o.order_date desc) as rn,
+               sum(o.order_status in ('pending', 'ordered', 'served'))
+                   over (partition by o.table_id) as open_orders
+        from Orders o
+        join active a on a.table_id = o.table_id and a.session_start = o.session_start
+    )
+    select t.table_id, t.capacity,
+           a.session_start as active_session_start,
+           so.order_id, so.order_status, so.total,
+           coalesce(so.open_orders, 0) as open_orders
+    from Table_Entity t
+    left join active a on a.table_id = t.table_id
+    left join session_orders so on so.table_id = t.table_id and so.rn = 1
+    {where}
+    order by t.table_id
+"""
+
+
+def get_table_states(cur, table_ids=None, order_id=None):
+    """
+    Returns the live state of every table in a single query: active session,
+    session duration, latest order, state and whether it can be closed.
+    table_ids or order_id (the table of that order) limit it to the tables that changed.
+    """
+    if order_id is not None:
+        cur.execute(
+            TABLE_STATE_SQL.format(
+                where="where t.table_id in (select table_id from Orders where order_id = %s)"),
+            (order_id,))
+
+    elif table_ids is not None:
+        table_ids = list(table_ids)
+        if not table_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(table_ids))
+        cur.execute(TABLE_STATE_SQL.format(where=f"where t.table_id in ({placeholders})"),
+                    tuple(table_ids))
+    else:
+        cur.execute(TABLE_STATE_SQL.format(where=""))
+
+    now = datetime.now()
+    result = []
+
+    for row in cur.fetchall():
+        active_start = row["active_session_start"]
+
+        table_state = "free"
+        latest_order = None
+        can_close = False
+        duration = None
+
+        if active_start:
+            minutes = int((now - active_start).total_seconds() // 60)
+            duration = f"{minutes} min"
+
+            if row["order_id"] is None:
+                table_state = "occupied_no_order_yet"
+            else:
+                latest_order = {
+                    "order_id": row["order_id"],
+                    "order_status": row["order_status"],
+                    "total": row["total"],
+                }
+                table_state = ORDER_STATE.get(row["order_status"], "free")
+
+            # can close session only if all orders paid
+            can_close = int(row["open_orders"]) == 0
+
+        result.append({
+            "table_id": int(row["table_id"]),
+            "capacity": row["capacity"],
+            "active_session_start": active_start,
+            "session_duration": duration,
+            "state": table_state,
+            "latest_order": latest_order,
+            "can_close": can_close,
+        })
+
+    return result
@@ -0,0 +1,31 @@
+import os
+import sys
+
+# the app modules live at the top level of the repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def mysql_pool():
+    """
+    A connection pool on a scratch database loaded from 1220071_1222640.sql,
+    named by DAWLO_TEST_DB (the checks that need a real server are skipped without it).
+    """
+    name = os.environ.get("DAWLO_TEST_DB")
+    if not name:
+        pytest.skip("set DAWLO_TEST_DB to a scratch database loaded from 1220071_1222640.sql")
+
+    import mysql.connector
+    import db
+
+    pool = db.ConnectionPool(dict(db.DB_CONFIG, database=name), pool_size=25, max_overflow=0)
+    try:
+        pool.acquire().close()
+    except mysql.connector.Error as e:
+        pytest.skip(f"test database not reachable: {e}")
+
+    previous, db._pool = db._pool, pool
+    yield pool
+    db._pool = previous
@@ -0,0 +1,94 @@
+# stand-ins for a mysql connection, for the checks that don't need a server
+
+
+class FakeCursor:
+    """
+    Answers every statement containing a registered fragment with its rows.
+      cur.on("from Recipe", [{"warehouse_item_id": 1, "needed": 2.0}], rowcount=1)
+    Statements are kept in cur.executed as (sql, params).
+    """
+
+    def __init__(self, connection=None):
+        self.connection = connection
+        self.executed = []
+        self._answers = []
+        self._rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+
+    def on(self, fragment, rows=(), rowcount=None):
+        self._answers.append((fragment, list(rows), rowcount))
+        return self
+
+    def execute(self, sql, params=None):
+        self.executed.append((" ".join(sql.split()), params))
+        self._rows = []
+        self.rowcount = 0
+        for fragment, rows, rowcount in reversed(self._answers):
+            if fragment in sql:
+                self._rows = [dict(r) for r in rows]
+                self.rowcount = len(rows) if rowcount is None else rowcount
+                break
+
+    def executemany(self, sql, seq_params):
+        for params in seq_params:
+            self.execute(sql, params)
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        pass
+
+    def statements(self, fragment):
+        return [sql for sql, _ in self.executed if fragment in sql]
+
+
+class FakeRawConnection:
+    """The raw mysql connection under db.PooledConnection; every cursor shares one FakeCursor."""
+
+    def __init__(self, cur=None):
+        self.cur = cur or FakeCursor()
+        self.in_transaction = False
+        self.log = []
+
+    def cursor(self, *args, **kwargs):
+        return self.cur
+
+    def start_transaction(self):
+        self.in_transaction = True
+        self.log.append("start")
+
+    def commit(self):
+        self.in_transaction = False
+        self.log.append("commit")
+
+    def rollback(self):
+        self.in_transaction = False
+        self.log.append("rollback")
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, raw=None):
+        self.raw = raw or FakeRawConnection()
+        self._prepared = {}
+
+    def acquire(self):
+        import db
+        return db.PooledConnection(self, self.raw, 0)
+
+    def prepared_cursors(self, raw):
+        return self._prepared.setdefault(id(raw), {})
+
+    def release(self, raw, created_at):
+        raw.rollback()
@@ -0,0 +1,158 @@
+from datetime import date, datetime
+
+import pytest
+
+import archive
+import db
+from fakes import FakeCursor, FakePool, FakeRawConnection
+
+JAN, FEB = date(2001, 1, 1), date(2001, 2, 1)
+
+
+def archive_in_transaction(cur):
+    conn = FakePool(FakeRawConnection(cur)).acquire()
+    moved = db.run_in_transaction(conn, archive.archive_month, JAN, FEB)
+    return moved, conn._raw.log
+
+
+def test_rows_are_copied_then_deleted_in_one_transaction():
+    cur = FakeCursor().on("delete", rowcount=2)
+    moved, log = archive_in_transaction(cur)
+    assert log == ["start", "commit"]
+
+    sqls = [sql for sql, _ in cur.executed]
+    assert all(params == (JAN, FEB) for _, params in cur.executed)
+    # every delete right after the copy of the same rows
+    for insert, delete in zip(sqls[::2], sqls[1::2]):
+        assert insert.startswith("insert into ") and delete.startswith("delete ")
+    copied = [sql.split()[2] for sql in sqls[::2]]
+    assert copied == ["Order_Item_Archive", "Emp_Order_Archive", "Payment_Archive",
+                      "Orders_Archive", "Payment_Archive", "Stock_Movement_Archive"]
+    # order and supplier payments both count
+    assert moved == {"Order_Item": 2, "Emp_Order": 2, "Payment": 4, "Orders": 2, "Stock_Movement": 2}
+
+
+def test_failure_keeps_everything_live():
+    class Failing(FakeCursor):
+        def execute(self, sql, params=None):
+            super().execute(sql, params)
+            if "delete from Stock_Movement" in sql:
+                raise db.mysql.connector.errors.DatabaseError("Lock wait timeout exceeded")
+
+    conn = FakePool(FakeRawConnection(Failing())).acquire()
+    with pytest.raises(db.mysql.connector.errors.DatabaseError):
+        db.run_in_transaction(conn, archive.archive_month, JAN, FEB)
+    # the rows already moved come back with the rollback
+    assert conn._raw.log[:2] == ["start", "rollback"] and "commit" not in conn._raw.log
+
+
+def test_archived_month_run_again_moves_nothing():
+    cur = FakeCursor().on("delete", rowcount=0)
+    moved, log = archive_in_transaction(cur)
+    assert log == ["start", "commit"]
+    assert set(moved.values()) == {0}
+
+
+def test_months_older_than_the_kept_ones():
+    cur = FakeCursor().on("as oldest", [{"oldest": datetime(2025, 10, 17, 9, 30)}])
+    months = archive.months_to_archive(cur, keep_months=12, today=date(2026, 12, 5))
+    assert months == [(date(2025, 10, 1), date(2025, 11, 1)),
+                      (date(2025, 11, 1), date(2025, 12, 1))]
+
+    # nothing older than the cutoff
+    assert archive.months_to_archive(cur, keep_months=15, today=date(2026, 12, 5)) == []
+
+
+def test_source_reads_live_and_archive():
+    assert archive.source("Orders") == "Orders"
+    assert archive.source("Orders", True) == \
+        "(select * from Orders union all select * from Orders_Archive)"
+
+
+def _totals(cur):
+    span = (JAN, FEB)
+    cur.execute(f"""
+        select count(*) as orders, ifnull(sum(o.total), 0) as revenue
+        from {archive.source('Orders', True)} o
+        where o.order_date >= %s and o.order_date < %s
+    """, span)
+    totals = dict(cur.fetchone())
+    cur.execute(f"""
+        select ifnull(sum(oi.subtotal), 0) as item_sales
+        from {archive.source('Order_Item', True)} oi
+        join {archive.source('Orders', True)} o on o.order_id = oi.order_id
+        where o.order_date >= %s and o.order_date < %s
+    """, span)
+    totals.update(cur.fetchone())
+    cur.execute(f"""
+        select ifnull(sum(amount), 0) as paid
+        from {archive.source('Payment', True)} p
+        where p.payment_date >= %s and p.payment_date < %s
+    """, span)
+    totals.update(cur.fetchone())
+    cur.execute(f"""
+        select ifnull(sum(quantity_change), 0) as stock_change
+        from {archive.source('Stock_Movement', True)} sm
+        where sm.movement_date >= %s and sm.movement_date < %s
+    """, span)
+    totals.update(cur.fetchone())
+    return totals
+
+
+def _live(cur, order_id):
+    cur.execute("select count(*) as n from Orders where order_id = %s", (order_id,))
+    return cur.fetchone()["n"]
+
+
+def test_totals_are_the_same_after_archiving(mysql_pool):
+    conn = mysql_pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("select min(customer_id) as customer_id from Customer")
+    customer_id = cur.fetchone()["customer_id"]
+    cur.execute("select min(emp_id) as emp_id from Employee")
+    emp_id = cur.fetchone()["emp_id"]
+    cur.execute("select min(item_id) as item_id from Menu_Item")
+    menu_item_id = cur.fetchone()["item_id"]
+    cur.execute("select min(item_id) as item_id from Warehouse_Item")
+    warehouse_item_id = cur.fetchone()["item_id"]
+
+    order_ids = []
+    for status in ("paid", "cancelled", "ordered"):
+        cur.execute("""
+            insert into Orders (customer_id, order_date, total, order_status, order_type)
+            values (%s, '2001-01-15 12:00', 9, %s, 'takeaway')
+        """, (customer_id, status))
+        order_id = cur.lastrowid
+        order_ids.append(order_id)
+        cur.execute("""
+            insert into Order_Item (order_id, menu_item_id, quantity, subtotal)
+            values (%s, %s, 3, 9)
+        """, (order_id, menu_item_id))
+        cur.execute("insert into Emp_Order (emp_id, order_id, role_in_order) values (%s, %s, 'waiter')",
+                    (emp_id, order_id))
+    cur.execute("""
+        insert into Payment (payment_date, amount, method, payment_type, order_id)
+        values ('2001-01-15 12:30', 9, 'cash', 'order', %s)
+    """, (order_ids[0],))
+    cur.execute("""
+        insert into Stock_Movement (movement_type, quantity_change, movement_date, warehouse_item_id, emp_id)
+        values ('order', -3, '2001-01-15 12:00', %s, %s)
+    """, (warehouse_item_id, emp_id))
+    conn.commit()
+
+    before = _totals(cur)
+    conn.commit()
+    moved = db.run_in_transaction(conn, archive.archive_month, JAN, FEB)
+    assert moved["Orders"] >= 2 and moved["Stock_Movement"] >= 1
+    assert _totals(cur) == before
+
+    # the open order stays live, the closed ones are gone from the live tables
+    assert [_live(cur, order_id) for order_id in order_ids] == [0, 0, 1]
+    conn.commit()
+
+    # the month again: nothing left to move, nothing changed
+    moved = db.run_in_transaction(conn, archive.archive_month, JAN, FEB)
+    assert moved == {"Order_Item": 0, "Emp_Order": 0, "Payment": 0, "Orders": 0, "Stock_Movement": 0}
+    assert _totals(cur) == before
+    cur.close()
+    conn.close()
@@ -0,0 +1,37 @@
+import db
+from catalog import MenuCatalog
+from fakes import FakeCursor, FakePool, FakeRawConnection
+
+
+def test_local_copy_is_dropped_only_after_the_commit():
+    cur = FakeCursor().on("from Catalog_Version", [{"version": 1}])
+    conn = FakePool(FakeRawConnection(cur)).acquire()
+    menu = MenuCatalog()
+    menu.get(conn.cursor())
+    seen = []
+
+    def work(c):
+        menu.invalidate(c)
+        seen.append(menu.stats()["version"])
+
+    db.run_in_transaction(conn, work)
+
+    assert seen == [1]
+    assert menu.stats()["version"] is None
+
+
+def test_rolled_back_change_keeps_the_local_copy():
+    cur = FakeCursor().on("from Catalog_Version", [{"version": 1}])
+    conn = FakePool(FakeRawConnection(cur)).acquire()
+    menu = MenuCatalog()
+    menu.get(conn.cursor())
+
+    def work(c):
+        menu.invalidate(c)
+        raise ValueError
+
+    try:
+        db.run_in_transaction(conn, work)
+    except ValueError:
+        pass
+    assert menu.stats()["version"] == 1
@@ -0,0 +1,155 @@
+# concurrent order traffic against a real MySQL server (DAWLO_TEST_DB, see conftest.py)
+import importlib
+import threading
+import uuid
+
+import db
+from stock import InsufficientStock
+
+app_module = importlib.import_module("1220071_1222640")
+
+THREADS = 20
+ADDS_PER_THREAD = 100
+STOCK = 500
+
+
+def _setup(pool, stock=STOCK, orders=THREADS):
+    tag = uuid.uuid4().hex[:10]
+    conn = pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        insert into Warehouse_Item (item_name, stock_quantity, reorder_level, unit_of_measure)
+        values (%s, %s, 0, 'g')
+    """, (f"beans {tag}", stock))
+    warehouse_item_id = cur.lastrowid
+    cur.execute("""
+        insert into Menu_Item (item_name, category, price, date_added)
+        values (%s, 'drink', 3, curdate())
+    """, (f"latte {tag}",))
+    menu_item_id = cur.lastrowid
+    cur.execute("""
+        insert into Recipe (menu_item_id, warehouse_item_id, quantity_required)
+        values (%s, %s, 1)
+    """, (menu_item_id, warehouse_item_id))
+    cur.execute("""
+        insert into Customer (customer_name, phone_number, email)
+        values ('stress', %s, %s)
+    """, (tag, f"{tag}@test"))
+    customer_id = cur.lastrowid
+
+    order_ids = []
+    for _ in range(orders):
+        cur.execute("""
+            insert into Orders (customer_id, order_date, total, order_status, order_type)
+            values (%s, now(), 0, 'pending', 'takeaway')
+        """, (customer_id,))
+        order_ids.append(cur.lastrowid)
+    conn.commit()
+    cur.close()
+    conn.close()
+    return warehouse_item_id, menu_item_id, customer_id, order_ids
+
+
+def _scalar(pool, sql, params):
+    conn = pool.acquire()
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    value = cur.fetchone()[0]
+    cur.close()
+    conn.close()
+    return value
+
+
+def _run_threads(target, count):
+    errors = []
+
+    def guarded(i):
+        try:
+            target(i)
+        except Exception as e:  # reported after the join
+            errors.append(e)
+
+    threads = [threading.Thread(target=guarded, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors
+
+
+def test_concurrent_adds_never_drive_stock_negative(mysql_pool):
+    warehouse_item_id, menu_item_id, _, order_ids = _setup(mysql_pool)
+    added = []
+    lock = threading.Lock()
+
+    def waiter(i):
+        conn = mysql_pool.acquire()
+        try:
+            for _ in range(ADDS_PER_THREAD):
+                try:
+                    db.run_in_transaction(conn, app_module.add_order_items, order_ids[i],
+                                          [(menu_item_id, 1)], 1)
+                except InsufficientStock:
+                    continue
+                with lock:
+                    added.append(1)
+        finally:
+            conn.close()
+
+    _run_threads(waiter, THREADS)
+
+    stock = _scalar(mysql_pool, "select stock_quantity from Warehouse_Item where item_id = %s",
+                    (warehouse_item_id,))
+    moved = _scalar(mysql_pool, "select ifnull(sum(quantity_change), 0) from Stock_Movement "
+                                "where warehouse_item_id = %s", (warehouse_item_id,))
+    sold = _scalar(mysql_pool, "select ifnull(sum(quantity), 0) from Order_Item where menu_item_id = %s",
+                   (menu_item_id,))
+
+    assert stock >= 0
+    assert len(added) == STOCK          # more attempts than stock: everything is sold, nothing more
+    assert stock == STOCK - len(added)
+    assert moved == -len(added)
+    assert sold == len(added)
+
+
+def test_concurrent_cancels_restore_stock_once(mysql_pool):
+    warehouse_item_id, menu_item_id, _, order_ids = _setup(mysql_pool, stock=10, orders=1)
+    conn = mysql_pool.acquire()
+    db.run_in_transaction(conn, app_module.add_order_items, order_ids[0], [(menu_item_id, 5)], 1)
+    conn.close()
+
+    def cancel(i):
+        conn = mysql_pool.acquire()
+        try:
+            db.run_in_transaction(conn, app_module.cancel_order_item, order_ids[0], menu_item_id, 1)
+        finally:
+            conn.close()
+
+    _run_threads(cancel, 8)
+
+    assert _scalar(mysql_pool, "select stock_quantity from Warehouse_Item where item_id = %s",
+                   (warehouse_item_id,)) == 10
+
+
+def test_concurrent_seating_opens_one_session(mysql_pool):
+    _, _, customer_id, _ = _setup(mysql_pool, orders=0)
+    conn = mysql_pool.acquire()
+    cur = conn.cursor()
+    cur.execute("insert into Table_Entity (capacity) values (20)")
+    table_id = cur.lastrowid
+    conn.commit()
+    conn.close()
+
+    def seat(i):
+        conn = mysql_pool.acquire()
+        try:
+            db.run_in_transaction(conn, app_module.seat_dine_in_order, table_id, customer_id, 1)
+        finally:
+            conn.close()
+
+    _run_threads(seat, 10)
+
+    assert _scalar(mysql_pool, "select count(*) from Table_Session where table_id = %s and is_closed = 0",
+                   (table_id,)) == 1
+    assert _scalar(mysql_pool, "select party_size from Table_Session where table_id = %s",
+                   (table_id,)) == 10
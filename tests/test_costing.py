@@ -0,0 +1,149 @@
+import pytest
+
+import costing
+from costing import CostingEngine
+from fakes import FakeCursor
+
+
+def costing_cursor():
+    cur = FakeCursor()
+    cur.on("from Menu_Item", [
+        {"item_id": 10, "item_name": "latte", "price": 10.0},
+        {"item_id": 11, "item_name": "saffron cake", "price": 8.0},
+        {"item_id": 12, "item_name": "espresso", "price": 1.0},
+    ])
+    cur.on("from Recipe", [
+        {"menu_item_id": 10, "warehouse_item_id": 1, "quantity_required": 2.0},
+        {"menu_item_id": 10, "warehouse_item_id": 2, "quantity_required": 4.0},
+        {"menu_item_id": 11, "warehouse_item_id": 3, "quantity_required": 1.0},
+        {"menu_item_id": 12, "warehouse_item_id": 1, "quantity_required": 1.0},
+    ])
+    # cheapest supplier price; item 3 has no active supplier
+    cur.on("from Supplier_Item", [{"warehouse_item_id": 1, "price": 2.0},
+                                  {"warehouse_item_id": 2, "price": 0.5}])
+    # paid on deliveries; item 2 was never delivered
+    cur.on("from Purchase_Item pi", [{"warehouse_item_id": 1, "price": 3.0}])
+    return cur
+
+
+def by_item(rows):
+    return {r["item_id"]: r for r in rows}
+
+
+def test_price_vectors():
+    engine = CostingEngine().get(costing_cursor())
+    assert engine.prices["cheapest"] == {1: 2.0, 2: 0.5}
+    # never delivered -> falls back to the cheapest supplier price
+    assert engine.prices["weighted_average"] == {1: 3.0, 2: 0.5}
+
+
+def test_margins_per_policy():
+    cur = costing_cursor()
+    engine = CostingEngine()
+
+    cheapest = by_item(engine.margins(cur))
+    # 2 x 2.0 + 4 x 0.5 = 6.0 against a price of 10
+    assert cheapest[10]["ingredient_cost"] == 6.0
+    assert cheapest[10]["margin"] == 4.0 and cheapest[10]["margin_pct"] == 40.0
+    # an ingredient without any price -> the item's cost is unknown, it is left out
+    assert 11 not in cheapest
+
+    average = by_item(engine.margins(cur, "weighted_average"))
+    # 2 x 3.0 + 4 x 0.5 = 8.0
+    assert average[10]["margin"] == 2.0 and average[10]["margin_pct"] == 20.0
+
+    # lowest margin first
+    assert [r["item_id"] for r in engine.margins(cur)] == [12, 10]
+
+
+def test_loss_items():
+    engine = CostingEngine()
+    (loss,) = engine.loss_items(costing_cursor())
+    assert loss["item_id"] == 12 and loss["loss_amount"] == 1.0
+
+    (loss,) = engine.loss_items(costing_cursor(), "weighted_average")
+    assert loss["loss_amount"] == 2.0
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        CostingEngine().margins(costing_cursor(), "latest")
+
+
+def test_recipe_changed_recomputes_that_item():
+    cur = costing_cursor()
+    engine = CostingEngine()
+    engine.get(cur)
+
+    cur.on("from Recipe", [{"menu_item_id": 10, "warehouse_item_id": 1, "quantity_required": 1.0}])
+    engine.recipe_changed(cur, [10])
+
+    assert engine.costs["cheapest"][10] == 2.0
+    assert engine.costs["cheapest"][12] == 2.0
+    # item 10 no longer uses ingredient 2
+    assert 10 not in engine.used_in[2] and 10 in engine.used_in[1]
+
+
+def test_prices_changed_recomputes_the_items_using_the_ingredient():
+    cur = costing_cursor()
+    engine = CostingEngine()
+    engine.get(cur)
+
+    cur.on("from Supplier_Item", [{"warehouse_item_id": 2, "price": 1.0}])
+    engine.prices_changed(cur, [2])
+
+    # 2 x 2.0 + 4 x 1.0
+    assert engine.costs["cheapest"][10] == 8.0
+    assert engine.costs["weighted_average"][10] == 10.0
+    assert engine.costs["cheapest"][12] == 2.0
+
+
+def test_supplier_gone_makes_the_cost_unknown():
+    cur = costing_cursor()
+    engine = CostingEngine()
+    engine.get(cur)
+
+    cur.on("from Supplier_Item", [])
+    cur.on("from Purchase_Item pi", [])
+    engine.prices_changed(cur, [2])
+    assert engine.costs["cheapest"][10] is None
+    assert 10 not in by_item(engine.margins(cur))
+
+
+def test_purchase_delivered_moves_the_average():
+    cur = costing_cursor()
+    engine = CostingEngine()
+    engine.get(cur)
+
+    cur.on("from Purchase_Item where purchase_id", [{"warehouse_item_id": 1}])
+    cur.on("from Purchase_Item pi", [{"warehouse_item_id": 1, "price": 4.0}])
+    engine.purchase_delivered(cur, 77)
+
+    assert engine.prices["weighted_average"][1] == 4.0
+    assert engine.costs["weighted_average"][10] == 10.0   # 2 x 4.0 + 4 x 0.5
+    assert engine.costs["cheapest"][10] == 6.0
+
+
+def test_updates_before_the_first_load_are_ignored():
+    cur = FakeCursor()
+    engine = CostingEngine()
+    engine.recipe_changed(cur, [10])
+    engine.prices_changed(cur, [1])
+    assert cur.executed == []
+
+
+def test_reloaded_after_max_age(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(costing.time, "monotonic", lambda: now[0])
+    cur = costing_cursor()
+    engine = CostingEngine(max_age=300)
+
+    engine.get(cur)
+    engine.get(cur)
+    assert len(cur.statements("from Menu_Item")) == 1
+
+    now[0] += 301
+    cur.on("from Menu_Item", [{"item_id": 10, "item_name": "latte", "price": 12.0}])
+    engine.get(cur)
+    assert len(cur.statements("from Menu_Item")) == 2
+    assert by_item(engine.margins(cur))[10]["margin"] == 6.0
@@ -0,0 +1,207 @@
+import threading
+
+import pytest
+
+import dashboard_data
+import db
+from dashboard_data import DashboardCache, load_dashboard
+from fakes import FakeCursor, FakePool, FakeRawConnection
+
+release = threading.Event()
+
+
+def ok_panel(cur, month_start):
+    cur.execute("select 1 from Daily_Sales")
+    return {"ok": month_start}
+
+
+def failing_panel(cur, month_start):
+    raise db.mysql.connector.errors.DatabaseError("Query execution was interrupted")
+
+
+def slow_panel(cur, month_start):
+    release.wait(10)
+    return {"slow": 1}
+
+
+class Log:
+    def __init__(self):
+        self.messages = []
+
+    def warning(self, message, *args):
+        self.messages.append(message % args)
+
+
+@pytest.fixture
+def panels(monkeypatch):
+    raw = FakeRawConnection()
+    monkeypatch.setattr(db, "_pool", FakePool(raw))
+    monkeypatch.setattr(dashboard_data, "dashboard_cache", DashboardCache())
+    monkeypatch.setattr(dashboard_data, "PANELS", {
+        "ok": (ok_panel, {"ok": None}, False),
+        "failing": (failing_panel, {"failing": []}, False),
+        "slow": (slow_panel, {"slow": 0}, False),
+    })
+    release.clear()
+    yield raw.cur
+    release.set()
+
+
+def test_panels_run_with_a_server_side_timeout(panels):
+    month = dashboard_data.current_month_start()
+    data, failed = load_dashboard(FakeCursor(), month, ["ok"], timeout=2)
+    assert data == {"ok": month} and failed == []
+    assert panels.executed[0] == ("set session max_execution_time = %s", (2000,))
+    assert panels.executed[-1] == ("set session max_execution_time = default", None)
+
+
+def test_failing_panel_leaves_the_rest_of_the_page(panels):
+    log = Log()
+    data, failed = load_dashboard(FakeCursor(), dashboard_data.current_month_start(),
+                                  ["ok", "failing"], logger=log)
+    assert failed == ["failing"]
+    assert data["failing"] == [] and data["ok"] is not None
+    assert log.messages == ["dashboard panel failing failed: Query execution was interrupted"]
+    # the connection went back to the pool after the set / reset of max_execution_time
+    assert panels.statements("max_execution_time = default")
+
+
+def test_slow_panel_times_out(panels):
+    log = Log()
+    data, failed = load_dashboard(FakeCursor(), dashboard_data.current_month_start(),
+                                  ["slow", "ok"], timeout=0.1, logger=log)
+    assert failed == ["slow"]
+    assert data["slow"] == 0 and data["ok"] is not None
+    assert log.messages == ["dashboard panel slow failed: timed out"]
+    # a timed out panel is not cached, the next view runs it again
+    release.set()
+    data, failed = load_dashboard(FakeCursor(), dashboard_data.current_month_start(), ["slow"])
+    assert data == {"slow": 1} and failed == []
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_entries_expire_after_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(dashboard_data.time, "monotonic", clock)
+    cache = DashboardCache(ttl=30)
+    cache.put(("totals", None), {"total_orders": 3})
+
+    clock.now += 29
+    assert cache.get(("totals", None)) == {"total_orders": 3}
+    clock.now += 2
+    assert cache.get(("totals", None)) is None
+    assert cache.computed_at(("totals", None)) is None
+    assert cache.stats() == {"entries": 0, "hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+
+def test_closed_month_kept_until_its_version_changes(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(dashboard_data.time, "monotonic", clock)
+    cache = DashboardCache(ttl=30)
+    cache.put(("daily", "2026-01-01"), {"daily_totals": [1.0]}, version=4)
+
+    clock.now += 10 ** 6   # no TTL for a closed month
+    assert cache.get(("daily", "2026-01-01"), 4) == {"daily_totals": [1.0]}
+    assert cache.get(("daily", "2026-01-01"), 5) is None
+    # dropped: asking with the old version again does not bring it back
+    assert cache.get(("daily", "2026-01-01"), 4) is None
+
+
+def versions_cursor(version):
+    return FakeCursor().on("from Sales_Period_Version", [{"period": "2026-01-01", "version": version}])
+
+
+def test_version_bump_reruns_the_month_panels(panels, monkeypatch):
+    calls = []
+
+    def month_panel(cur, month_start):
+        calls.append(month_start)
+        return {"daily": len(calls)}
+
+    monkeypatch.setitem(dashboard_data.PANELS, "daily", (month_panel, {"daily": 0}, True))
+    monkeypatch.setattr(dashboard_data, "current_month_start", lambda: "2026-10-01")
+
+    assert load_dashboard(versions_cursor(1), "2026-01-01", ["daily", "ok"])[0]["daily"] == 1
+    assert load_dashboard(versions_cursor(1), "2026-01-01", ["daily", "ok"])[0]["daily"] == 1
+    # a payment or rollup rebuild in January bumped its Sales_Period_Version
+    assert load_dashboard(versions_cursor(2), "2026-01-01", ["daily", "ok"])[0]["daily"] == 2
+    assert calls == ["2026-01-01", "2026-01-01"]
+
+
+def test_warm_up_fills_the_closed_months(panels, monkeypatch):
+    calls = []
+
+    def month_panel(cur, month_start):
+        calls.append(month_start)
+        return {"daily": month_start}
+
+    monkeypatch.setitem(dashboard_data.PANELS, "daily", (month_panel, {"daily": None}, True))
+    months = dashboard_data.previous_months(3)
+    panels.on("from Sales_Period_Version", [{"period": m, "version": 7} for m in months])
+
+    dashboard_data.warm_up(3)
+    # only the per-month panels, once per month
+    assert calls == months
+    cache = dashboard_data.dashboard_cache
+    assert all(cache.get(("daily", m), 7) == {"daily": m} for m in months)
+
+    dashboard_data.warm_up(3)
+    assert calls == months   # already warm
+
+
+def test_warm_up_without_a_database_is_skipped(monkeypatch):
+    class Down:
+        def acquire(self):
+            raise db.mysql.connector.errors.PoolError("no connection")
+
+    monkeypatch.setattr(db, "_pool", Down())
+    log = Log()
+    dashboard_data.warm_up(2, log)
+    assert log.messages == ["dashboard warm-up skipped: no connection"]
+
+
+@pytest.fixture
+def client(panels, monkeypatch):
+    import importlib
+    app = importlib.import_module("1220071_1222640").app
+    monkeypatch.setitem(app.config, "DASHBOARD_WARM_UP_MONTHS", 0)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["emp_id"] = 1
+        session["position_title"] = "manager"
+    return client
+
+
+def test_panel_answers_304_until_the_data_changes(client, monkeypatch):
+    value = {"ok": 1}
+    monkeypatch.setitem(dashboard_data.PANELS, "ok", (lambda cur, month: dict(value), {"ok": None}, False))
+
+    first = client.get("/dashboard/panel/ok")
+    assert first.status_code == 200 and first.json == {"ok": 1}
+    assert first.headers["ETag"] and first.headers["Last-Modified"]
+
+    same = client.get("/dashboard/panel/ok", headers={"If-None-Match": first.headers["ETag"]})
+    assert same.status_code == 304 and same.data == b""
+    since = client.get("/dashboard/panel/ok", headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert since.status_code == 304
+
+    # new data once the cached panel is gone (TTL or a new period version)
+    value["ok"] = 2
+    dashboard_data.dashboard_cache.clear()
+    changed = client.get("/dashboard/panel/ok", headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200 and changed.json == {"ok": 2}
+    assert changed.headers["ETag"] != first.headers["ETag"]
+
+
+def test_panel_that_failed_is_not_cached_by_the_browser(client):
+    response = client.get("/dashboard/panel/failing")
+    assert response.status_code == 503
+    assert response.json["failed_panels"] == ["failing"]
+    assert "ETag" not in response.headers
@@ -0,0 +1,135 @@
+import csv
+import importlib
+import io
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from mysql.connector import FieldType
+from werkzeug.datastructures import MultiDict
+
+import db
+import export
+from fakes import FakeCursor, FakePool, FakeRawConnection
+
+app_module = importlib.import_module("1220071_1222640")
+app = app_module.app
+
+COLUMNS = ("order_id", "order_date", "total")
+ROWS = [
+    (1, datetime(2026, 3, 1, 12, 0), Decimal("9.50")),
+    (2, datetime(2026, 3, 2, 13, 30), Decimal("4.00")),
+    (3, datetime(2026, 3, 3, 9, 15), Decimal("12.25")),
+]
+
+
+class ExportCursor(FakeCursor):
+    """An unbuffered cursor: rows come out fetchmany() at a time."""
+
+    column_names = COLUMNS
+    description = [(name, t) for name, t in zip(COLUMNS, (FieldType.LONG, FieldType.DATETIME,
+                                                          FieldType.NEWDECIMAL))]
+
+    def __init__(self, rows):
+        super().__init__()
+        self.pending = list(rows)
+        self.fetches = 0
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        rows, self.pending = self.pending[:size], self.pending[size:]
+        return rows
+
+
+@pytest.fixture
+def export_cursor(monkeypatch):
+    cur = ExportCursor(ROWS)
+    pool = FakePool(FakeRawConnection(cur))
+    monkeypatch.setattr(db, "_pool", pool)
+    monkeypatch.setattr(export, "BATCH_ROWS", 2)
+    return cur
+
+
+def test_date_range_includes_both_days():
+    where, params = export.date_range_args(MultiDict({"from": "2026-03-01", "to": "2026-03-02"}), "o.order_date")
+    assert where == "o.order_date >= %s and o.order_date < %s"
+    assert params == [datetime(2026, 3, 1), datetime(2026, 3, 3)]
+
+
+def test_date_range_either_end_may_be_missing():
+    assert export.date_range_args(MultiDict(), "order_date") == ("", [])
+    assert export.date_range_args(MultiDict({"from": "", "to": ""}), "order_date") == ("", [])
+    assert export.date_range_args(MultiDict({"to": "2026-12-31"}), "order_date") == \
+        ("order_date < %s", [datetime(2027, 1, 1)])
+
+
+@pytest.mark.parametrize("bad", ["2026-13-01", "01/03/2026", "2026-03", "yesterday"])
+def test_bad_date(bad):
+    with pytest.raises(ValueError):
+        export.date_range_args(MultiDict({"from": bad}), "order_date")
+
+
+def test_csv_header_and_rows_in_batches(export_cursor):
+    chunks = list(export.stream_csv("select order_id, order_date, total from Orders where x = %s", [5]))
+    assert export_cursor.executed == [("select order_id, order_date, total from Orders where x = %s", [5])]
+    # one chunk per fetched batch, the header goes with the first
+    assert len(chunks) == 2 and export_cursor.fetches == 3
+
+    rows = list(csv.reader(io.StringIO("".join(chunks))))
+    assert rows == [
+        ["order_id", "order_date", "total"],
+        ["1", "2026-03-01 12:00:00", "9.50"],
+        ["2", "2026-03-02 13:30:00", "4.00"],
+        ["3", "2026-03-03 09:15:00", "12.25"],
+    ]
+
+
+def test_csv_of_an_empty_range_is_the_header(export_cursor):
+    export_cursor.pending = []
+    assert "".join(export.stream_csv("select 1")) == "order_id,order_date,total\r\n"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(app.config, "DASHBOARD_WARM_UP_MONTHS", 0)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["emp_id"] = 1
+        session["position_title"] = "manager"
+    return client
+
+
+def test_export_route_filters_by_the_range(client, export_cursor):
+    response = client.get("/orders/export?from=2026-03-01&to=2026-03-03")
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="orders.csv"'
+    assert response.data.decode().splitlines()[0] == "order_id,order_date,total"
+
+    ((sql, params),) = [(sql, p) for sql, p in export_cursor.executed if "from Orders" in sql]
+    assert "where (order_date >= %s and order_date < %s) order by order_id" in sql
+    assert params == [datetime(2026, 3, 1), datetime(2026, 3, 4)]
+
+
+def test_export_route_bad_input(client, export_cursor):
+    assert client.get("/orders/export?from=2026-02-30").status_code == 400
+    assert client.get("/orders/export?format=xlsx").status_code == 400
+    assert export_cursor.executed == []
+
+
+@pytest.mark.parametrize("fmt", export.COLUMNAR_FORMATS)
+def test_columnar_export_without_pyarrow(client, export_cursor, monkeypatch, fmt):
+    monkeypatch.setattr(export, "pa", None)
+    response = client.get(f"/orders/export?format={fmt}")
+    assert response.status_code == 501
+    assert response.data.decode() == f"{fmt} export needs pyarrow, which is not installed"
+    assert export_cursor.executed == []
+
+
+def test_parquet_export(export_cursor):
+    pq = pytest.importorskip("pyarrow.parquet")
+    data = b"".join(export.stream("parquet", "select 1"))
+    table = pq.read_table(io.BytesIO(data))
+    assert table.column_names == list(COLUMNS)
+    assert table.column("total").to_pylist() == [9.5, 4.0, 12.25]
+    assert pq.ParquetFile(io.BytesIO(data)).num_row_groups == 2
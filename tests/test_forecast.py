@@ -0,0 +1,123 @@
+import math
+import uuid
+from datetime import date, timedelta
+
+import db
+import forecast
+from fakes import FakeCursor
+
+MONDAY = date(2026, 10, 19)
+
+
+def forecast_cursor(items, used):
+    cur = FakeCursor()
+    cur.on("from Stock_Movement", [{"warehouse_item_id": item_id, "day": day, "used": amount}
+                                   for (item_id, day), amount in used.items()])
+    cur.on("from Warehouse_Item w", items)
+    return cur
+
+
+def run(items, used):
+    results = forecast.forecast(forecast_cursor(items, used), today=MONDAY, window_days=14)
+    return {r["warehouse_item_id"]: r for r in results}
+
+
+def item(item_id, stock, lead_days):
+    return {"item_id": item_id, "stock_quantity": stock, "lead_days": lead_days}
+
+
+# the two Mondays of the 14 day window
+MONDAYS = (MONDAY - timedelta(days=14), MONDAY - timedelta(days=7))
+
+
+def test_net_consumption_query_subtracts_cancellations():
+    cur = forecast_cursor([], {})
+    forecast.forecast(cur, today=MONDAY, window_days=14)
+    ((sql, params),) = [(sql, p) for sql, p in cur.executed if "from Stock_Movement" in sql]
+    # order movements are negative, cancellations put stock back (positive): -sum = net use
+    assert "-sum(quantity_change) as used" in sql
+    assert {"order", "cancel_item", "cancel_order"} <= set(params)
+    assert params[-2:] == [MONDAY - timedelta(days=14), MONDAY]
+
+
+def test_rates_per_weekday():
+    result = run([item(1, 10, 3)], {(1, MONDAYS[0]): 7.0, (1, MONDAYS[1]): 5.0})[1]
+    assert result["weekday_rates"] == [6.0, 0, 0, 0, 0, 0, 0]
+    assert result["daily_rate"] == round(12 / 14, 4)
+
+
+def test_more_put_back_than_used_is_no_consumption():
+    result = run([item(1, 10, 3)], {(1, MONDAYS[0]): -4.0, (1, MONDAYS[1]): 0.0})[1]
+    assert result["weekday_rates"][0] == 0.0
+    assert result["days_until_stockout"] is None
+
+
+def test_days_until_stockout():
+    used = {(1, MONDAYS[0]): 7.0, (1, MONDAYS[1]): 5.0, (2, MONDAYS[0]): 6.0, (2, MONDAYS[1]): 6.0}
+    results = run([item(1, 10, 3), item(2, 0, 3), item(3, 50, 3)], used)
+
+    # today (Monday) takes 6, the next Monday runs out 4/6 of the way through
+    assert results[1]["days_until_stockout"] == 7.7
+    # nothing in stock -> out today
+    assert results[2]["days_until_stockout"] == 0.0
+    # never used -> no stockout
+    assert results[3]["days_until_stockout"] is None
+
+
+def test_reorder_point():
+    results = run([item(1, 10, 3), item(2, 10, None)], {(1, MONDAYS[0]): 7.0, (1, MONDAYS[1]): 5.0})
+
+    # 3 days of lead time from Monday = one Monday at 6,
+    # safety = 1.65 x std of the 14 daily amounts x sqrt(3)
+    std = math.sqrt((7 ** 2 + 5 ** 2) / 14 - (12 / 14) ** 2)
+    assert results[1]["reorder_point"] == round(6 + 1.65 * std * math.sqrt(3), 2) == 12.1
+    assert results[1]["lead_time_days"] == 3
+
+    # nobody supplies it at the moment -> the default lead time
+    assert results[2]["lead_time_days"] == forecast.DEFAULT_LEAD_DAYS
+    assert results[2]["reorder_point"] == 0
+
+
+def test_store_forecast_is_one_upsert():
+    cur = FakeCursor()
+    forecast.store_forecast(cur, [])
+    assert cur.executed == []
+
+    results = list(run([item(1, 10, 3), item(2, 0, None)], {(1, MONDAYS[0]): 7.0}).values())
+    forecast.store_forecast(cur, results)
+    ((sql, params),) = cur.executed
+    assert sql.startswith("insert into Stock_Forecast") and "on duplicate key update" in sql
+    assert sql.count("%s") == len(params) == 10
+
+
+def test_forecast_stored_from_movements(mysql_pool):
+    conn = mysql_pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        insert into Warehouse_Item (item_name, stock_quantity, reorder_level, unit_of_measure)
+        values (%s, 100, 0, 'ml')
+    """, (f"milk {uuid.uuid4().hex[:10]}",))
+    item_id = cur.lastrowid
+    cur.execute("select min(emp_id) as emp_id from Employee")
+    emp_id = cur.fetchone()["emp_id"]
+    yesterday = date.today() - timedelta(days=1)
+    for movement_type, change in (("order", -10), ("cancel_item", 4), ("delivery", 50)):
+        cur.execute("""
+            insert into Stock_Movement (movement_type, quantity_change, movement_date, warehouse_item_id, emp_id)
+            values (%s, %s, %s, %s, %s)
+        """, (movement_type, change, yesterday, item_id, emp_id))
+    conn.commit()
+
+    def run_forecast(c):
+        forecast.store_forecast(c, forecast.forecast(c))
+
+    db.run_in_transaction(conn, run_forecast)
+    db.run_in_transaction(conn, run_forecast)   # the second run updates the same row
+
+    cur.execute("select count(*) as n, max(daily_rate) as rate from Stock_Forecast where warehouse_item_id = %s",
+                (item_id,))
+    row = cur.fetchone()
+    # 10 used, 4 of it put back; the delivery is not consumption
+    assert row["n"] == 1 and abs(row["rate"] - 6 / forecast.WINDOW_DAYS) < 1e-4
+    cur.close()
+    conn.close()
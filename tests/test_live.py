@@ -0,0 +1,37 @@
+import threading
+
+from live import TableEventBroker
+
+
+def test_client_too_far_behind_gets_a_resync():
+    broker = TableEventBroker(queue_size=2)
+    q = broker.subscribe()
+    for message in ("a", "b", "c"):
+        broker.broadcast(message)
+
+    assert not broker.has_subscribers()
+    assert None in [q.get_nowait(), q.get_nowait()]
+
+
+def test_concurrent_broadcasts_to_a_full_queue():
+    broker = TableEventBroker(queue_size=1)
+    queues = [broker.subscribe() for _ in range(5)]
+    errors = []
+
+    def send():
+        try:
+            for i in range(200):
+                broker.broadcast(str(i))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=send) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert not broker.has_subscribers()
+    for q in queues:
+        assert q.get_nowait() is None
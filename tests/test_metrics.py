@@ -0,0 +1,84 @@
+import importlib
+
+import pytest
+
+import metrics
+
+app_module = importlib.import_module("1220071_1222640")
+app = app_module.app
+
+
+def test_fingerprint_replaces_values():
+    a = metrics.fingerprint("SELECT * FROM Orders  WHERE order_id = 17 AND status = 'open'")
+    b = metrics.fingerprint("select * from Orders where order_id = 9 and status = \"paid\"")
+    assert a == b == "select * from orders where order_id = ? and status = ?"
+
+
+def test_fingerprint_placeholders_and_in_lists():
+    assert metrics.fingerprint(b"select x from T where id in (%s, %s, %s) and y = %(y)s") == \
+        "select x from t where id in (...) and y = ?"
+    # literal lists of any length have the same shape
+    assert metrics.fingerprint("select 1 from T where id in (1, 2)") == \
+        metrics.fingerprint("select 1 from T where id in (3,4,5,6)")
+    # digits inside names are kept, escaped quotes stay inside their string
+    assert metrics.fingerprint("select col2 from T2 where a = 'it\\'s'") == "select col2 from t2 where a = ?"
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("t_seconds", "Test.", (0.1, 1, 10))
+    for value in (0.05, 0.1, 0.5, 5, 50):
+        histogram.observe(("home", ""), value)
+
+    lines = histogram.render(("endpoint", "action"))
+    assert lines[:2] == ["# HELP t_seconds Test.", "# TYPE t_seconds histogram"]
+    assert lines[2:] == [
+        't_seconds_bucket{endpoint="home",action="",le="0.1"} 2',   # the bound itself is included
+        't_seconds_bucket{endpoint="home",action="",le="1"} 3',
+        't_seconds_bucket{endpoint="home",action="",le="10"} 4',
+        't_seconds_bucket{endpoint="home",action="",le="+Inf"} 5',
+        't_seconds_count{endpoint="home",action=""} 5',
+        't_seconds_sum{endpoint="home",action=""} 55.65',
+    ]
+
+
+def test_histogram_series_per_label_and_escaped():
+    histogram = metrics.Histogram("t_queries", "Test.", (1, 5))
+    histogram.observe(("order_page", "add"), 3)
+    histogram.observe(("order_page", 'p"ay'), 1)
+
+    lines = histogram.render(("endpoint", "action"))
+    assert 't_queries_bucket{endpoint="order_page",action="add",le="1"} 0' in lines
+    assert 't_queries_bucket{endpoint="order_page",action="add",le="5"} 1' in lines
+    assert 't_queries_bucket{endpoint="order_page",action="p\\"ay",le="1"} 1' in lines
+
+
+@pytest.fixture(autouse=True)
+def no_warm_up(monkeypatch):
+    monkeypatch.setitem(app.config, "DASHBOARD_WARM_UP_MONTHS", 0)
+
+
+def scrape(remote_addr="127.0.0.1", headers=None):
+    return app.test_client().get("/metrics", headers=headers or {},
+                                 environ_base={"REMOTE_ADDR": remote_addr})
+
+
+def test_metrics_served_to_this_host_only_by_default():
+    assert scrape().status_code == 200
+    assert scrape("::1").status_code == 200
+    assert scrape("10.0.0.5").status_code == 403
+
+
+def test_metrics_allowlist(monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_ALLOW", ("10.0.0.0/24",))
+    response = scrape("10.0.0.5")
+    assert response.status_code == 200 and b"dawlo_request_seconds" in response.data
+    assert scrape("10.0.1.5").status_code == 403
+    assert scrape("127.0.0.1").status_code == 403
+
+
+def test_metrics_token(monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "s3cret")
+    assert scrape("10.0.0.5", {"Authorization": "Bearer s3cret"}).status_code == 200
+    assert scrape("10.0.0.5", {"Authorization": "Bearer wrong"}).status_code == 403
+    assert scrape("10.0.0.5", {"Authorization": "s3cret"}).status_code == 403
+    assert scrape("10.0.0.5").status_code == 403
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+import db
+import movement_log
+from fakes import FakeCursor, FakePool, FakeRawConnection
+
+MOVEMENT = {"movement_type": "order", "quantity_change": -2.0, "warehouse_item_id": 1, "emp_id": 3}
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    journal = movement_log.MovementJournal(str(tmp_path / "movements.journal"), fsync=False)
+    journal.open()
+    monkeypatch.setattr(movement_log, "journal", journal)
+    return journal
+
+
+def entries(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def record_movement(conn):
+    movement_log.insert_movements(conn.cursor(), "select ...")
+
+
+def movement_pool(cur):
+    return FakePool(FakeRawConnection(cur.on("select ...", [MOVEMENT])))
+
+
+def test_entry_is_durable_before_the_commit(journal):
+    conn = movement_pool(FakeCursor()).acquire()
+    seen = []
+
+    def work(cur):
+        record_movement(conn)
+        seen.append(entries(journal.path))
+
+    db.run_in_transaction(conn, work)
+
+    (written,) = seen[0]
+    assert written["rows"][0][1:3] == ["order", -2.0]
+    assert conn._raw.cur.statements("insert into Movement_Journal_Txn")
+    assert journal.stats()["pending"] == 1
+
+
+def test_rolled_back_entry_is_dropped(journal):
+    conn = movement_pool(FakeCursor()).acquire()
+
+    def work(cur):
+        record_movement(conn)
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        db.run_in_transaction(conn, work)
+
+    stats = journal.stats()
+    assert stats["pending"] == 0 and stats["in_flight"] == 0
+
+
+def test_failed_write_falls_back_to_a_direct_insert(journal, monkeypatch):
+    def broken(txn, rows):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(journal, "write", broken)
+    cur = FakeCursor()
+    conn = movement_pool(cur).acquire()
+    db.run_in_transaction(conn, lambda c: record_movement(conn))
+
+    assert cur.statements("insert into Stock_Movement")
+    assert not cur.statements("insert into Movement_Journal_Txn")
+
+
+def test_replay_inserts_only_committed_entries(tmp_path, monkeypatch):
+    path = str(tmp_path / "movements.journal")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"txn": "a" * 32, "rows": [["r1", "order", -1.0, "2026-10-01 12:00:00", 1, 3]]}) + "\n")
+        f.write(json.dumps({"txn": "b" * 32, "rows": [["r2", "order", -1.0, "2026-10-01 12:00:01", 1, 3]]}) + "\n")
+        f.write('{"txn": "cut off')
+
+    cur = FakeCursor().on("from Movement_Journal_Txn", [{"txn_id": "a" * 32}])
+    monkeypatch.setattr(db, "_pool", FakePool(FakeRawConnection(cur)))
+
+    journal = movement_log.MovementJournal(path, fsync=False)
+    assert journal.open() == 2
+    assert journal.flush() == 1
+
+    ((insert, params),) = [(sql, p) for sql, p in cur.executed if "insert into Stock_Movement" in sql]
+    assert params[0] == "r1"
+    assert entries(path) == []
+
+
+def test_one_journal_file_per_process(tmp_path):
+    path = str(tmp_path / "movements.journal")
+    first = movement_log.MovementJournal(path, fsync=False)
+    first.open()
+
+    # a slot whose process is gone, with one committed-or-not entry in it
+    with open(path + ".2", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"txn": "c" * 32, "rows": [["r3", "order", -1.0, "2026-10-01 12:00:00", 1, 3]]}) + "\n")
+
+    second = movement_log.MovementJournal(path, fsync=False)
+    assert second.open() == 1
+    assert second.path == path + ".1"
+    assert entries(second.path)[0]["txn"] == "c" * 32
+    assert not (tmp_path / "movements.journal.2").exists()
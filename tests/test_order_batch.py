@@ -0,0 +1,152 @@
+import importlib
+import uuid
+
+import pytest
+
+import catalog
+import db
+import stock
+from fakes import FakeCursor, FakePool, FakeRawConnection
+
+app_module = importlib.import_module("1220071_1222640")
+app = app_module.app
+
+LINES = 10
+
+
+def parse(**request):
+    with app.test_request_context("/", method="POST", **request):
+        return app_module.parse_order_lines()
+
+
+def test_form_lines_of_the_same_item_are_merged():
+    assert parse(data={"menu_item_id": ["3", "4", "3"], "quantity": ["1", "2", "5"]}) == [(3, 6), (4, 2)]
+
+
+def test_json_lines_and_zero_quantities():
+    items = [{"menu_item_id": 3, "quantity": 2}, {"menu_item_id": 5, "quantity": 0},
+             {"menu_item_id": 3, "quantity": 1}, {"menu_item_id": 6}]
+    assert parse(json={"items": items}) == [(3, 3)]
+
+
+@pytest.mark.parametrize("quantity", ["abc", "1.5", "2x"])
+def test_malformed_quantity(quantity):
+    with pytest.raises(ValueError, match="Invalid menu item or quantity"):
+        parse(data={"menu_item_id": ["3"], "quantity": [quantity]})
+
+
+def test_malformed_menu_item_and_negative_quantity():
+    with pytest.raises(ValueError, match="Invalid"):
+        parse(json={"items": [{"menu_item_id": None, "quantity": 1}]})
+    with pytest.raises(ValueError, match="negative"):
+        parse(json={"items": [{"menu_item_id": 3, "quantity": -1}]})
+
+
+def test_empty_batch():
+    assert parse(data={}) == []
+    assert parse(json={"items": []}) == []
+    assert parse(json={}) == []
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(app.config, "DASHBOARD_WARM_UP_MONTHS", 0)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["emp_id"] = 1
+        session["position_title"] = "waiter"
+    return client
+
+
+def test_bad_batches_are_rejected_before_the_database(client, monkeypatch):
+    def no_database():
+        raise AssertionError("the database was used")
+    monkeypatch.setattr(db, "get_pool", no_database)
+
+    response = client.post("/order/1/batch", json={"items": []})
+    assert response.status_code == 400 and response.json == {"error": "No items to add."}
+    response = client.post("/order/1/batch", json={"items": [{"menu_item_id": 1, "quantity": "x"}]})
+    assert response.status_code == 400 and response.json == {"error": "Invalid menu item or quantity."}
+    response = client.post("/order/1/batch", data={"menu_item_id": ["1"], "quantity": ["-2"]})
+    assert response.status_code == 400 and response.data == b"Quantity can't be negative."
+
+
+def batch_statements(monkeypatch, lines):
+    menu = catalog.MenuCatalog()
+    monkeypatch.setattr(app_module, "menu_catalog", menu)
+    monkeypatch.setattr(stock, "menu_catalog", menu)
+    cur = FakeCursor()
+    cur.on("from Catalog_Version", [{"version": 1}])
+    cur.on("from Menu_Item", [{"item_id": i, "item_name": f"item {i}", "price": 3.0, "is_available": 1}
+                              for i in range(1, LINES + 1)])
+    cur.on("from Recipe", [{"menu_item_id": i, "warehouse_item_id": i, "quantity_required": 1.0}
+                           for i in range(1, LINES + 1)])
+    cur.on("update Warehouse_Item", rowcount=lines)
+
+    conn = FakePool(FakeRawConnection(cur)).acquire()
+    menu.get(conn.cursor())
+    loaded = len(cur.executed)
+    db.run_in_transaction(conn, app_module.add_order_items, 7,
+                          [(i, 2) for i in range(1, lines + 1)], 1)
+    return [sql for sql, _ in cur.executed[loaded:]]
+
+
+def test_batch_statements_do_not_grow_with_the_lines(monkeypatch):
+    one = batch_statements(monkeypatch, 1)
+    ten = batch_statements(monkeypatch, LINES)
+    assert len(ten) == len(one) == 6
+    assert len([sql for sql in ten if sql.startswith("insert into Order_Item")]) == 1
+    assert len([sql for sql in ten if sql.startswith("insert into Stock_Movement")]) == 1
+
+
+def test_batch_route_statements(mysql_pool, client, monkeypatch):
+    tag = uuid.uuid4().hex[:10]
+    conn = mysql_pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    menu_item_ids = []
+    for i in range(LINES):
+        cur.execute("""
+            insert into Warehouse_Item (item_name, stock_quantity, reorder_level, unit_of_measure)
+            values (%s, 100, 0, 'g')
+        """, (f"batch {tag} {i}",))
+        warehouse_item_id = cur.lastrowid
+        cur.execute("""
+            insert into Menu_Item (item_name, category, price, date_added)
+            values (%s, 'drink', 3, curdate())
+        """, (f"batch {tag} {i}",))
+        menu_item_ids.append(cur.lastrowid)
+        cur.execute("""
+            insert into Recipe (menu_item_id, warehouse_item_id, quantity_required)
+            values (%s, %s, 1)
+        """, (cur.lastrowid, warehouse_item_id))
+    cur.execute("select min(customer_id) as customer_id from Customer")
+    cur.execute("""
+        insert into Orders (customer_id, order_date, total, order_status, order_type)
+        values (%s, now(), 0, 'pending', 'takeaway')
+    """, (cur.fetchone()["customer_id"],))
+    order_id = cur.lastrowid
+    cur.execute("select min(emp_id) as emp_id from Employee")
+    emp_id = cur.fetchone()["emp_id"]
+    catalog.menu_catalog.invalidate(cur)
+    conn.commit()
+    cur.close()
+    conn.close()
+    with client.session_transaction() as session:
+        session["emp_id"] = emp_id
+
+    counted = []
+
+    def count(statement, seconds):
+        if statement is not None:
+            counted.append(statement)
+    monkeypatch.setattr(db, "_query_hooks", db._query_hooks + [count])
+
+    def post(lines):
+        del counted[:]
+        response = client.post(f"/order/{order_id}/batch",
+                               json={"items": [{"menu_item_id": m, "quantity": 1} for m in lines]})
+        assert response.status_code < 400, response.data
+        return len(counted)
+
+    post(menu_item_ids[:1])   # loads the menu catalog
+    assert post(menu_item_ids) == post(menu_item_ids[:1])
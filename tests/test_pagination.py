@@ -0,0 +1,29 @@
+import pagination
+from fakes import FakeCursor
+
+
+def estimate(plan):
+    cur = FakeCursor().on("explain ", plan)
+    return pagination.estimate_count(cur, "Stock_Movement", "select ... where ...")
+
+
+def test_filter_on_a_joined_table_counts():
+    # Employee is read first, the movements per employee after it
+    assert estimate([
+        {"id": 1, "table": "e", "rows": 40, "filtered": 10.0},
+        {"id": 1, "table": "sm", "rows": 500, "filtered": 100.0},
+        {"id": 1, "table": "w", "rows": 1, "filtered": 100.0},
+    ]) == 2000
+
+
+def test_archive_parts_are_read_through_the_derived_row():
+    assert estimate([
+        {"id": 1, "table": "<derived2>", "rows": 90000, "filtered": 5.0},
+        {"id": 2, "table": "Stock_Movement", "rows": 10000, "filtered": 100.0},
+        {"id": 3, "table": "Stock_Movement_Archive", "rows": 80000, "filtered": 100.0},
+    ]) == 4500
+
+
+def test_empty_table():
+    assert estimate([{"id": 1, "table": "sm", "rows": 0, "filtered": 100.0}]) == 0
+    assert estimate([]) == 0
@@ -0,0 +1,167 @@
+import threading
+
+import pytest
+
+import db
+from fakes import FakeRawConnection
+
+
+class Server:
+    """Stands in for mysql.connector.connect, counting the connections it opens."""
+
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self, **config):
+        raw = FakeRawConnection()
+        raw.closed = False
+        raw.connected = True
+        raw.is_connected = lambda: raw.connected
+
+        def close():
+            raw.closed = True
+        raw.close = close
+        self.opened.append(raw)
+        return raw
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = Server()
+    monkeypatch.setattr(db.mysql.connector, "connect", server)
+    return server
+
+
+def pool(**kwargs):
+    return db.ConnectionPool({"database": "test"}, **kwargs)
+
+
+def counters(p, *names):
+    stats = p.stats()
+    return tuple(stats[n] for n in names)
+
+
+def test_released_connection_is_reused(server):
+    p = pool(pool_size=2, max_overflow=0)
+    conn = p.acquire()
+    assert counters(p, "open", "idle", "in_use") == (1, 0, 1)
+    raw = conn._raw
+    conn.close()
+    assert counters(p, "open", "idle", "in_use") == (1, 1, 0)
+    # what was not committed is rolled back on the way in
+    assert raw.log == ["rollback"]
+
+    conn = p.acquire()
+    assert conn._raw is raw and len(server.opened) == 1
+    conn.close()
+    assert p.stats()["checkouts"] == 2
+
+
+def test_timeout_when_the_pool_is_exhausted(server):
+    p = pool(pool_size=1, max_overflow=1, timeout=0.05)
+    held = [p.acquire(), p.acquire()]
+    with pytest.raises(db.mysql.connector.errors.PoolError, match="No free database connection"):
+        p.acquire()
+
+    stats = p.stats()
+    assert (stats["timeouts"], stats["waits"], stats["in_use"], stats["open"]) == (1, 1, 2, 2)
+    assert stats["wait_time_total"] >= 0.05 and stats["wait_time_avg"] == stats["wait_time_total"]
+    for conn in held:
+        conn.close()
+
+
+def test_waiter_gets_the_released_connection(server):
+    p = pool(pool_size=1, max_overflow=0, timeout=5)
+    conn = p.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(p.acquire()))
+    waiter.start()
+    conn.close()
+    waiter.join(5)
+
+    assert got and got[0]._raw is server.opened[0]
+    assert p.stats()["waits"] == 1 and p.stats()["timeouts"] == 0
+    got[0].close()
+
+
+def test_overflow_connections_are_closed_on_release(server):
+    p = pool(pool_size=1, max_overflow=2)
+    conns = [p.acquire() for _ in range(3)]
+    assert counters(p, "open", "in_use") == (3, 3)
+    for conn in conns:
+        conn.close()
+
+    assert counters(p, "open", "idle", "in_use") == (1, 1, 0)
+    assert [raw.closed for raw in server.opened] == [False, True, True]
+
+
+def test_dead_connection_is_replaced_on_checkout(server):
+    p = pool(pool_size=1, max_overflow=0)
+    p.acquire().close()
+    server.opened[0].connected = False   # server went away while idle
+
+    conn = p.acquire()
+    assert conn._raw is server.opened[1] and server.opened[0].closed
+    assert counters(p, "open", "reconnects") == (1, 1)
+    conn.close()
+
+
+def test_no_ping_without_pre_ping(server):
+    p = pool(pool_size=1, max_overflow=0, pre_ping=False)
+    p.acquire().close()
+    server.opened[0].connected = False
+    assert p.acquire()._raw is server.opened[0]
+
+
+def test_old_connections_are_recycled(server, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(db.time, "monotonic", clock)
+    p = pool(pool_size=2, max_overflow=0, recycle=3600)
+    first = p.acquire()
+    first.close()
+
+    clock.now += 3601
+    conn = p.acquire()
+    assert conn._raw is server.opened[1] and server.opened[0].closed
+    assert p.stats()["reconnects"] == 1
+
+    # checked out past its age -> closed instead of going back idle
+    clock.now += 3601
+    conn.close()
+    assert counters(p, "open", "idle") == (0, 0) and server.opened[1].closed
+
+
+def test_broken_connection_is_not_pooled(server):
+    p = pool(pool_size=1, max_overflow=0)
+    conn = p.acquire()
+
+    def rollback():
+        raise db.mysql.connector.errors.OperationalError("Lost connection")
+    conn._raw.rollback = rollback
+    conn.close()
+
+    assert counters(p, "open", "idle", "in_use") == (0, 0, 0)
+    assert server.opened[0].closed
+
+
+def test_failed_connect_frees_the_slot(server, monkeypatch):
+    p = pool(pool_size=1, max_overflow=0)
+
+    def refuse(**config):
+        raise db.mysql.connector.errors.InterfaceError("Can't connect")
+    monkeypatch.setattr(db.mysql.connector, "connect", refuse)
+    with pytest.raises(db.mysql.connector.errors.InterfaceError):
+        p.acquire()
+    assert counters(p, "open", "in_use") == (0, 0)
+
+    monkeypatch.setattr(db.mysql.connector, "connect", server)
+    p.acquire().close()
+    assert counters(p, "open", "idle", "checkouts") == (1, 1, 2)
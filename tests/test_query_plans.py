@@ -0,0 +1,65 @@
+# date searches must stay index range scans: the column is compared as it is, never wrapped
+# in DATE() or YEAR(). The EXPLAIN checks need a server (DAWLO_TEST_DB, see conftest.py).
+import importlib
+
+import pytest
+
+app_module = importlib.import_module("1220071_1222640")
+
+LISTS = [
+    # (filter, search field, query the list pages run, table alias, index the range can use)
+    (app_module.orders_filter, "order_date",
+     "select order_id from Orders", "Orders", "idx_orders_date"),
+    (app_module.payments_filter, "payment_date",
+     "select payment_id from Payment", "Payment", "idx_payment_date"),
+    (app_module.stock_movement_filter, "movement_date",
+     """select sm.movement_id from Stock_Movement sm
+        join Employee e on sm.emp_id = e.emp_id
+        join Warehouse_Item w on sm.warehouse_item_id = w.item_id""",
+     "sm", "idx_stock_movement_date"),
+]
+
+
+def search(filter_function, field, text):
+    with app_module.app.test_request_context(f"/?field={field}&search={text}"):
+        return filter_function()
+
+
+@pytest.mark.parametrize("filter_function, field, sql, alias, index", LISTS)
+def test_date_search_compares_the_raw_column(filter_function, field, sql, alias, index):
+    for text in ("2025-03-05", "2025-03"):
+        where, params = search(filter_function, field, text)
+        assert "date(" not in where.lower()
+        assert f"{field} >= %s" in where and f"{field} < %s" in where
+        assert len(params) == 2
+
+
+@pytest.mark.parametrize("filter_function, field, sql, alias, index", LISTS)
+def test_date_search_can_use_the_index(mysql_pool, filter_function, field, sql, alias, index):
+    where, params = search(filter_function, field, "2025-03")
+    conn = mysql_pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    cur.execute(f"explain {sql} where {where}", params)
+    plan = {step["table"]: step for step in cur.fetchall()}
+    cur.close()
+    conn.close()
+
+    # possible_keys, not key: on a small test table a full scan may still be cheaper
+    assert index in (plan[alias]["possible_keys"] or "")
+
+
+def test_top_purchased_panel_can_use_the_purchase_date_index(mysql_pool):
+    conn = mysql_pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        explain select pi.warehouse_item_id
+        from Purchase p
+        join Purchase_Item pi on p.purchase_id = pi.purchase_id
+        where p.purchase_status in ('confirmed', 'delivered')
+          and p.purchase_date >= curdate() - interval 6 month
+    """)
+    plan = {step["table"]: step for step in cur.fetchall()}
+    cur.close()
+    conn.close()
+
+    assert "idx_purchase" in (plan["p"]["possible_keys"] or "")
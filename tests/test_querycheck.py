@@ -0,0 +1,71 @@
+import pytest
+from flask import Flask
+
+import db
+import querycheck
+from fakes import FakeCursor
+
+app = Flask(__name__)
+app.config.update(TESTING=True, QUERY_CHECK="raise", N_PLUS_ONE_THRESHOLD=3)
+querycheck.init_app(app)
+
+
+def run(statements):
+    cur = db.InstrumentedCursor(FakeCursor())
+    for sql in statements:
+        cur.execute(sql)
+    return "ok"
+
+
+@app.route("/within")
+@querycheck.query_budget(3)
+def within():
+    return run(["select 1 from A", "select 1 from B", "select 1 from C"])
+
+
+@app.route("/over")
+@querycheck.query_budget(2)
+def over():
+    return run(["select 1 from A", "select 1 from B", "select 1 from C"])
+
+
+@app.route("/loop")
+def loop():
+    return run([f"select name from Menu_Item where item_id = {i}" for i in range(10)])
+
+
+def test_route_within_its_budget_passes():
+    assert app.test_client().get("/within").data == b"ok"
+
+
+def test_route_over_its_budget_fails():
+    with pytest.raises(querycheck.QueryCheckError, match="query budget of 2"):
+        app.test_client().get("/over")
+
+
+def test_n_plus_one_loop_fails():
+    with pytest.raises(querycheck.QueryCheckError, match="N\\+1"):
+        app.test_client().get("/loop")
+
+
+def test_default_follows_debug_set_after_init(monkeypatch):
+    monkeypatch.delenv("FLASK_DEBUG", raising=False)
+    other = Flask(__name__)
+    querycheck.init_app(other)
+    assert querycheck.check_mode(other) == "off"
+
+    # `flask run --debug` switches debug on after the app module was imported
+    other.debug = True
+    assert querycheck.check_mode(other) == "warn"
+
+
+def test_default_follows_flask_debug(monkeypatch):
+    other = Flask(__name__)
+    querycheck.init_app(other)
+    monkeypatch.setenv("FLASK_DEBUG", "1")
+    assert querycheck.check_mode(other) == "warn"
+    monkeypatch.setenv("FLASK_DEBUG", "0")
+    assert querycheck.check_mode(other) == "off"
+
+    other.config["QUERY_CHECK"] = "raise"
+    assert querycheck.check_mode(other) == "raise"
@@ -0,0 +1,62 @@
+import threading
+import uuid
+
+import db
+import reorder
+from fakes import FakeCursor
+
+
+def test_low_stock_rows_are_locked_before_the_open_purchase_check():
+    cur = FakeCursor()
+    reorder.create_reorder_drafts(cur, emp_id=1)
+
+    first, second = (sql for sql, _ in cur.executed[:2])
+    assert "from Warehouse_Item" in first and first.endswith("for update")
+    assert "not exists" in second
+
+
+def test_concurrent_runs_draft_an_item_once(mysql_pool):
+    tag = uuid.uuid4().hex[:10]
+    conn = mysql_pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        insert into Warehouse_Item (item_name, stock_quantity, reorder_level, unit_of_measure)
+        values (%s, 1, 10, 'g')
+    """, (f"flour {tag}",))
+    item_id = cur.lastrowid
+    cur.execute("insert into Supplier (supplier_name, phone_number) values (%s, %s)", (f"mill {tag}", tag))
+    cur.execute("""
+        insert into Supplier_Item (supplier_id, warehouse_item_id, unit_price, avg_delivery_days)
+        values (%s, %s, 2, 1)
+    """, (cur.lastrowid, item_id))
+    cur.execute("select min(emp_id) as emp_id from Employee")
+    emp_id = cur.fetchone()["emp_id"]
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    start = threading.Barrier(4)
+
+    def run():
+        c = mysql_pool.acquire()
+        start.wait()
+        db.run_in_transaction(c, reorder.create_reorder_drafts, emp_id)
+        c.close()
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    conn = mysql_pool.acquire()
+    cur = conn.cursor()
+    cur.execute("""
+        select count(*)
+        from Purchase_Item pi
+        join Purchase p on p.purchase_id = pi.purchase_id
+        where pi.warehouse_item_id = %s and p.purchase_status = 'draft'
+    """, (item_id,))
+    assert cur.fetchone()[0] == 1
+    cur.close()
+    conn.close()
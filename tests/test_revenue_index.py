@@ -0,0 +1,115 @@
+from datetime import date, timedelta
+
+import db
+from fakes import FakeCursor
+from revenue_index import RevenueIndex, add_paid_order
+
+D1, D2, D3, D4, D5 = (date(2026, 3, d) for d in range(1, 6))
+
+
+def index_cursor(rows):
+    """rows: [(sale_date, cum_revenue, cum_orders)] as stored in Daily_Revenue_Index"""
+    cur = FakeCursor()
+    answer(cur, rows)
+    return cur
+
+
+def answer(cur, rows):
+    rows = [{"sale_date": d, "cum_revenue": r, "cum_orders": o} for d, r, o in rows]
+    cur.on("select sale_date, cum_orders, cum_revenue", rows[-1:])
+    cur.on("select sale_date, cum_revenue, cum_orders", rows)
+
+
+# sales on the 1st (100, 2 orders), nothing on the 2nd and 3rd, 50 in 1 order on the 4th
+ROWS = [(D1, 100.0, 2), (D4, 150.0, 3)]
+
+
+def totals(index, cur, start, end):
+    result = index.range_totals(cur, start, end)
+    return result["revenue"], result["orders"], result["average_ticket"]
+
+
+def test_days_without_sales_carry_the_totals():
+    cur = index_cursor(ROWS)
+    index = RevenueIndex()
+    index.get(cur)
+    assert index.days == (D1, [100.0, 100.0, 100.0, 150.0], [2, 2, 2, 3])
+
+    assert totals(index, cur, D2, D4) == (0.0, 0, 0)
+    assert totals(index, cur, D2, D5) == (50.0, 1, 50.0)
+    assert totals(index, cur, D1, D5) == (150.0, 3, 50.0)
+
+
+def test_ranges_outside_the_index():
+    cur = index_cursor(ROWS)
+    index = RevenueIndex()
+    before = D1 - timedelta(days=30)
+    after = D5 + timedelta(days=30)
+
+    assert totals(index, cur, before, D1) == (0.0, 0, 0)
+    assert totals(index, cur, before, D2) == (100.0, 2, 50.0)
+    # past the last indexed day nothing more was sold
+    assert totals(index, cur, D5, after) == (0.0, 0, 0)
+    assert totals(index, cur, D3, after) == (50.0, 1, 50.0)
+    assert totals(index, cur, before, after) == (150.0, 3, 50.0)
+
+
+def test_empty_or_reversed_range():
+    cur = index_cursor(ROWS)
+    index = RevenueIndex()
+    assert totals(index, cur, D2, D2) == (0.0, 0, 0)
+    assert totals(index, cur, D4, D1) == (0.0, 0, 0)
+
+
+def test_empty_index():
+    cur = index_cursor([])
+    index = RevenueIndex()
+    assert totals(index, cur, D1, D5) == (0.0, 0, 0)
+
+
+def test_order_paid_after_load_changes_later_ranges():
+    cur = index_cursor(ROWS)
+    index = RevenueIndex(check_interval=0)
+    assert totals(index, cur, D2, D5) == (50.0, 1, 50.0)
+
+    # a 30 order paid on the 2nd: a new row, the later days include it
+    answer(cur, [(D1, 100.0, 2), (D2, 130.0, 3), (D4, 180.0, 4)])
+    assert totals(index, cur, D2, D5) == (80.0, 2, 40.0)
+    assert totals(index, cur, D3, D5) == (50.0, 1, 50.0)
+    assert totals(index, cur, D1, D2) == (100.0, 2, 50.0)
+
+
+def test_unchanged_index_is_not_reloaded():
+    cur = index_cursor(ROWS)
+    index = RevenueIndex(check_interval=0)
+    index.get(cur)
+    index.get(cur)
+    assert len(cur.statements("select sale_date, cum_revenue, cum_orders")) == 1
+    assert len(cur.statements("select sale_date, cum_orders, cum_revenue")) == 2
+
+
+def test_paid_order_updates_the_stored_index(mysql_pool):
+    conn = mysql_pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    index = RevenueIndex(check_interval=0)
+    day = date.today() - timedelta(days=3)
+    start, end = day - timedelta(days=1), date.today() + timedelta(days=1)
+    before = index.range_totals(cur, start, end)
+    later_before = index.range_totals(cur, day + timedelta(days=1), end)
+
+    cur.execute("select min(customer_id) as customer_id from Customer")
+    cur.execute("""
+        insert into Orders (customer_id, order_date, total, order_status, order_type)
+        values (%s, %s, 12.5, 'paid', 'takeaway')
+    """, (cur.fetchone()["customer_id"], day))
+    order_id = cur.lastrowid
+    conn.commit()
+    db.run_in_transaction(conn, add_paid_order, order_id)
+
+    after = index.range_totals(cur, start, end)
+    assert after["orders"] == before["orders"] + 1
+    assert round(after["revenue"] - before["revenue"], 2) == 12.5
+    # ranges starting after the order's day are unchanged
+    assert index.range_totals(cur, day + timedelta(days=1), end) == later_before
+    cur.close()
+    conn.close()
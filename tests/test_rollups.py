@@ -0,0 +1,40 @@
+from datetime import date
+
+import rollups
+from fakes import FakeCursor
+
+
+def rebuild_cursor(old_months, new_months):
+    cur = FakeCursor()
+    cur.on("as period from Daily_Sales", [{"period": m} for m in old_months])
+
+    execute = cur.execute
+
+    def execute_after_rebuild(sql, params=None):
+        # Daily_Sales holds the rebuilt days once it has been refilled
+        if "insert into Daily_Sales" in sql:
+            cur.on("as period from Daily_Sales", [{"period": m} for m in new_months])
+        execute(sql, params)
+
+    cur.execute = execute_after_rebuild
+    return cur
+
+
+def test_rebuild_reads_the_archive():
+    cur = rebuild_cursor([], [])
+    rollups.rebuild_rollups(cur)
+
+    for table in ("Daily_Sales", "Daily_Item_Sales", "Daily_Customer_Orders", "Daily_Order_Type"):
+        (sql,) = cur.statements(f"insert into {table} ")
+        assert "Orders_Archive" in sql
+    (items,) = cur.statements("insert into Daily_Item_Sales")
+    assert "Order_Item_Archive" in items
+
+
+def test_rebuild_bumps_every_month_it_touched():
+    # March lost its sales (never paid after all), May is new, April is in both
+    cur = rebuild_cursor([date(2026, 3, 1), date(2026, 4, 1)], [date(2026, 4, 1), date(2026, 5, 1)])
+    rollups.rebuild_rollups(cur)
+
+    bumped = [params for sql, params in cur.executed if "insert into Sales_Period_Version" in sql]
+    assert bumped == [(date(2026, 3, 1),), (date(2026, 4, 1),), (date(2026, 5, 1),)]
@@ -0,0 +1,116 @@
+# the hot pages stay within their @query_budget against a real server (DAWLO_TEST_DB, see conftest.py)
+import importlib
+import uuid
+
+import pytest
+
+app_module = importlib.import_module("1220071_1222640")
+app = app_module.app
+
+ORDER_LINES = 8   # more than N_PLUS_ONE_THRESHOLD, so a per-line query is caught
+PURCHASE_LINES = 8
+
+
+@pytest.fixture
+def client(mysql_pool, monkeypatch):
+    monkeypatch.setitem(app.config, "QUERY_CHECK", "raise")
+    monkeypatch.setitem(app.config, "TESTING", True)
+    monkeypatch.setitem(app.config, "DASHBOARD_WARM_UP_MONTHS", 0)
+
+    conn = mysql_pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("select emp_id from Employee where position_title = 'manager' limit 1")
+    emp_id = cur.fetchone()["emp_id"]
+    cur.close()
+    conn.close()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["emp_id"] = emp_id
+        session["position_title"] = "manager"
+    client.emp_id = emp_id
+    return client
+
+
+def _order_with_items(pool, lines):
+    tag = uuid.uuid4().hex[:10]
+    conn = pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    menu_item_ids = []
+    for i in range(lines):
+        cur.execute("""
+            insert into Warehouse_Item (item_name, stock_quantity, reorder_level, unit_of_measure)
+            values (%s, 100, 0, 'g')
+        """, (f"budget {tag} {i}",))
+        warehouse_item_id = cur.lastrowid
+        cur.execute("""
+            insert into Menu_Item (item_name, category, price, date_added)
+            values (%s, 'drink', 3, curdate())
+        """, (f"budget {tag} {i}",))
+        menu_item_ids.append(cur.lastrowid)
+        cur.execute("""
+            insert into Recipe (menu_item_id, warehouse_item_id, quantity_required)
+            values (%s, %s, 1)
+        """, (cur.lastrowid, warehouse_item_id))
+    cur.execute("""
+        insert into Customer (customer_name, phone_number, email)
+        values ('budget', %s, %s)
+    """, (tag, f"{tag}@test"))
+    cur.execute("""
+        insert into Orders (customer_id, order_date, total, order_status, order_type)
+        values (%s, now(), 0, 'pending', 'takeaway')
+    """, (cur.lastrowid,))
+    order_id = cur.lastrowid
+    conn.commit()
+    cur.close()
+    conn.close()
+    return order_id, menu_item_ids
+
+
+def _purchase_with_items(pool, emp_id, lines):
+    tag = uuid.uuid4().hex[:10]
+    conn = pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("insert into Supplier (supplier_name, phone_number) values (%s, %s)",
+                (f"budget {tag}", tag))
+    supplier_id = cur.lastrowid
+    cur.execute("""
+        insert into Purchase (purchase_date, total_cost, emp_id, supplier_id)
+        values (curdate(), %s, %s, %s)
+    """, (lines * 10, emp_id, supplier_id))
+    purchase_id = cur.lastrowid
+    for i in range(lines):
+        cur.execute("""
+            insert into Warehouse_Item (item_name, stock_quantity, reorder_level, unit_of_measure)
+            values (%s, 0, 0, 'g')
+        """, (f"budget stock {tag} {i}",))
+        cur.execute("""
+            insert into Purchase_Item (purchase_id, warehouse_item_id, quantity, unit_price)
+            values (%s, %s, 5, 2)
+        """, (purchase_id, cur.lastrowid))
+    conn.commit()
+    cur.close()
+    conn.close()
+    return purchase_id
+
+
+@pytest.mark.parametrize("path", ["/tables", "/floorplan"])
+def test_table_pages_within_budget(client, path):
+    assert client.get(path).status_code == 200
+
+
+def test_order_page_within_budget(client, mysql_pool):
+    order_id, menu_item_ids = _order_with_items(mysql_pool, ORDER_LINES)
+    for menu_item_id in menu_item_ids:
+        response = client.post(f"/order/{order_id}", data={
+            "action": "add", "menu_item_id": menu_item_id, "quantity": 2,
+        })
+        assert response.status_code == 302
+
+    # one query per order line would go over the budget of 15
+    assert client.get(f"/order/{order_id}").status_code == 200
+
+
+def test_purchase_page_within_budget(client, mysql_pool):
+    purchase_id = _purchase_with_items(mysql_pool, client.emp_id, PURCHASE_LINES)
+    assert client.get(f"/purchase/{purchase_id}").status_code == 200
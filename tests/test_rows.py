@@ -0,0 +1,27 @@
+from datetime import date
+
+from rows import columns_of, record_class, to_records
+
+COLUMNS = ("order_id", "order_date", "total")
+
+
+def test_records_read_like_dict_rows():
+    (row,) = to_records(COLUMNS, [(7, date(2026, 3, 1), 12.5)])
+
+    assert row.order_id == 7 and row["total"] == 12.5
+    assert row.get("missing", "-") == "-" and "order_date" in row
+    assert row._asdict() == {"order_id": 7, "order_date": date(2026, 3, 1), "total": 12.5}
+    assert not hasattr(row, "__dict__")
+
+
+def test_columns_a_record_cannot_hold_fall_back_to_dicts():
+    for columns in (("count(*)",), ("a", "a"), ("from",), ("keys",)):
+        assert record_class(columns) is None
+        assert to_records(columns, [(1,) * len(columns)])[0] == dict(zip(columns, (1,) * len(columns)))
+
+
+def test_columns_of():
+    rows = [(1, date(2026, 3, 1), 2.0), (2, date(2026, 3, 2), 3.0)]
+    assert columns_of(COLUMNS, rows)["total"] == [2.0, 3.0]
+    assert columns_of(COLUMNS, to_records(COLUMNS, rows))["order_id"] == [1, 2]
+    assert columns_of(COLUMNS, []) == {"order_id": [], "order_date": [], "total": []}
@@ -0,0 +1,135 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+import db
+import movement_log
+import snapshots
+from fakes import FakeCursor, FakePool, FakeRawConnection
+
+
+def test_snapshot_keeps_the_newest_movement_id():
+    cur = FakeCursor().on("from Movement_Journal_Txn", [{"waiting": 0}])
+    snapshots.take_snapshot(cur)
+
+    assert "for share" in cur.executed[0][0]
+    (insert,) = cur.statements("insert into Stock_Snapshot")
+    assert "0) from Stock_Movement)" in insert
+    assert "0) from Stock_Movement_Archive)" in insert
+
+
+def test_journal_check_under_the_locks_takes_no_lock_of_its_own():
+    cur = FakeCursor().on("from Movement_Journal_Txn", [{"waiting": 3}])
+    with pytest.raises(snapshots.JournalPending):
+        snapshots.take_snapshot(cur)
+    (check,) = cur.statements("from Movement_Journal_Txn")
+    assert "for share" not in check and "for update" not in check
+    assert not cur.statements("insert into Stock_Snapshot")
+
+
+def test_wait_for_journal_gives_up():
+    cur = FakeCursor().on("from Movement_Journal_Txn", [{"waiting": 3}])
+    conn = FakePool(FakeRawConnection(cur)).acquire()
+    with pytest.raises(snapshots.JournalPending):
+        snapshots.wait_for_journal(conn, timeout=0)
+
+
+def test_stock_as_of_counts_movements_by_id_live_and_archived():
+    cur = FakeCursor()
+    snapshots.stock_as_of(cur, datetime(2026, 10, 1), item_id=7)
+
+    ((sql, params),) = cur.executed
+    assert sql.count("m.movement_id > s.movement_id") == 2
+    assert "from Stock_Movement_Archive m" in sql
+    assert sql.count("%s") == len(params)
+
+
+def _scalar(pool, sql, params=()):
+    conn = pool.acquire()
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    value = cur.fetchone()[0]
+    conn.commit()
+    cur.close()
+    conn.close()
+    return value
+
+
+def test_movement_in_the_snapshot_second_is_counted_once(mysql_pool):
+    conn = mysql_pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        insert into Warehouse_Item (item_name, stock_quantity, reorder_level, unit_of_measure)
+        values ('snapshot beans', 100, 0, 'g')
+    """)
+    item_id = cur.lastrowid
+    cur.execute("select min(emp_id) as emp_id from Employee")
+    emp_id = cur.fetchone()["emp_id"]
+    conn.commit()
+
+    def change(c, quantity):
+        c.execute("update Warehouse_Item set stock_quantity = stock_quantity + %s where item_id = %s",
+                  (quantity, item_id))
+        c.execute("""
+            insert into Stock_Movement (movement_type, quantity_change, movement_date, warehouse_item_id, emp_id)
+            values ('adjustment', %s, now(), %s, %s)
+        """, (quantity, item_id, emp_id))
+
+    # all within the same second: before, the snapshot, after
+    db.run_in_transaction(conn, change, -10)
+    db.run_in_transaction(conn, snapshots.take_snapshot)
+    db.run_in_transaction(conn, change, -5)
+
+    now = _scalar(mysql_pool, "select now()")
+    (row,) = snapshots.stock_as_of(cur, now, item_id)
+    assert row["stock_quantity"] == 85
+    conn.rollback()
+    cur.close()
+    conn.close()
+
+
+def test_snapshot_with_movements_waiting_in_the_journal(mysql_pool, tmp_path, monkeypatch):
+    # the app's journal holds a committed change when the snapshot job starts; its flush
+    # runs a moment later, as the journal thread of another process would
+    conn = mysql_pool.acquire()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        insert into Warehouse_Item (item_name, stock_quantity, reorder_level, unit_of_measure)
+        values ('journal beans', 100, 0, 'g')
+    """)
+    item_id = cur.lastrowid
+    cur.execute("select min(emp_id) as emp_id from Employee")
+    emp_id = cur.fetchone()["emp_id"]
+    conn.commit()
+
+    journal = movement_log.MovementJournal(str(tmp_path / "movements.journal"), fsync=False)
+    journal.open()
+    monkeypatch.setattr(movement_log, "journal", journal)
+
+    def change(c):
+        c.execute("update Warehouse_Item set stock_quantity = stock_quantity - 10 where item_id = %s",
+                  (item_id,))
+        movement_log.insert_movements(c, """
+            select 'adjustment' as movement_type, -10 as quantity_change,
+                   %s as warehouse_item_id, %s as emp_id
+        """, (item_id, emp_id))
+
+    db.run_in_transaction(conn, change)
+    assert journal.stats()["pending"] == 1
+    monkeypatch.setattr(movement_log, "journal", None)   # not this process's journal
+
+    flusher = threading.Timer(0.3, journal.flush)
+    flusher.start()
+    snapshot_conn = mysql_pool.acquire()
+    assert snapshots.snapshot_stock(snapshot_conn) > 0
+    snapshot_conn.close()
+    flusher.join()
+
+    assert journal.stats()["pending"] == 0
+    now = _scalar(mysql_pool, "select now()")
+    (row,) = snapshots.stock_as_of(cur, now, item_id)
+    assert row["stock_quantity"] == 90
+    conn.rollback()
+    cur.close()
+    conn.close()
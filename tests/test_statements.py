@@ -0,0 +1,31 @@
+import pytest
+
+import statements
+from fakes import FakeCursor, FakePool
+
+
+def test_prepared_once_per_connection():
+    pool = FakePool()
+    query = statements.NamedQuery("test.status", "select order_status from Orders where order_id = %s")
+
+    conn = pool.acquire()
+    query.run(conn.cursor(), (1,))
+    query.run(conn.cursor(), (2,))
+    conn.close()
+    query.run(pool.acquire().cursor(), (3,))   # the same raw connection, back from the pool
+
+    assert query.stats()["executions"] == 3
+    assert query.stats()["prepares"] == 1
+
+
+def test_plain_cursor_runs_the_text():
+    cur = FakeCursor()
+    statements.NamedQuery("test.plain", "select 1").run(cur)
+    assert cur.statements("select 1")
+
+
+def test_name_reused_with_other_sql_is_refused():
+    statements.register("test.reused", "select 1")
+    assert statements.register("test.reused", "select 1").sql == "select 1"
+    with pytest.raises(ValueError):
+        statements.register("test.reused", "select 2")
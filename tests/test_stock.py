@@ -0,0 +1,62 @@
+import pytest
+
+import catalog
+import statements
+import stock
+from fakes import FakeCursor
+
+
+@pytest.fixture(autouse=True)
+def menu(monkeypatch):
+    monkeypatch.setattr(stock, "menu_catalog", catalog.MenuCatalog())
+
+
+def stock_cursor():
+    cur = FakeCursor()
+    cur.on("from Catalog_Version", [{"version": 1}])
+    cur.on("from Menu_Item", [{"item_id": 1, "item_name": "latte", "price": 3.0, "is_available": 1}])
+    cur.on("from Recipe", [{"menu_item_id": 1, "warehouse_item_id": 1, "quantity_required": 2.0},
+                           {"menu_item_id": 1, "warehouse_item_id": 2, "quantity_required": 1.0}])
+    cur.on("update Warehouse_Item", rowcount=2)
+    return cur
+
+
+def test_ingredients_come_from_the_catalog():
+    cur = stock_cursor()
+    assert stock.ingredients_needed(cur, [(1, 3)]) == {1: 6.0, 2: 3.0}
+    stock.deduct_stock(cur, [(1, 3)], emp_id=3)
+    assert len(cur.statements("from Recipe")) == 1   # the catalog load, nothing per change
+
+
+def test_deduct_then_restore_in_one_process():
+    # the two directions have different statement texts and must not share a name
+    def executions(name):
+        return statements.stats().get(name, {}).get("executions", 0)
+
+    before = {name: executions(name) for name in ("stock.take_movements.items2",
+                                                  "stock.put_back_movements.items2")}
+    cur = stock_cursor()
+    stock.deduct_stock(cur, [(1, 1)], emp_id=3)
+    stock.restore_stock(cur, [(1, 1)], emp_id=3, movement_type="cancel_item")
+    stock.deduct_stock(cur, [(1, 1)], emp_id=3)
+
+    assert executions("stock.take_movements.items2") - before["stock.take_movements.items2"] == 2
+    assert executions("stock.put_back_movements.items2") - before["stock.put_back_movements.items2"] == 1
+
+
+def test_short_ingredient_raises():
+    cur = stock_cursor()
+    cur.on("update Warehouse_Item", rowcount=1)
+    with pytest.raises(stock.InsufficientStock):
+        stock.deduct_stock(cur, [(1, 1)], emp_id=3)
+    assert not cur.statements("insert into Stock_Movement")
+
+
+def test_zero_amount_ingredient_is_not_a_shortfall():
+    cur = stock_cursor()
+    cur.on("from Recipe", [{"menu_item_id": 1, "warehouse_item_id": 1, "quantity_required": 2.0},
+                           {"menu_item_id": 1, "warehouse_item_id": 2, "quantity_required": 0.0}])
+    cur.on("update Warehouse_Item", rowcount=1)
+
+    stock.deduct_stock(cur, [(1, 1)], emp_id=3)
+    assert stock.ingredients_needed(cur, [(1, 1)]) == {1: 2.0}
@@ -0,0 +1,20 @@
+from datetime import datetime, timedelta
+
+from fakes import FakeCursor
+from table_state import get_table_states
+
+
+def test_whole_floor_in_one_query():
+    seated = datetime.now() - timedelta(minutes=30)
+    cur = FakeCursor().on("with active as", [
+        {"table_id": 1, "capacity": 4, "active_session_start": None,
+         "order_id": None, "order_status": None, "total": None, "open_orders": 0},
+        {"table_id": 2, "capacity": 2, "active_session_start": seated,
+         "order_id": 9, "order_status": "served", "total": 12.0, "open_orders": 1},
+    ])
+
+    states = get_table_states(cur)
+
+    assert len(cur.executed) == 1
+    assert [s["state"] for s in states] == ["free", "served_waiting_payment"]
+    assert [s["can_close"] for s in states] == [False, False]
@@ -0,0 +1,81 @@
+import mysql.connector
+import pytest
+from mysql.connector import errorcode
+
+import db
+from fakes import FakePool
+
+
+def test_earlier_reads_are_rolled_back_not_committed():
+    conn = FakePool().acquire()
+    cur = conn.cursor()
+    cur.execute("select 1")
+    conn._raw.in_transaction = True
+
+    db.run_in_transaction(conn, lambda c: c.execute("update t set x = 1"))
+    assert conn._raw.log == ["rollback", "start", "commit"]
+
+
+def test_uncommitted_writes_are_refused():
+    conn = FakePool().acquire()
+    conn._raw.in_transaction = True
+    conn.cursor().execute("insert into t values (1)")
+    fired = []
+    conn.after_commit(lambda: fired.append(1))
+
+    with pytest.raises(RuntimeError):
+        db.run_in_transaction(conn, lambda c: None)
+    assert not fired and "commit" not in conn._raw.log
+
+
+def test_deadlock_is_retried():
+    conn = FakePool().acquire()
+    calls = []
+
+    def work(cur):
+        calls.append(1)
+        if len(calls) < 3:
+            raise mysql.connector.errors.DatabaseError(errno=errorcode.ER_LOCK_DEADLOCK)
+        return "done"
+
+    assert db.run_in_transaction(conn, work, backoff=0) == "done"
+    assert len(calls) == 3
+    assert conn._raw.log.count("rollback") == 2
+
+
+def test_after_commit_runs_only_on_commit():
+    conn = FakePool().acquire()
+    fired = []
+
+    def work(cur):
+        conn.after_commit(lambda: fired.append("x"))
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        db.run_in_transaction(conn, work)
+    assert fired == []
+
+    db.run_in_transaction(conn, lambda cur: conn.after_commit(lambda: fired.append("y")))
+    assert fired == ["y"]
+
+
+def test_failing_callbacks_do_not_undo_the_commit():
+    conn = FakePool().acquire()
+    fired = []
+
+    def work(cur):
+        conn.after_commit(lambda: 1 / 0)
+        conn.after_commit(lambda: fired.append("commit"))
+        conn.after_rollback(lambda: fired.append("rollback"))
+
+    db.run_in_transaction(conn, work)
+    assert fired == ["commit"]
+    assert conn._raw.log[-1] == "commit"
+
+
+def test_after_rollback_runs_when_given_back_open():
+    conn = FakePool().acquire()
+    fired = []
+    conn.after_rollback(lambda: fired.append("rollback"))
+    conn.close()
+    assert fired == ["rollback"]